@@ -2,18 +2,23 @@ const axios = require('axios');
 
 const API_BASE_URL = process.env.API_BASE_URL || 'http://localhost:8000/api/v1';
 const API_TIMEOUT = 30000; // 30 seconds
+// Budget the backend gets per request; the margin covers network and our own handling
+const API_DEADLINE_MS = API_TIMEOUT - 3000;
 
 // Create axios instance with default config
 const apiClient = axios.create({
   baseURL: API_BASE_URL,
   timeout: API_TIMEOUT,
   headers: {
-    'Content-Type': 'application/json'
+    'Content-Type': 'application/json',
+    // Selects the backend's WhatsApp generation budget (short, sentence-bounded analyses)
+    'X-Client-Channel': 'whatsapp'
   }
 });
 
 // Get diagnosis from FastAPI backend
-async function getDiagnosis(symptoms, language = 'en') {
+// `phone` is the sender's WhatsApp id; the backend rate-limits per phone
+async function getDiagnosis(symptoms, language = 'en', phone = null) {
   try {
     console.log(`🔄 API Call: POST /diagnose`);
     console.log(`   Symptoms: ${symptoms.substring(0, 50)}...`);
@@ -22,6 +27,11 @@ async function getDiagnosis(symptoms, language = 'en') {
     const response = await apiClient.post('/diagnose', {
       symptoms: symptoms,
       language: language
+    }, {
+      headers: {
+        'X-Request-Timeout-Ms': String(API_DEADLINE_MS),
+        ...(phone ? { 'X-Phone-Number': phone } : {})
+      }
     });
     
     console.log(`✅ API Response: ${response.status} ${response.statusText}`);
@@ -33,6 +43,12 @@ async function getDiagnosis(symptoms, language = 'en') {
     if (error.response) {
       console.error(`   Status: ${error.response.status}`);
       console.error(`   Data:`, error.response.data);
+      
+      if (error.response.status === 429 || error.response.status === 503) {
+        const busy = new Error('Backend busy');
+        busy.retryAfter = parseInt(error.response.headers['retry-after'], 10) || 30;
+        throw busy;
+      }
     } else if (error.request) {
       console.error('   No response received from server');
     }
@@ -41,6 +57,39 @@ async function getDiagnosis(symptoms, language = 'en') {
   }
 }
 
+// Send the next message of a conversation; the backend keeps the context
+// (accumulated symptoms and model state) under `sessionId`. Omit it to start one.
+async function continueConversation(message, language = 'en', phone = null, sessionId = null) {
+  try {
+    console.log(`🔄 API Call: POST /diagnose/conversation (${sessionId || 'new'})`);
+    
+    const response = await apiClient.post('/diagnose/conversation', {
+      message: message,
+      // Follow-ups keep the language of the first turn; short replies are too ambiguous to detect
+      ...(sessionId ? { session_id: sessionId } : { language: language })
+    }, {
+      headers: {
+        'X-Request-Timeout-Ms': String(API_DEADLINE_MS),
+        ...(phone ? { 'X-Phone-Number': phone } : {})
+      }
+    });
+    
+    console.log(`✅ API Response: ${response.status} (turn ${response.data.turn})`);
+    return response.data;
+    
+  } catch (error) {
+    console.error('❌ API Error:', error.message);
+    
+    if (error.response && (error.response.status === 429 || error.response.status === 503)) {
+      const busy = new Error('Backend busy');
+      busy.retryAfter = parseInt(error.response.headers['retry-after'], 10) || 30;
+      throw busy;
+    }
+    
+    throw new Error('Failed to get diagnosis from backend');
+  }
+}
+
 // Get supported languages
 async function getLanguages() {
   try {
@@ -70,6 +119,7 @@ async function healthCheck() {
 
 module.exports = {
   getDiagnosis,
+  continueConversation,
   getLanguages,
   healthCheck
 };
\ No newline at end of file
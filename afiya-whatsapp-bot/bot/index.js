@@ -96,7 +96,8 @@ client.on('message', async (message) => {
         name: name,
         language: 'en',
         messageCount: 0,
-        lastMessage: Date.now()
+        lastMessage: Date.now(),
+        conversationId: null
       });
     }
     
@@ -117,6 +118,8 @@ client.on('message', async (message) => {
         text.toLowerCase() === 'bawo' ||
         text.toLowerCase() === 'sannu') {
       
+      // A greeting starts a fresh conversation
+      session.conversationId = null;
       await message.reply(messages.getWelcomeMessage(detectedLang, name));
       return;
     }
@@ -136,7 +139,8 @@ client.on('message', async (message) => {
     
     // Call FastAPI backend for diagnosis
     console.log('🔄 Calling FastAPI backend...');
-    const diagnosis = await api.getDiagnosis(text, detectedLang);
+    const diagnosis = await api.continueConversation(text, detectedLang, from, session.conversationId);
+    session.conversationId = diagnosis.session_id;
     
     // Format and send response
     const response = formatDiagnosisResponse(diagnosis, detectedLang);
@@ -148,6 +152,12 @@ client.on('message', async (message) => {
     console.error('❌ Error handling message:', error.message);
     
     try {
+      if (error.retryAfter) {
+        await message.reply(
+          `⏳ We're handling a lot of messages right now. Please try again in ${error.retryAfter} seconds.`
+        );
+        return;
+      }
       await message.reply(
         '😔 Sorry, I encountered an error. Please try again.\n\n' +
         'Gafara, na sami matsala. Don Allah a sake gwada.'
@@ -195,7 +205,8 @@ function formatDiagnosisResponse(diagnosis, language) {
   
   // N-ATLaS Analysis
   if (diagnosis.natlas_analysis) {
-    response += `💡 *AI Analysis:*\n${diagnosis.natlas_analysis.substring(0, 200)}...\n\n`;
+    // Already sized for WhatsApp by the backend's channel budget
+    response += `💡 *AI Analysis:*\n${diagnosis.natlas_analysis}\n\n`;
     response += '━━━━━━━━━━━━━━━━━\n\n';
   }
   
@@ -0,0 +1,114 @@
+"""Initial schema
+
+Creates whatever is missing, so it applies cleanly both to an empty
+database and to one whose tables were made by Base.metadata.create_all
+before migrations existed.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 09:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = {
+    "users": lambda: (
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("is_admin", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    ),
+    "medical_conditions": lambda: (
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("symptoms", sa.JSON()),
+        sa.Column("description", sa.Text()),
+        sa.Column("treatments", sa.JSON()),
+        sa.Column("red_flags", sa.JSON()),
+        sa.Column("tags", sa.JSON()),
+        sa.Column("severity_level", sa.String()),
+        sa.Column("version", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    ),
+    "diagnosis_logs": lambda: (
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer()),
+        sa.Column("session_id", sa.String()),
+        sa.Column("symptoms_text", sa.Text()),
+        sa.Column("detected_language", sa.String()),
+        sa.Column("matched_conditions", sa.JSON()),
+        sa.Column("red_flags_detected", sa.JSON()),
+        sa.Column("response_time_ms", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+    ),
+    "offline_sync": lambda: (
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer()),
+        sa.Column("device_id", sa.String()),
+        sa.Column("pending_queries", sa.JSON()),
+        sa.Column("client_kb_version", sa.String()),
+        sa.Column("synced_at", sa.DateTime()),
+        sa.Column("sync_status", sa.String()),
+    ),
+    "diagnosis_rollups": lambda: (
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("granularity", sa.String(8), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(), nullable=False),
+        sa.Column("language", sa.String(16), nullable=False),
+        sa.Column("dimension", sa.String(16), nullable=False),
+        sa.Column("value", sa.String(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.Column("response_time_ms_total", sa.BigInteger(), nullable=False),
+        sa.UniqueConstraint(
+            "granularity", "bucket_start", "language", "dimension", "value", name="uq_diagnosis_rollups_key"
+        ),
+    ),
+}
+
+# (name, table, columns, unique)
+INDEXES = [
+    ("ix_users_id", "users", ["id"], False),
+    ("ix_users_email", "users", ["email"], True),
+    ("ix_medical_conditions_id", "medical_conditions", ["id"], False),
+    ("ix_medical_conditions_title", "medical_conditions", ["title"], False),
+    ("ix_diagnosis_logs_id", "diagnosis_logs", ["id"], False),
+    ("ix_diagnosis_logs_session_id", "diagnosis_logs", ["session_id"], False),
+    ("ix_diagnosis_logs_created_at", "diagnosis_logs", ["created_at"], False),
+    ("ix_offline_sync_id", "offline_sync", ["id"], False),
+    ("ix_offline_sync_device_id", "offline_sync", ["device_id"], False),
+    ("ix_diagnosis_rollups_lookup", "diagnosis_rollups", ["granularity", "dimension", "bucket_start"], False),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+    for name, columns in TABLES.items():
+        if name not in existing:
+            op.create_table(name, *columns())
+
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, unique in INDEXES:
+        if name not in {index["name"] for index in inspector.get_indexes(table)}:
+            op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in reversed(list(TABLES)):
+        op.drop_table(name)
@@ -0,0 +1,165 @@
+"""Partition diagnosis_logs and offline_sync by month
+
+PostgreSQL only; other databases keep plain tables and are archived by
+deleting rows (see services/retention_service.py).
+
+Each table is rebuilt as a RANGE-partitioned parent with one partition
+per month from its oldest row up to its newest row or
+PARTITION_PREMAKE_MONTHS ahead, whichever is later, plus a DEFAULT
+partition for anything outside them, and the rows are copied across.
+Every copied row has a monthly partition, so DEFAULT starts out empty
+and later months can still be created (retention_service moves rows
+that reach DEFAULT afterwards). The copy rewrites the table once, and
+migrations run on startup (core.database.run_migrations), so deploy it
+in a quiet window. The primary key becomes (id, <time column>) because
+PostgreSQL requires the partition key in every unique constraint; ids
+keep coming from the existing sequence.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:30:00
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# table -> (partition column, column definitions without the key, secondary indexes)
+TABLES = {
+    "diagnosis_logs": (
+        "created_at",
+        """user_id INTEGER,
+        session_id VARCHAR,
+        symptoms_text TEXT,
+        detected_language VARCHAR,
+        matched_conditions JSON,
+        red_flags_detected JSON,
+        response_time_ms INTEGER""",
+        ["session_id", "created_at"],
+    ),
+    "offline_sync": (
+        "synced_at",
+        """user_id INTEGER,
+        device_id VARCHAR,
+        pending_queries JSON,
+        client_kb_version VARCHAR,
+        sync_status VARCHAR""",
+        ["device_id", "synced_at"],
+    ),
+}
+
+
+def _month(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+
+
+def _is_partitioned(bind, table: str) -> bool:
+    return bind.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+        {"name": table}
+    ).scalar() == "p"
+
+
+def _columns(bind, table: str):
+    return [c["name"] for c in sa.inspect(bind).get_columns(table)]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    for table, (time_column, columns, indexes) in TABLES.items():
+        if _is_partitioned(bind, table):
+            continue
+        legacy = f"{table}_unpartitioned"
+        copied = _columns(bind, table)
+
+        op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        op.execute(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {legacy}_pkey")
+        for index in sa.inspect(bind).get_indexes(legacy):
+            op.execute(f"DROP INDEX IF EXISTS {index['name']}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+        op.execute(f"""
+            CREATE TABLE {table} (
+                id INTEGER NOT NULL DEFAULT nextval('{table}_id_seq'),
+                {columns},
+                {time_column} TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+                PRIMARY KEY (id, {time_column})
+            ) PARTITION BY RANGE ({time_column})
+        """)
+        for column in indexes:
+            op.execute(f"CREATE INDEX ix_{table}_{column} ON {table} ({column})")
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+        oldest, newest = bind.execute(sa.text(f"SELECT min({time_column}), max({time_column}) FROM {legacy}")).one()
+        now = datetime.utcnow()
+        month = _month(oldest or now)
+        last = _month(now)
+        for _ in range(settings.PARTITION_PREMAKE_MONTHS):
+            last = _next_month(last)
+        last = max(last, _month(newest or now))
+        while month <= last:
+            following = _next_month(month)
+            op.execute(
+                f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+            )
+            month = following
+
+        selected = [
+            f"COALESCE({c}, now() AT TIME ZONE 'utc')" if c == time_column else c for c in copied
+        ]
+        op.execute(f"INSERT INTO {table} ({', '.join(copied)}) SELECT {', '.join(selected)} FROM {legacy}")
+        op.execute(f"DROP TABLE {legacy}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    for table, (time_column, columns, indexes) in TABLES.items():
+        if not _is_partitioned(bind, table):
+            continue
+        partitioned = f"{table}_partitioned"
+        copied = _columns(bind, table)
+
+        op.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+        op.execute(f"ALTER INDEX IF EXISTS {table}_pkey RENAME TO {partitioned}_pkey")
+        for column in indexes:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+        op.execute(f"""
+            CREATE TABLE {table} (
+                id INTEGER NOT NULL DEFAULT nextval('{table}_id_seq') PRIMARY KEY,
+                {columns},
+                {time_column} TIMESTAMP
+            )
+        """)
+        op.execute(f"CREATE INDEX ix_{table}_id ON {table} (id)")
+        for column in indexes:
+            op.execute(f"CREATE INDEX ix_{table}_{column} ON {table} ({column})")
+        op.execute(f"INSERT INTO {table} ({', '.join(copied)}) SELECT {', '.join(copied)} FROM {partitioned}")
+        op.execute(f"DROP TABLE {partitioned} CASCADE")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
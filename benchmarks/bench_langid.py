@@ -0,0 +1,96 @@
+"""Accuracy and speed benchmark for LangIDService.
+
+Scores the n-gram identifier and the old substring heuristic on the
+held-out sentences in data/langid/eval.json, then times single and
+batched calls.
+
+Usage:
+    python -m benchmarks.bench_langid [--iterations 200]
+"""
+import argparse
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from services.langid_service import LangIDService
+
+EVAL_PATH = Path(__file__).resolve().parent.parent / "data" / "langid" / "eval.json"
+
+
+def substring_heuristic(text: str) -> str:
+    """The original NATLaSService.detect_language, kept for comparison"""
+    text_lower = text.lower()
+    if any(m in text_lower for m in ['ẹ', 'ọ', 'ṣ', 'bawo']):
+        return 'yo'
+    if any(m in text_lower for m in ['sannu', 'yaya', 'ina']):
+        return 'ha'
+    if any(m in text_lower for m in ['kedu', 'ndewo']):
+        return 'ig'
+    if sum(1 for m in ['wetin', 'dey', 'fit'] if m in text_lower.split()) >= 2:
+        return 'pcm'
+    return 'en'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        eval_set = json.load(f)
+    samples = [(lang, text) for lang, texts in eval_set.items() for text in texts]
+    texts = [text for _, text in samples]
+
+    start = time.perf_counter()
+    service = LangIDService()
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    predictions = [lang for lang, _ in service.identify_batch(texts)]
+    baseline = [substring_heuristic(text) for text in texts]
+
+    print(f"profiles built in {build_ms:.1f} ms ({len(service.languages)} languages)")
+    print()
+    print(f"{'language':<10}{'n':>4}{'ngram acc':>12}{'heuristic acc':>16}")
+    for lang in eval_set:
+        idx = [i for i, (gold, _) in enumerate(samples) if gold == lang]
+        ngram_acc = sum(predictions[i] == lang for i in idx) / len(idx)
+        heur_acc = sum(baseline[i] == lang for i in idx) / len(idx)
+        print(f"{lang:<10}{len(idx):>4}{ngram_acc:>12.1%}{heur_acc:>16.1%}")
+    total = len(samples)
+    print(f"{'overall':<10}{total:>4}"
+          f"{sum(p == g for p, (g, _) in zip(predictions, samples)) / total:>12.1%}"
+          f"{sum(p == g for p, (g, _) in zip(baseline, samples)) / total:>16.1%}")
+
+    confusions = Counter((g, p) for p, (g, _) in zip(predictions, samples) if p != g)
+    if confusions:
+        print()
+        print("n-gram confusions (gold -> predicted):")
+        for (gold, pred), count in confusions.most_common():
+            print(f"  {gold} -> {pred}: {count}")
+
+    print()
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for text in texts:
+            service.identify(text)
+    single_us = (time.perf_counter() - start) / (args.iterations * total) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        service.identify_batch(texts)
+    batch_us = (time.perf_counter() - start) / (args.iterations * total) * 1e6
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        for text in texts:
+            substring_heuristic(text)
+    heur_us = (time.perf_counter() - start) / (args.iterations * total) * 1e6
+
+    print(f"{'identify()':<24}{single_us:>10.2f} us/message")
+    print(f"{f'identify_batch({total})':<24}{batch_us:>10.2f} us/message")
+    print(f"{'substring heuristic':<24}{heur_us:>10.2f} us/message")
+
+
+if __name__ == "__main__":
+    main()
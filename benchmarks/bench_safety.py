@@ -0,0 +1,125 @@
+"""Microbenchmark for SafetyService red flag detection.
+
+Compares the compiled combined matcher against the old per-pattern
+re.search loop, and checks how it scales as the phrase list grows.
+Before timing anything it checks the matcher against REGRESSION_CASES
+and exits non-zero on a mismatch.
+
+Usage:
+    python -m benchmarks.bench_safety [--iterations 2000]
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from services.safety_service import SafetyService
+
+SAMPLE_TEXTS = [
+    "I have had a mild headache and a runny nose since yesterday morning",
+    "My chest pain started an hour ago and I feel shortness of breath",
+    "Ori mi n fo, mo si ni iba lati ana",
+    "Ina da zazzabi da ciwon kai tun jiya",
+    "Isi na-egbu m mgbu na ahụ ọkụ",
+    "My belle dey pain me and I dey vomit since morning",
+    "I want to die, nothing is worth living anymore",
+    "Fever, body aches, and loss of appetite for three days now",
+]
+
+
+# (text, expected categories): inflections that must match, and ordinary
+# text that once raised emergency flags through prefix or diacritic-folded matches
+REGRESSION_CASES = [
+    ("he was found unconsciousness on the floor", {"consciousness"}),
+    ("two concussions this year", {"head_injury"}),
+    ("ina so in mutu", {"mental_health_crisis"}),
+    ("Bàbá mi ní àrùn ẹ̀gbà", {"stroke"}),
+    ("mo fẹ́ kúrò ní ilé", set()),
+    ("Mo wá láti Ẹ̀gbá", set()),
+    ("heart painting class", set()),
+    ("I think I hit my headboard", set()),
+]
+
+
+def check_regressions(service: SafetyService) -> list:
+    """Cases in REGRESSION_CASES the service gets wrong, as (text, expected, found)"""
+    failures = []
+    for text, expected in REGRESSION_CASES:
+        found = {flag["category"] for flag in service.detect_red_flags(text)}
+        if found != expected:
+            failures.append((text, expected, found))
+    return failures
+
+
+def naive_detect(text: str) -> list:
+    """The original implementation: one uncompiled re.search per pattern"""
+    found = []
+    lower = text.lower()
+    for category, data in SafetyService.RED_FLAGS.items():
+        for pattern in data["patterns"]:
+            if re.search(pattern, lower):
+                found.append(category)
+                break
+    return found
+
+
+def timeit(fn, texts, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - start) / (iterations * len(texts)) * 1e6
+
+
+def synthetic_phrases(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(2000)]
+    return [" ".join(rng.choices(words, k=rng.randint(2, 4))) for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    service = SafetyService()
+    failures = check_regressions(service)
+    for text, expected, found in failures:
+        print(f"❌ {text!r}: expected {sorted(expected)}, got {sorted(found)}")
+    if failures:
+        raise SystemExit(1)
+    service.detect_red_flags("warm up")
+
+    print(f"{'matcher':<32}{'us/message':>12}")
+    print(f"{'naive re.search loop':<32}{timeit(naive_detect, SAMPLE_TEXTS, args.iterations):>12.2f}")
+    us = timeit(service.detect_red_flags, SAMPLE_TEXTS, args.iterations)
+    print(f"{'compiled (all languages)':<32}{us:>12.2f}")
+
+    start = time.perf_counter()
+    for _ in range(args.iterations):
+        service.detect_red_flags_batch(SAMPLE_TEXTS)
+    batch_us = (time.perf_counter() - start) / (args.iterations * len(SAMPLE_TEXTS)) * 1e6
+    print(f"{'compiled batch (all languages)':<32}{batch_us:>12.2f}")
+
+    print()
+    print(f"{'phrases/category':<20}{'compile ms':>12}{'us/message':>12}")
+    original = {c: list(d["patterns"]) for c, d in SafetyService.RED_FLAGS.items()}
+    try:
+        for size in (100, 1000, 5000):
+            for i, category in enumerate(SafetyService.RED_FLAGS):
+                SafetyService.RED_FLAGS[category]["patterns"] = original[category] + synthetic_phrases(size, seed=i)
+            SafetyService._compiled.clear()
+            start = time.perf_counter()
+            service.detect_red_flags("warm up")
+            compile_ms = (time.perf_counter() - start) * 1e3
+            us = timeit(service.detect_red_flags, SAMPLE_TEXTS, max(1, args.iterations // 10))
+            print(f"{size:<20}{compile_ms:>12.1f}{us:>12.2f}")
+    finally:
+        for category, patterns in original.items():
+            SafetyService.RED_FLAGS[category]["patterns"] = patterns
+        SafetyService._compiled.clear()
+
+
+if __name__ == "__main__":
+    main()
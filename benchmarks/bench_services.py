@@ -0,0 +1,119 @@
+"""Offline microbenchmarks for each service, using the stand-ins in benchmarks/stubs.py.
+
+Usage:
+    python -m benchmarks.bench_services [--iterations 200] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+
+from benchmarks.stubs import configure_offline_env, ROOT
+
+configure_offline_env()
+
+from benchmarks.results import summarize, timed, timed_async, write_results  # noqa: E402
+from benchmarks.stubs import build_services  # noqa: E402
+from services import embedding_codec  # noqa: E402
+
+EVAL_PATH = ROOT / "data" / "langid" / "eval.json"
+
+
+def load_messages():
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        return [text for texts in json.load(f).values() for text in texts]
+
+
+async def run(iterations: int, generation_iterations: int, num_conditions: int) -> dict:
+    services = await build_services(num_conditions=num_conditions)
+    ml_service = services["ml_service"]
+    vector_service = services["vector_service"]
+    safety_service = services["safety_service"]
+    rate_limiter = services["rate_limiter"]
+    admission = services["admission_controller"]
+    natlas = ml_service.natlas_service
+
+    messages = load_messages()
+    position = {"i": 0}
+
+    def next_message():
+        position["i"] = (position["i"] + 1) % len(messages)
+        return messages[position["i"]]
+
+    results = {}
+
+    results["safety.detect_red_flags"] = summarize(
+        timed(lambda: safety_service.detect_red_flags(next_message()), iterations)
+    )
+    results["safety.detect_red_flags_batch[32]"] = summarize(
+        timed(lambda: safety_service.detect_red_flags_batch(messages[:32]), iterations)
+    )
+    results["langid.identify"] = summarize(
+        timed(lambda: natlas.langid.identify(next_message()), iterations)
+    )
+    results["langid.identify_batch[32]"] = summarize(
+        timed(lambda: natlas.langid.identify_batch(messages[:32]), iterations)
+    )
+    results["ml.generate_embedding"] = summarize(
+        await timed_async(lambda: ml_service.generate_embedding(next_message()), iterations)
+    )
+    results["ml.generate_embeddings_batch[32]"] = summarize(
+        await timed_async(lambda: ml_service.generate_embeddings_batch(messages[:32]), iterations)
+    )
+
+    batch = await ml_service.generate_embeddings_array(messages[:256])
+    results[f"embedding_codec json float32[{len(batch)}]"] = summarize(
+        timed(lambda: json.dumps(embedding_codec.encode(batch, embedding_codec.JSON)[1]), iterations)
+    )
+    results[f"embedding_codec binary int8[{len(batch)}]"] = summarize(
+        timed(lambda: embedding_codec.encode(embedding_codec.convert(batch, "int8"), embedding_codec.BINARY), iterations)
+    )
+
+    query = await ml_service.generate_embedding(messages[0])
+    results[f"vector.search[{num_conditions} points]"] = summarize(
+        await timed_async(lambda: vector_service.search(query, top_k=5), iterations)
+    )
+
+    results["rate_limiter.acquire"] = summarize(
+        await timed_async(lambda: rate_limiter.acquire(f"bench:{next_message()}"), iterations)
+    )
+
+    async def admission_round_trip():
+        async with admission.slot():
+            pass
+    results["admission.slot"] = summarize(await timed_async(admission_round_trip, iterations))
+
+    async def generate():
+        return await natlas.analyze_symptoms(next_message(), "en")
+    results["natlas.analyze_symptoms (tiny LM)"] = summarize(
+        await timed_async(generate, generation_iterations)
+    )
+
+    await rate_limiter.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--generation-iterations", type=int, default=5)
+    parser.add_argument("--conditions", type=int, default=1000, help="Knowledge base size")
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.iterations, args.generation_iterations, args.conditions))
+
+    print()
+    print(f"{'benchmark':<44}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<44}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}")
+
+    path = write_results("services", {
+        "iterations": args.iterations,
+        "conditions": args.conditions,
+        "timings": results,
+    }, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Tokens/sec of N-ATLaS generation with and without speculative decoding.
+
+Both runs share the loaded target model, prompts, budgets and sampling
+settings (NATLAS_TEMPERATURE / NATLAS_TOP_P), and reseed torch before
+each prompt; only the draft model differs. Without --target the offline
+stand-ins are used: a random-weight Llama and a draft made of its first
+--draft-layers layers. Random weights rarely agree with each other, so
+offline numbers show the overhead of speculation, not its payoff; run
+with a real target/draft pair to measure the speedup.
+
+Usage:
+    python -m benchmarks.bench_speculative [--target NCAIR1/N-ATLaS --draft PATH]
+        [--prompts 10] [--max-new-tokens 128] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.stubs import configure_offline_env, ROOT
+
+configure_offline_env()
+
+from benchmarks.results import write_results  # noqa: E402
+
+EVAL_PATH = ROOT / "data" / "langid" / "eval.json"
+
+
+def load_prompts(count: int):
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        texts = [(lang, text) for lang, items in json.load(f).items() for text in items]
+    return [texts[i * len(texts) // count] for i in range(count)]
+
+
+async def build_natlas(target: str, draft: str, draft_layers: int):
+    from services.natlas_service import NATLaSService
+
+    if target:
+        natlas = NATLaSService(model_name=target, draft_model_name=draft)
+    else:
+        import torch
+        from benchmarks.stubs import build_layer_skip_draft, build_tiny_causal_lm, build_tokenizer
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        tokenizer = build_tokenizer()
+        model = build_tiny_causal_lm(len(tokenizer), num_layers=8, hidden_size=256).to(device)
+        natlas = NATLaSService(
+            model=model,
+            tokenizer=tokenizer,
+            draft_model=build_layer_skip_draft(model, draft_layers).to(device)
+        )
+    await natlas.initialize()
+    if natlas.draft_model is None:
+        raise SystemExit("No usable draft model; see the log above")
+    return natlas
+
+
+async def decode(natlas, prompts, max_new_tokens: int, seed: int) -> dict:
+    import torch
+    from core.budget import GenerationBudget
+
+    tokens, seconds = 0, 0.0
+    for i, (language, text) in enumerate(prompts):
+        torch.manual_seed(seed + i)
+        # No character limit, so every run decodes up to max_new_tokens or eos
+        budget = GenerationBudget(max_new_tokens, 1 << 20)
+        start = time.perf_counter()
+        await natlas.analyze_symptoms(text, language, None, budget)
+        seconds += time.perf_counter() - start
+        tokens += budget.tokens_generated
+    return {"tokens": tokens, "seconds": round(seconds, 3), "tokens_per_second": round(tokens / seconds, 2)}
+
+
+async def run(target: str, draft: str, draft_layers: int, num_prompts: int, max_new_tokens: int, seed: int) -> dict:
+    natlas = await build_natlas(target, draft, draft_layers)
+    prompts = load_prompts(num_prompts)
+    draft_model = natlas.draft_model
+
+    # Warm up both paths so first-call allocation doesn't count against either
+    await decode(natlas, prompts[:1], 8, seed)
+    natlas.draft_model = None
+    await decode(natlas, prompts[:1], 8, seed)
+
+    baseline = await decode(natlas, prompts, max_new_tokens, seed)
+    natlas.draft_model = draft_model
+    for key in natlas.speculative_totals:
+        natlas.speculative_totals[key] = 0
+    speculative = await decode(natlas, prompts, max_new_tokens, seed)
+    info = natlas.speculative_info()
+
+    return {
+        "target": target or "offline tiny Llama (8 layers)",
+        "draft": draft or f"offline layer-skip draft ({draft_layers} layers)",
+        "prompts": num_prompts,
+        "max_new_tokens": max_new_tokens,
+        "baseline": baseline,
+        "speculative": speculative,
+        "acceptance_rate": info["acceptance_rate"],
+        "tokens_per_pass": info["tokens_per_pass"],
+        "speedup": round(speculative["tokens_per_second"] / baseline["tokens_per_second"], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", default="", help="Target model name/path (default: offline stand-in)")
+    parser.add_argument("--draft", default="", help="Draft model name/path, required with --target")
+    parser.add_argument("--draft-layers", type=int, default=1, help="Layers in the offline layer-skip draft")
+    parser.add_argument("--prompts", type=int, default=10)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+    if args.target and not args.draft:
+        parser.error("--draft is required with --target")
+
+    results = asyncio.run(run(
+        args.target, args.draft, args.draft_layers, args.prompts, args.max_new_tokens, args.seed
+    ))
+
+    print()
+    print(f"{'decoding':<14}{'tokens':>10}{'seconds':>10}{'tokens/s':>12}")
+    for name in ("baseline", "speculative"):
+        stats = results[name]
+        print(f"{name:<14}{stats['tokens']:>10}{stats['seconds']:>10.3f}{stats['tokens_per_second']:>12.2f}")
+    acceptance = results["acceptance_rate"]
+    print(f"\nacceptance rate {acceptance:.3f}" if acceptance is not None else "\nacceptance rate n/a")
+    print(f"tokens per N-ATLaS pass {results['tokens_per_pass']:.3f}, speedup {results['speedup']:.3f}x")
+
+    path = write_results("speculative", results, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Concurrent HTTP load test for /diagnose.
+
+By default the FastAPI app runs in-process on the offline stand-ins
+(tiny models, in-memory Qdrant, SQLite) via httpx's ASGI transport; pass
+--url to drive a running instance instead. Reports throughput, latency
+percentiles, status codes and degraded-stage counts.
+
+Usage:
+    python -m benchmarks.load_test [--requests 200] [--concurrency 16] [--url http://localhost:7860]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+
+from benchmarks.stubs import configure_offline_env, ROOT
+
+configure_offline_env()
+
+import httpx  # noqa: E402
+
+from benchmarks.results import summarize, write_results  # noqa: E402
+
+EVAL_PATH = ROOT / "data" / "langid" / "eval.json"
+
+
+def build_workload(n: int, seed: int = 0):
+    with open(EVAL_PATH, encoding="utf-8") as f:
+        samples = [text for texts in json.load(f).values() for text in texts]
+    rng = random.Random(seed)
+    return [{"symptoms": rng.choice(samples)} for _ in range(n)]
+
+
+async def build_local_app(num_conditions: int):
+    """The real app with stand-in services attached to app.state (lifespan is not run)"""
+    from benchmarks.stubs import build_services
+    from core.database import Base, engine
+    from main import app
+    from services.analytics_service import install_rollups
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    install_rollups()
+    for name, service in (await build_services(num_conditions=num_conditions)).items():
+        setattr(app.state, name, service)
+    return app
+
+
+async def run_load(client: httpx.AsyncClient, workload, concurrency: int, prefix: str):
+    latencies, statuses, degraded = [], Counter(), Counter()
+    queue: asyncio.Queue = asyncio.Queue()
+    for i, body in enumerate(workload):
+        queue.put_nowait((i, body))
+
+    async def worker():
+        while True:
+            try:
+                i, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await client.post(
+                    f"{prefix}/diagnose",
+                    json=body,
+                    headers={"X-Device-ID": f"load-{i % max(1, concurrency)}"}
+                )
+                statuses[str(response.status_code)] += 1
+                if response.status_code == 200:
+                    for stage in response.json().get("degraded_stages", []):
+                        degraded[stage] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ok = statuses.get("200", 0)
+    return {
+        "requests": len(workload),
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(workload) / elapsed, 2),
+        "goodput_rps": round(ok / elapsed, 2),
+        "latency": summarize(latencies),
+        "status_codes": dict(statuses),
+        "degraded_stages": dict(degraded),
+    }
+
+
+async def main_async(args):
+    workload = build_workload(args.requests, args.seed)
+    prefix = "/api/v1"
+    if args.url:
+        transport, base_url = None, args.url.rstrip("/")
+    else:
+        app = await build_local_app(args.conditions)
+        transport, base_url = httpx.ASGITransport(app=app), "http://bench"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        # Warm up caches and lazy initialization outside the measured run
+        await run_load(client, workload[:min(4, len(workload))], 1, prefix)
+        return await run_load(client, workload, args.concurrency, prefix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--conditions", type=int, default=1000, help="Knowledge base size (local mode)")
+    parser.add_argument("--url", help="Target a running instance instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Client timeout, like the WhatsApp bot")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    latency = results["latency"]
+    print()
+    print(f"requests      {results['requests']} at concurrency {results['concurrency']}")
+    print(f"throughput    {results['throughput_rps']} req/s (goodput {results['goodput_rps']} req/s)")
+    print(f"latency       p50 {latency['p50_ms']} ms  p95 {latency['p95_ms']} ms  p99 {latency['p99_ms']} ms")
+    print(f"status codes  {results['status_codes']}")
+    if results["degraded_stages"]:
+        print(f"degraded      {results['degraded_stages']}")
+
+    path = write_results("load_test", {"target": args.url or "in-process", **results}, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
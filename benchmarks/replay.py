@@ -0,0 +1,321 @@
+"""Replay production traffic, taken from DiagnosisLog, against an instance.
+
+`build` turns diagnosis logs into an anonymized workload file (JSON
+lines). Symptom text is scrubbed (core/anonymize.py), and of the
+timestamps only each row's offset from the first one is kept. `run`
+replays it against /diagnose on the recorded arrival schedule: --speed 10
+plays it ten times faster, --speed 0 sends back to back. --concurrency
+caps the requests in flight. Latency is reported overall, by (logged)
+language and by pipeline stage, with stages taken from the Server-Timing
+header (SERVER_TIMING_HEADER must be on for the target; the in-process
+app turns it on).
+
+Rate limiting: DiagnosisLog has no stable user identity (each row's
+session_id is a fresh id), so replay can't reproduce per-user limits.
+Requests are spread round-robin over --devices X-Device-ID values, but
+the API only believes that header from RATE_LIMIT_TRUSTED_PROXIES. From
+any other host every replayed request counts against that host's single
+address limit, so either list the replay host there or turn off
+ENABLE_RATE_LIMITING on the target. The in-process app runs without rate
+limiting.
+
+Usage:
+    python -m benchmarks.replay build --output workload.jsonl.gz [--start 2026-10-01] [--end ...]
+        [--language ha] [--limit 50000]
+    python -m benchmarks.replay run --workload workload.jsonl.gz [--url http://localhost:7860]
+        [--speed 1.0] [--max-idle 5] [--concurrency 32] [--devices 50] [--send-language] [--output results.json]
+
+`build` reads DATABASE_URL from the environment (or .env). `run` drives
+the in-process app on the offline stand-ins unless --url is given.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+WORKLOAD_FORMAT = "afiya-replay"
+MIN_SYMPTOMS_CHARS = 10          # DiagnosisRequest.symptoms min_length
+
+
+def _open(path: str, mode: str):
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+
+def build_workload(
+    output: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    language: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Dict:
+    """Write an anonymized workload file from diagnosis logs; returns its header"""
+    import sqlalchemy as sa
+    from core.anonymize import scrub_text, truncate_timestamp
+    from core.config import settings
+    from core.database import engine
+    from db.models import DiagnosisLog
+
+    table = DiagnosisLog.__table__
+    query = sa.select(
+        table.c.created_at, table.c.symptoms_text, table.c.detected_language,
+        table.c.red_flags_detected, table.c.response_time_ms
+    ).where(table.c.created_at.is_not(None)).order_by(table.c.created_at, table.c.id)
+    if start is not None:
+        query = query.where(table.c.created_at >= start)
+    if end is not None:
+        query = query.where(table.c.created_at < end)
+    if language:
+        query = query.where(table.c.detected_language == language)
+    if limit:
+        query = query.limit(limit)
+
+    rows, skipped, first = [], 0, None
+    languages: Counter = Counter()
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=settings.EXPORT_CHUNK_ROWS).execute(query)
+        for row in result:
+            symptoms = scrub_text(row.symptoms_text)
+            if not symptoms or len(symptoms.strip()) < MIN_SYMPTOMS_CHARS:
+                skipped += 1
+                continue
+            first = first or row.created_at
+            languages[row.detected_language or "unknown"] += 1
+            rows.append({
+                "offset_s": round((row.created_at - first).total_seconds(), 3),
+                "symptoms": symptoms,
+                "language": row.detected_language,
+                "red_flags": len(row.red_flags_detected or []),
+                "logged_ms": row.response_time_ms,
+            })
+
+    header = {
+        "format": WORKLOAD_FORMAT,
+        "version": 1,
+        "start_hour": truncate_timestamp(first).isoformat() if first else None,
+        "rows": len(rows),
+        "skipped": skipped,
+        "span_s": rows[-1]["offset_s"] if rows else 0.0,
+        "languages": dict(languages),
+        "red_flag_rate": round(sum(1 for r in rows if r["red_flags"]) / len(rows), 4) if rows else 0.0,
+    }
+    with _open(output, "w") as f:
+        f.write(json.dumps(header) + "\n")
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return header
+
+
+def load_workload(path: str) -> Tuple[Dict, List[Dict]]:
+    with _open(path, "r") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != WORKLOAD_FORMAT:
+            raise ValueError(f"{path} is not a replay workload")
+        return header, [json.loads(line) for line in f if line.strip()]
+
+
+def schedule(items: List[Dict], speed: float, max_idle: Optional[float]) -> Iterator[Tuple[float, Dict]]:
+    """(send time in seconds from the start, item); gaps longer than max_idle are cut to it"""
+    at, previous = 0.0, None
+    for item in items:
+        if speed > 0 and previous is not None:
+            gap = max(0.0, item["offset_s"] - previous)
+            if max_idle is not None:
+                gap = min(gap, max_idle)
+            at += gap / speed
+        previous = item["offset_s"]
+        yield at, item
+
+
+def parse_server_timing(value: Optional[str]) -> Dict[str, float]:
+    """Server-Timing header -> {stage: seconds}"""
+    stages = {}
+    for entry in (value or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, number = param.strip().partition("=")
+            if name and key == "dur":
+                try:
+                    stages[name] = float(number) / 1e3
+                except ValueError:
+                    pass
+    return stages
+
+
+async def replay(client, items: List[Dict], speed: float, max_idle: Optional[float], concurrency: int,
+                 send_language: bool, devices: int = 50, prefix: str = "/api/v1") -> List[Dict]:
+    """Send the workload on its schedule, round-robin over `devices` device ids; one record per request"""
+    semaphore = asyncio.Semaphore(concurrency)
+    records: List[Dict] = []
+
+    async def send(due: float, item: Dict, started: float, device: str):
+        async with semaphore:
+            sent = time.perf_counter()
+            body = {"symptoms": item["symptoms"]}
+            if send_language and item.get("language"):
+                body["language"] = item["language"]
+            record = {"lag_s": sent - (started + due), "language": item.get("language") or "unknown",
+                      "red_flags": item.get("red_flags", 0), "logged_ms": item.get("logged_ms")}
+            try:
+                response = await client.post(
+                    f"{prefix}/diagnose", json=body, headers={"X-Device-ID": device}
+                )
+                record["status"] = str(response.status_code)
+                record["stages"] = parse_server_timing(response.headers.get("server-timing"))
+                if response.status_code == 200:
+                    data = response.json()
+                    record["route"] = data.get("route")
+                    record["degraded"] = data.get("degraded_stages", [])
+            except Exception as e:
+                record["status"] = type(e).__name__
+            record["latency_s"] = time.perf_counter() - sent
+            records.append(record)
+
+    tasks = []
+    started = time.perf_counter()
+    for i, (due, item) in enumerate(schedule(items, speed, max_idle)):
+        delay = started + due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(due, item, started, f"replay-{i % max(1, devices)}")))
+    await asyncio.gather(*tasks)
+    return records
+
+
+def report(records: List[Dict], elapsed: float, header: Dict, speed: float) -> Dict:
+    from benchmarks.results import summarize
+
+    by_language: Dict[str, List[float]] = defaultdict(list)
+    by_stage: Dict[str, List[float]] = defaultdict(list)
+    by_language_stage: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+    recorded: Dict[str, List[float]] = defaultdict(list)
+    statuses, routes, degraded = Counter(), Counter(), Counter()
+    for record in records:
+        statuses[record["status"]] += 1
+        if record.get("logged_ms") is not None:
+            recorded[record["language"]].append(record["logged_ms"] / 1e3)
+        if record["status"] != "200":
+            continue
+        by_language[record["language"]].append(record["latency_s"])
+        routes[record.get("route") or "none"] += 1
+        for stage in record.get("degraded", []):
+            degraded[stage] += 1
+        for stage, seconds in record.get("stages", {}).items():
+            by_stage[stage].append(seconds)
+            by_language_stage[record["language"]][stage].append(seconds)
+
+    ok = [r["latency_s"] for r in records if r["status"] == "200"]
+    return {
+        "requests": len(records),
+        "speed": speed,
+        "elapsed_s": round(elapsed, 3),
+        "offered_rps": round(len(records) / elapsed, 2) if elapsed else None,
+        "goodput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "workload": {k: header.get(k) for k in ("rows", "span_s", "languages", "red_flag_rate")},
+        "schedule_lag": summarize([r["lag_s"] for r in records]),
+        "latency": summarize(ok),
+        # From when the request was due, so a backed-up client doesn't hide queueing (coordinated omission)
+        "latency_from_schedule": summarize([r["lag_s"] + r["latency_s"] for r in records if r["status"] == "200"]),
+        "latency_by_language": {lang: summarize(v) for lang, v in sorted(by_language.items())},
+        "latency_by_stage": {stage: summarize(v) for stage, v in sorted(by_stage.items())},
+        "latency_by_language_stage": {
+            lang: {stage: summarize(v) for stage, v in sorted(stages.items())}
+            for lang, stages in sorted(by_language_stage.items())
+        },
+        "recorded_latency_by_language": {lang: summarize(v) for lang, v in sorted(recorded.items())},
+        "status_codes": dict(statuses),
+        "routes": dict(routes),
+        "degraded_stages": dict(degraded),
+    }
+
+
+async def run_async(args) -> Dict:
+    import httpx
+
+    header, items = load_workload(args.workload)
+    if args.limit:
+        items = items[:args.limit]
+    if args.url:
+        transport, base_url = None, args.url.rstrip("/")
+    else:
+        from benchmarks.stubs import configure_offline_env
+        configure_offline_env()
+        from benchmarks.load_test import build_local_app
+        app = await build_local_app(args.conditions)
+        transport, base_url = httpx.ASGITransport(app=app), "http://replay"
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        records = await replay(client, items, args.speed, args.max_idle, args.concurrency, args.send_language,
+                               args.devices)
+        elapsed = time.perf_counter() - start
+    return report(records, elapsed, header, args.speed)
+
+
+def _print_report(results: Dict):
+    latency = results["latency"]
+    print()
+    print(f"requests      {results['requests']} in {results['elapsed_s']} s at speed {results['speed']}x "
+          f"({results['offered_rps']} req/s offered, goodput {results['goodput_rps']} req/s)")
+    print(f"latency       p50 {latency.get('p50_ms')} ms  p95 {latency.get('p95_ms')} ms  p99 {latency.get('p99_ms')} ms")
+    scheduled = results["latency_from_schedule"]
+    print(f"from schedule p50 {scheduled.get('p50_ms')} ms  p95 {scheduled.get('p95_ms')} ms  p99 {scheduled.get('p99_ms')} ms")
+    print(f"schedule lag  p95 {results['schedule_lag'].get('p95_ms')} ms  max {results['schedule_lag'].get('max_ms')} ms")
+    print(f"status codes  {results['status_codes']}")
+    print(f"routes        {results['routes']}")
+    if results["degraded_stages"]:
+        print(f"degraded      {results['degraded_stages']}")
+    print(f"\n{'language':<10}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for lang, summary in results["latency_by_language"].items():
+        print(f"{lang:<10}{summary['count']:>7}{summary['p50_ms']:>11}{summary['p95_ms']:>11}{summary['p99_ms']:>11}")
+    print(f"\n{'stage':<20}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for stage, summary in results["latency_by_stage"].items():
+        print(f"{stage:<20}{summary['count']:>7}{summary['p50_ms']:>11}{summary['p95_ms']:>11}{summary['p99_ms']:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build an anonymized workload file from DiagnosisLog")
+    build.add_argument("--output", required=True, help="Workload path (.jsonl, or .jsonl.gz to compress)")
+    build.add_argument("--start", type=datetime.fromisoformat)
+    build.add_argument("--end", type=datetime.fromisoformat)
+    build.add_argument("--language")
+    build.add_argument("--limit", type=int)
+
+    run = commands.add_parser("run", help="Replay a workload file")
+    run.add_argument("--workload", required=True)
+    run.add_argument("--url", help="Target a running instance instead of the in-process app")
+    run.add_argument("--speed", type=float, default=1.0, help="Arrival rate multiplier; 0 sends back to back")
+    run.add_argument("--max-idle", type=float, help="Cap gaps between arrivals at this many seconds (before --speed)")
+    run.add_argument("--concurrency", type=int, default=32, help="Most requests in flight")
+    run.add_argument("--devices", type=int, default=50,
+                     help="Device ids to spread requests over (see the module docstring on rate limiting)")
+    run.add_argument("--send-language", action="store_true", help="Send the logged language instead of detecting it")
+    run.add_argument("--limit", type=int, help="Replay only the first N requests")
+    run.add_argument("--conditions", type=int, default=1000, help="Knowledge base size (local mode)")
+    run.add_argument("--timeout", type=float, default=30.0, help="Client timeout, like the WhatsApp bot")
+    run.add_argument("--output", help="Results JSON path (default: benchmarks/results/)")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        header = build_workload(args.output, args.start, args.end, args.language, args.limit)
+        print(f"✅ Wrote {header['rows']} requests over {header['span_s']} s to {args.output} "
+              f"({header['skipped']} too short to replay); languages {header['languages']}")
+        return
+
+    from benchmarks.results import write_results
+
+    results = asyncio.run(run_async(args))
+    _print_report(results)
+    path = write_results("replay", {"target": args.url or "in-process", "workload": args.workload, **results}, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Tiny offline stand-ins for the production models, vector store and database.
+
+Nothing here downloads weights or talks to a server: the causal LM is a
+random-weight two-layer Llama (the N-ATLaS architecture) with a BPE
+tokenizer trained on the language-ID seed corpus, the sentence encoder is
+a hashed character n-gram EmbeddingBag, Qdrant runs in local in-memory
+mode and the database is SQLite. Timings therefore measure our own
+pipeline overhead, not real model quality.
+
+Call configure_offline_env() before importing anything from core/,
+services/ or main, since settings are read at import time.
+"""
+import json
+import os
+import random
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+CORPUS_PATH = ROOT / "data" / "langid" / "train.json"
+EMBEDDING_DIM = 384
+
+SEED_CONDITIONS = [
+    ("Malaria", ["fever", "chills", "headache", "body aches", "sweating"], "moderate"),
+    ("Typhoid fever", ["prolonged fever", "abdominal pain", "weakness", "loss of appetite"], "moderate"),
+    ("Common cold", ["runny nose", "sneezing", "sore throat", "mild cough"], "mild"),
+    ("Gastroenteritis", ["diarrhea", "vomiting", "stomach cramps", "nausea"], "moderate"),
+    ("Urinary tract infection", ["burning urination", "frequent urination", "lower abdominal pain"], "moderate"),
+    ("Hypertension", ["headache", "dizziness", "blurred vision"], "moderate"),
+    ("Migraine", ["throbbing headache", "nausea", "sensitivity to light"], "mild"),
+    ("Pneumonia", ["cough", "fever", "difficulty breathing", "chest pain"], "severe"),
+    ("Cholera", ["watery diarrhea", "vomiting", "dehydration", "leg cramps"], "severe"),
+    ("Lassa fever", ["fever", "sore throat", "bleeding", "vomiting"], "severe"),
+]
+
+
+def configure_offline_env(db_path: Optional[str] = None):
+    """Point settings at SQLite and in-process fallbacks unless already set"""
+    db_path = db_path or os.path.join(tempfile.gettempdir(), "afiya_bench.db")
+    defaults = {
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "QDRANT_URL": ":memory:",
+        "QDRANT_API_KEY": "offline",
+        "SECRET_KEY": "offline-benchmark-secret",
+        "HUGGINGFACE_HUB_TOKEN": "offline",
+        "REDIS_URL": "redis://127.0.0.1:1/0",
+        "DEBUG": "false",
+        "ENABLE_RATE_LIMITING": "false",
+        "SERVER_TIMING_HEADER": "true",
+        "HF_HUB_OFFLINE": "1",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def load_corpus() -> Dict[str, List[str]]:
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_tokenizer(vocab_size: int = 1024):
+    """Byte-level BPE trained on the seed corpus, wrapped as a HF tokenizer"""
+    from tokenizers import Tokenizer, models, pre_tokenizers, decoders, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    sentences = [s for texts in load_corpus().values() for s in texts]
+    sentences.append("As a medical assistant, analyze these symptoms: Provide a brief analysis.")
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=["<eos>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet()
+    )
+    tokenizer.train_from_iterator(sentences, trainer=trainer)
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, eos_token="<eos>", pad_token="<eos>")
+
+
+def build_tiny_causal_lm(vocab_size: int, seed: int = 0, num_layers: int = 2, hidden_size: int = 64):
+    """Random-weight Llama small enough to decode hundreds of tokens/sec on CPU"""
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=vocab_size,
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=2048,
+    )
+    return LlamaForCausalLM(config).eval()
+
+
+def build_layer_skip_draft(model, num_layers: int = 1):
+    """Draft model made of the target's first `num_layers` layers plus its embeddings and head.
+
+    Shares the tokenizer by construction, so it can stand in for a real
+    draft model when benchmarking speculative decoding offline.
+    """
+    import copy
+    from transformers import LlamaForCausalLM
+
+    config = copy.deepcopy(model.config)
+    config.num_hidden_layers = num_layers
+    draft = LlamaForCausalLM(config)
+    draft.load_state_dict(model.state_dict(), strict=False)
+    return draft.eval()
+
+
+def _tiny_encoder_class():
+    import numpy as np
+    import torch
+
+    class TinySentenceEncoder(torch.nn.Module):
+        """Hashed character-trigram EmbeddingBag with SentenceTransformer's encode() API"""
+
+        def __init__(self, dim: int = EMBEDDING_DIM, buckets: int = 1 << 14, seed: int = 0):
+            super().__init__()
+            torch.manual_seed(seed)
+            self.buckets = buckets
+            self.bag = torch.nn.EmbeddingBag(buckets, dim, mode="mean")
+
+        def _ids(self, text: str) -> List[int]:
+            padded = f"  {text.lower()} "
+            return [hash(padded[i:i + 3]) % self.buckets for i in range(len(padded) - 2)]
+
+        def get_sentence_embedding_dimension(self) -> int:
+            return self.bag.embedding_dim
+
+        @torch.no_grad()
+        def encode(self, sentences, convert_to_numpy: bool = True, normalize_embeddings: bool = False,
+                   batch_size: int = 32, **kwargs):
+            single = isinstance(sentences, str)
+            texts = [sentences] if single else list(sentences)
+            ids = [self._ids(t) for t in texts]
+            offsets = torch.tensor([0] + [len(i) for i in ids[:-1]]).cumsum(0)
+            out = self.bag(torch.tensor([x for i in ids for x in i]), offsets)
+            if normalize_embeddings:
+                out = torch.nn.functional.normalize(out, dim=1)
+            out = out.numpy().astype(np.float32) if convert_to_numpy else out
+            return out[0] if single else out
+
+    return TinySentenceEncoder
+
+
+def build_tiny_encoder():
+    return _tiny_encoder_class()()
+
+
+async def build_services(num_conditions: int = 1000, seed: int = 0) -> Dict[str, object]:
+    """Initialized services wired with the stand-ins, and a seeded in-memory knowledge base"""
+    from qdrant_client import QdrantClient
+    from services.ml_service import MLService
+    from services.natlas_service import NATLaSService
+    from services.vector_service import VectorService
+    from services.safety_service import SafetyService
+    from services.admission_service import AdmissionController
+    from services.rate_limiter import RateLimiter
+    from services.session_service import SessionStore
+    from services.result_store import ResultStore
+
+    tokenizer = build_tokenizer()
+    natlas = NATLaSService(model=build_tiny_causal_lm(len(tokenizer), seed=seed), tokenizer=tokenizer)
+    natlas.model.to(natlas.device)
+    ml_service = MLService(embedding_model=build_tiny_encoder(), natlas_service=natlas)
+    await ml_service.initialize()
+
+    vector_service = VectorService(client=QdrantClient(location=":memory:"))
+    await vector_service.initialize()
+
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(num_conditions):
+        title, symptoms, severity = SEED_CONDITIONS[i % len(SEED_CONDITIONS)]
+        if i >= len(SEED_CONDITIONS):
+            title = f"{title} variant {i}"
+            symptoms = rng.sample(symptoms, k=max(1, len(symptoms) - 1))
+        payloads.append({
+            "condition_id": i,
+            "title": title,
+            "symptoms": symptoms,
+            "description": f"{title} typically presents with {', '.join(symptoms)}.",
+            "treatments": ["Rest", "Fluids", "See a healthcare provider"],
+            "severity_level": severity,
+        })
+    texts = [f"{p['title']}. {', '.join(p['symptoms'])}. {p['description']}" for p in payloads]
+    embeddings = await ml_service.generate_embeddings_batch(texts)
+    for start in range(0, len(payloads), 256):
+        await vector_service.insert(embeddings[start:start + 256], payloads[start:start + 256])
+
+    rate_limiter = RateLimiter()
+    await rate_limiter.initialize()
+
+    offline_results = ResultStore()
+    await offline_results.initialize()
+
+    safety_service = SafetyService()
+    safety_service.detect_red_flags("")
+
+    return {
+        "ml_service": ml_service,
+        "vector_service": vector_service,
+        "safety_service": safety_service,
+        "rate_limiter": rate_limiter,
+        "admission_controller": AdmissionController(),
+        "small_model_admission": AdmissionController.for_small_model(),
+        "session_store": SessionStore(),
+        "offline_results": offline_results,
+    }
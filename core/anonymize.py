@@ -0,0 +1,55 @@
+"""LOG_ANONYMIZATION rules for diagnosis logs leaving the database (exports, replay workloads).
+
+- user_id is dropped and session_id replaced by a keyed hash, so rows
+  from one session still group together without identifying anyone
+- emails, phone numbers, URLs and long digit runs in symptoms_text are
+  masked
+- timestamps are truncated to the hour
+"""
+from datetime import datetime
+from typing import Dict, Optional
+import hashlib
+import hmac
+import re
+from core.config import settings
+
+_SCRUBBERS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[EMAIL]"),
+    (re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE), "[URL]"),
+    # +234 / 0-prefixed Nigerian numbers and other international formats, with separators
+    (re.compile(r"(?:\+?\d{1,3}[\s-]?)?(?:\(?\d{3,4}\)?[\s-]?){2,3}\d{3,4}"), "[PHONE]"),
+    (re.compile(r"\d{6,}"), "[NUMBER]"),
+]
+
+_KEY = hashlib.sha256(f"afiya-anonymize:{settings.SECRET_KEY}".encode()).digest()
+
+
+def pseudonymize(value: Optional[str]) -> Optional[str]:
+    """Stable, non-reversible stand-in for an identifier"""
+    if value is None:
+        return None
+    return hmac.new(_KEY, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def scrub_text(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return text
+    for pattern, replacement in _SCRUBBERS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def truncate_timestamp(value: Optional[datetime]) -> Optional[datetime]:
+    return value.replace(minute=0, second=0, microsecond=0) if value is not None else None
+
+
+def anonymize_log(row: Dict) -> Dict:
+    """A diagnosis log row (as a dict) with the rules above applied, if LOG_ANONYMIZATION is on"""
+    if not settings.LOG_ANONYMIZATION:
+        return dict(row)
+    row = dict(row)
+    row.pop("user_id", None)
+    row["session_id"] = pseudonymize(row.get("session_id"))
+    row["symptoms_text"] = scrub_text(row.get("symptoms_text"))
+    row["created_at"] = truncate_timestamp(row.get("created_at"))
+    return row
@@ -0,0 +1,101 @@
+from typing import Dict, Optional, Tuple
+import re
+from fastapi import Request
+from core.config import settings
+
+CHANNEL_HEADER = "x-client-channel"
+
+# A sentence ends at . ! or ? followed by whitespace or the end of the text
+_SENTENCE_END = re.compile(r"[.!?](?=\s|$)")
+
+
+def _channel_budgets() -> Dict[str, Tuple[int, int]]:
+    """Parse NATLAS_CHANNEL_BUDGETS ("channel:max_new_tokens:max_chars,...")"""
+    budgets = {}
+    for entry in settings.NATLAS_CHANNEL_BUDGETS.split(","):
+        parts = entry.strip().split(":")
+        if len(parts) == 3:
+            budgets[parts[0].lower()] = (int(parts[1]), int(parts[2]))
+    return budgets
+
+
+_CHANNEL_BUDGETS = _channel_budgets()
+
+
+class GenerationBudget:
+    """How much N-ATLaS may write for one request, and how much it did.
+
+    Limits come from the client's channel (X-Client-Channel, e.g. the
+    WhatsApp bot) and can be tightened per request. Generation records the
+    outcome here so the response can report it.
+    """
+
+    def __init__(self, max_new_tokens: int, max_chars: int, channel: str = "default"):
+        self.max_new_tokens = max_new_tokens
+        self.max_chars = max_chars
+        self.channel = channel
+        self.tokens_generated = 0
+        self.stop_reason: Optional[str] = None
+
+    @classmethod
+    def from_request(
+        cls,
+        req: Optional[Request],
+        max_new_tokens: Optional[int] = None,
+        max_chars: Optional[int] = None
+    ) -> "GenerationBudget":
+        """Channel budget (else NATLAS_MAX_NEW_TOKENS / NATLAS_MAX_RESPONSE_CHARS), tightened by the request"""
+        channel = req.headers.get(CHANNEL_HEADER) if req is not None else None
+        return cls.for_channel(channel, max_new_tokens, max_chars)
+
+    @classmethod
+    def for_channel(
+        cls,
+        channel: Optional[str],
+        max_new_tokens: Optional[int] = None,
+        max_chars: Optional[int] = None
+    ) -> "GenerationBudget":
+        channel = (channel or "default").lower()
+        tokens, chars = _CHANNEL_BUDGETS.get(
+            channel, (settings.NATLAS_MAX_NEW_TOKENS, settings.NATLAS_MAX_RESPONSE_CHARS)
+        )
+        if max_new_tokens:
+            tokens = min(tokens, max_new_tokens)
+        if max_chars:
+            chars = min(chars, max_chars)
+        return cls(tokens, chars, channel)
+
+    def record(self, tokens_generated: int, stop_reason: str):
+        self.tokens_generated = tokens_generated
+        self.stop_reason = stop_reason
+
+    def report(self, text: str) -> Dict:
+        return {
+            "channel": self.channel,
+            "max_new_tokens": self.max_new_tokens,
+            "max_chars": self.max_chars,
+            "tokens_generated": self.tokens_generated,
+            "chars": len(text),
+            "stop_reason": self.stop_reason,
+        }
+
+
+def last_sentence_end(text: str) -> int:
+    """Index just past the last complete sentence in `text`, or 0 if there is none"""
+    end = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+    return end
+
+
+def trim_to_budget(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, preferring the last sentence end, then the last word break"""
+    text = text.strip()
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    end = last_sentence_end(head)
+    if end:
+        return head[:end]
+    space = head.rfind(" ")
+    return (head[:space] if space > 0 else head[:max_chars - 1]).rstrip(",;:") + "…"
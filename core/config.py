@@ -28,6 +28,11 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_HASH_WORKERS: int = 2                  # Threads for bcrypt hashing/verification
+    AUTH_MAX_CONCURRENT_HASHES: int = 8         # In-flight bcrypt calls before callers wait
+    AUTH_HASH_QUEUE_TIMEOUT_SECONDS: float = 5.0  # Wait for a slot before answering 503
+    AUTH_CACHE_TTL_SECONDS: int = 30            # Decoded token / user lookup cache lifetime
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
     
     # N-ATLaS Configuration
     NATLAS_MODEL: str = "NCAIR1/N-ATLaS"
@@ -35,15 +40,35 @@ class Settings(BaseSettings):
     NATLAS_MAX_NEW_TOKENS: int = 256    # Reduced from 512
     NATLAS_TEMPERATURE: float = 0.7
     NATLAS_TOP_P: float = 0.9
+    NATLAS_MAX_RESPONSE_CHARS: int = 200  # Default analysis length; decoding stops near it
+    NATLAS_CHANNEL_BUDGETS: str = "whatsapp:96:300,api:256:1000"  # channel:max_new_tokens:max_chars
+    NATLAS_SENTENCE_STOP_MIN_FRACTION: float = 0.5  # End at a sentence once this much of max_chars is used
     HUGGINGFACE_HUB_TOKEN:str
     
+    # Speculative decoding: a small draft model proposes tokens, N-ATLaS verifies them
+    NATLAS_DRAFT_MODEL: str = ""                # Must share N-ATLaS's tokenizer; empty disables
+    NATLAS_DRAFT_NUM_TOKENS: int = 5            # Tokens drafted per N-ATLaS verification pass
+    NATLAS_DRAFT_SCHEDULE: str = "heuristic"    # "heuristic" adapts the draft length to acceptance, or "constant"
+    
     # 🆕 Quantization settings
     NATLAS_USE_4BIT: bool = True        # Enable 4-bit quantization
     NATLAS_COMPUTE_DTYPE: str = "float16"
     
+    # Model cascade: cheaper tiers for easy queries, N-ATLaS for the rest
+    ENABLE_MODEL_CASCADE: bool = True
+    CASCADE_SMALL_MODEL: str = ""               # Small causal LM for the middle tier; empty disables it
+    CASCADE_SMALL_MODEL_LANGUAGES: str = "en,pcm"  # Languages the small model answers well enough
+    CASCADE_SKIP_GENERATION_SCORE: float = 0.85 # Top match score to answer from retrieval alone
+    CASCADE_SKIP_GENERATION_MARGIN: float = 0.1 # ...if it also beats the runner-up by this much
+    CASCADE_SKIP_GENERATION_MAX_CHARS: int = 80 # ...and the description is this short
+    CASCADE_SMALL_MODEL_SCORE: float = 0.6      # Top match score needed for the small model
+    CASCADE_SMALL_MODEL_MAX_CHARS: int = 300    # Longer descriptions go to N-ATLaS
+    
     # Embedding Model
     EMBEDDING_MODEL: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     MODEL_CACHE_DIR: str = "./models"
+    EMBEDDING_MAX_BATCH: int = 256      # Texts per /embeddings call
+    EMBEDDING_MAX_TEXT_LENGTH: int = 1000
     
     # Redis
     REDIS_URL: str
@@ -52,19 +77,100 @@ class Settings(BaseSettings):
     DEFAULT_LANGUAGE: str = "en"
     SUPPORTED_LANGUAGES: str = "en,yo,ha,ig,pcm"
     ENABLE_AUTO_LANGUAGE_DETECTION: bool = True
+    LANGID_MIN_CONFIDENCE: float = 0.5  # Below this, fall back to DEFAULT_LANGUAGE
     
     # Safety & Compliance
     ENABLE_RED_FLAG_DETECTION: bool = True
     REQUIRE_DISCLAIMER: bool = True
     LOG_ANONYMIZATION: bool = True
     
+    # Retention: monthly partitions of diagnosis_logs/offline_sync (python -m services.retention_service)
+    DIAGNOSIS_LOG_RETENTION_MONTHS: int = 6     # Months kept in the live table; older ones are archived
+    OFFLINE_SYNC_RETENTION_MONTHS: int = 3
+    PARTITION_PREMAKE_MONTHS: int = 2           # Future monthly partitions created ahead of time
+    ARCHIVE_DIR: str = "./archive"              # Parquet files of archived months, per table
+    ARCHIVE_CHUNK_ROWS: int = 10000             # Rows streamed per Parquet row group
+    
+    # Research exports (/admin/export/diagnosis-logs)
+    EXPORT_CHUNK_ROWS: int = 5000               # Rows fetched, anonymized and encoded at a time
+    
+    # Analytics rollups (/admin/stats)
+    STATS_MAX_BUCKETS: int = 2000               # Longest range a stats query may cover, in buckets
+    
     # Rate Limiting
+    ENABLE_RATE_LIMITING: bool = True
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_BURST: int = 10                  # Requests allowed back-to-back before throttling
+    RATE_LIMIT_TRUSTED_PROXIES: str = ""        # IPs/CIDRs of proxies and the WhatsApp bot; only they may set
+                                                # X-Forwarded-For, X-Device-ID and X-Phone-Number
+    RATE_LIMIT_RELAY_MULTIPLIER: int = 20       # A trusted relay's own address gets this many times the limit
+    EMBEDDING_RATE_LIMIT_PER_MINUTE: int = 600  # /embeddings texts per client, charged per text
+    
+    # Admission control in front of N-ATLaS
+    NATLAS_MAX_CONCURRENCY: int = 1             # Generations running at once
+    NATLAS_MAX_QUEUE_DEPTH: int = 8             # Requests allowed to wait for a slot
+    NATLAS_MAX_QUEUE_WAIT_SECONDS: float = 20.0 # Turn away work that can't start in time
+    SMALL_MODEL_MAX_CONCURRENCY: int = 2        # Same limits for the cascade's small model
+    SMALL_MODEL_MAX_QUEUE_DEPTH: int = 16
+    SMALL_MODEL_MAX_QUEUE_WAIT_SECONDS: float = 5.0
+    OVERLOAD_POLICY: str = "degrade"            # "degrade" (retrieval-only) or "reject" (503)
+    
+    # Request deadlines (overridable per request with X-Request-Timeout-Ms)
+    DIAGNOSE_DEADLINE_SECONDS: float = 25.0     # Inside the WhatsApp bot's 30s timeout
+    DIAGNOSE_MAX_DEADLINE_SECONDS: float = 120.0
+    DIAGNOSE_DEADLINE_RESERVE_SECONDS: float = 0.5  # Kept back for logging and the response
+    NATLAS_MIN_GENERATION_SECONDS: float = 1.0  # Skip generation with less time than this
+    
+    # Async diagnosis jobs (Redis streams on REDIS_URL)
+    JOB_STREAM: str = "afiya:jobs:diagnose"
+    JOB_CONSUMER_GROUP: str = "diagnose-workers"
+    JOB_BATCH_SIZE: int = 8                     # Jobs a worker runs through N-ATLaS together
+    JOB_BATCH_WAIT_MS: int = 200                # How long a worker blocks waiting for work
+    JOB_MAX_ATTEMPTS: int = 3                   # Tries before a job is marked failed
+    JOB_VISIBILITY_TIMEOUT_SECONDS: int = 300   # Jobs held this long by a dead worker are reclaimed
+    JOB_RESULT_TTL_SECONDS: int = 86400         # How long job status/results can be polled
+    JOB_STREAM_MAXLEN: int = 100000
+    JOB_CALLBACK_ALLOWED_HOSTS: str = ""        # Comma-separated callback hosts; empty allows none
+    JOB_CALLBACK_TIMEOUT_SECONDS: float = 10.0
+    
+    # Offline sync idempotency (results by per-query idempotency key, Redis on REDIS_URL)
+    OFFLINE_SYNC_RESULT_TTL_SECONDS: int = 604800  # How long a retried query gets its stored result
+    OFFLINE_SYNC_DEGRADED_TTL_SECONDS: int = 60 # ...if it was degraded (e.g. retrieval-only under overload); 0 keeps none
+    OFFLINE_SYNC_CLAIM_SECONDS: float = 30.0    # Longest another pod's in-progress query is waited for
+    
+    # Multi-turn conversations (/diagnose/conversation)
+    SESSION_TTL_SECONDS: int = 1800             # Forget a conversation after this long without a turn
+    SESSION_KV_IDLE_SECONDS: int = 300          # Free a session's KV cache after this long idle
+    SESSION_MAX_ACTIVE: int = 10000             # Conversations remembered (text and token ids)
+    SESSION_KV_CACHE_MAX_BYTES: int = 1 << 30   # KV cache memory across sessions; LRU evicted beyond
+    SESSION_MAX_CONTEXT_TOKENS: int = 1536      # Past this, restart from a compacted prompt
+    SESSION_MAX_MESSAGES: int = 12              # Messages kept per conversation; older ones are dropped
+    SESSION_RETRIEVAL_MESSAGES: int = 3         # Latest messages that make up the retrieval query
+    
+    # Logging (JSON lines on stdout, written by a background thread; see core/log.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""                        # Per-logger levels, e.g. "sqlalchemy.engine=INFO,services.natlas_service=DEBUG"
+    LOG_SAMPLE_RATES: str = "diagnose.language=0.01,uvicorn.access=0.1"  # Share of INFO/DEBUG records kept, by event or logger
+    LOG_QUEUE_SIZE: int = 10000                 # Records waiting to be written; more are dropped
+    LOG_SHED_FRACTION: float = 0.5              # Past this queue fill, only WARNING and above are queued
+    LOG_JSON: bool = True                       # False for plain text lines in local development
     
     # Monitoring
     ENABLE_METRICS: bool = True
+    SERVER_TIMING_HEADER: bool = False          # Per-stage timings in a Server-Timing response header; exposes
+                                                # internals, so only for benchmark/staging instances
     PROMETHEUS_PORT: int = 9090
     
+    # Profiling (admins send X-Profile: 1 or ?profile=1)
+    ENABLE_PROFILING: bool = True               # Allow admin-triggered request profiles
+    PROFILE_DIR: str = "./profiles"
+    PROFILE_SAMPLE_INTERVAL_MS: float = 5.0     # Stack sampling period while profiling a request
+    PROFILE_TORCH_OPS: bool = True              # Also record torch op timings around model calls
+    PROFILE_MAX_FILES: int = 500                # Oldest profiles are deleted beyond this
+    CONTINUOUS_PROFILING: bool = False          # Background stack sampling of the whole process
+    CONTINUOUS_PROFILING_INTERVAL_MS: float = 50.0
+    CONTINUOUS_PROFILING_WINDOW_SECONDS: int = 60  # One folded-stacks file per window
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
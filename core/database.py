@@ -1,18 +1,51 @@
-from sqlalchemy import create_engine
+from pathlib import Path
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import  settings
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+MIGRATION_LOCK_ID = 0x61666979  # pg_advisory_lock key shared by everything that runs migrations
+
+# SQLite (local benchmarks) needs its connections shared with FastAPI's threadpool
+connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
+
 engine = create_engine(
     settings.DATABASE_URL,
     pool_size=settings.DB_POOL_SIZE,
     max_overflow=settings.DB_MAX_OVERFLOW,
-    echo=settings.DEBUG
+    connect_args=connect_args
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def run_migrations():
+    """Bring the schema up to the latest Alembic revision (`alembic upgrade head`).
+
+    Called on API and worker startup instead of create_all, so that
+    diagnosis_logs and offline_sync are created partitioned on PostgreSQL.
+    An advisory lock makes processes starting together take turns.
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(str(PROJECT_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(PROJECT_ROOT / "alembic"))
+    config.attributes["configure_logger"] = False   # Logging is already set up by core/log.py
+    with engine.connect() as connection:
+        locked = connection.dialect.name == "postgresql"
+        if locked:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_ID})
+            connection.commit()
+        try:
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+        finally:
+            if locked:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_ID})
+                connection.commit()
+
 def get_db():
     """Database session dependency"""
     db = SessionLocal()
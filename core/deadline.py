@@ -0,0 +1,47 @@
+from typing import List, Optional
+import math
+import time
+from fastapi import Request
+from core.config import settings
+
+DEADLINE_HEADER = "x-request-timeout-ms"
+
+
+class Deadline:
+    """Time budget for one request, shared by every pipeline stage.
+
+    Stages check `remaining()` before starting and record themselves in
+    `degraded_stages` when they are skipped or cut short, so the response
+    can say which parts are missing.
+    """
+
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+        self.degraded_stages: List[str] = []
+
+    @classmethod
+    def from_request(cls, req: Optional[Request]) -> "Deadline":
+        """Budget from the X-Request-Timeout-Ms header, else DIAGNOSE_DEADLINE_SECONDS"""
+        budget = settings.DIAGNOSE_DEADLINE_SECONDS
+        header = req.headers.get(DEADLINE_HEADER) if req is not None else None
+        if header:
+            try:
+                value = float(header)
+            except ValueError:
+                value = math.nan
+            # nan/inf would slip through the clamp below and break every remaining() check
+            if math.isfinite(value):
+                budget = value / 1000
+        return cls(min(max(budget, 0.0), settings.DIAGNOSE_MAX_DEADLINE_SECONDS))
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        """Seconds left, keeping `reserve` back for work that must still happen"""
+        return self.expires_at - reserve - time.monotonic()
+
+    def expired(self, reserve: float = 0.0) -> bool:
+        return self.remaining(reserve) <= 0
+
+    def mark_degraded(self, stage: str):
+        if stage not in self.degraded_stages:
+            self.degraded_stages.append(stage)
@@ -0,0 +1,289 @@
+"""Structured, non-blocking logging for the API and the worker.
+
+Code logs through the standard library (`logger = logging.getLogger(__name__)`).
+configure_logging() installs one handler on the root logger that only
+puts records on a bounded queue; a QueueListener thread formats them as
+JSON lines and writes them to stdout, so a slow or blocked stdout never
+holds up a request. Under load, volume is kept in check by:
+
+- per-module levels (LOG_LEVEL, LOG_LEVELS)
+- sampling of high-volume INFO/DEBUG events (LOG_SAMPLE_RATES, keyed by
+  a record's `event` or its logger name)
+- shedding everything below WARNING once the queue is LOG_SHED_FRACTION
+  full, and dropping records outright when it is full
+
+Drops are counted in afiya_log_records_dropped_total. Every record
+carries the request id (X-Request-ID, set by RequestIdMiddleware), also
+inside model calls run with asyncio.to_thread. Levels and sample rates
+can be changed at runtime through /admin/logging.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+
+from core.config import settings
+from core.metrics import LOG_QUEUE_DEPTH, LOG_RECORDS_DROPPED
+
+REQUEST_ID_HEADER = b"x-request-id"
+_VALID_REQUEST_ID = re.compile(r"^[\w.:-]{1,128}$")
+
+# Loggers that install their own (synchronous) handlers; their records are routed through the queue instead
+_CLAIMED_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_request_id: ContextVar[Optional[str]] = ContextVar("afiya_request_id", default=None)
+
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def parse_mapping(value: str, cast) -> Dict:
+    """"a=1,b=2" -> {"a": cast("1"), "b": cast("2")}"""
+    mapping = {}
+    for item in value.split(","):
+        name, _, setting = item.partition("=")
+        if name.strip() and setting.strip():
+            mapping[name.strip()] = cast(setting.strip())
+    return mapping
+
+
+def _level(value) -> int:
+    level = logging.getLevelName(str(value).upper()) if not isinstance(value, int) else value
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {value}")
+    return level
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id, event and any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable lines for local development (LOG_JSON=false)"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.request_id = getattr(record, "request_id", None) or "-"
+        return super().format(record)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of INFO/DEBUG records per event or logger name; WARNING and above always pass"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        event = getattr(record, "event", None)
+        rate = self.rates[event] if event in self.rates else self.rates.get(record.name)
+        if rate is None or rate >= 1:
+            return True
+        if random.random() < rate:
+            record.sample_rate = rate
+            return True
+        LOG_RECORDS_DROPPED.labels(reason="sampled").inc()
+        return False
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id (the writer thread can't see the context)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = _request_id.get()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never waits: sheds low levels when the queue backs up, drops when it is full"""
+
+    def __init__(self, log_queue: queue.Queue, shed_at: int):
+        super().__init__(log_queue)
+        self.shed_at = shed_at
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the message (args may not be safe to read later) but leave formatting to the writer
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        if record.levelno < logging.WARNING and self.queue.qsize() >= self.shed_at:
+            LOG_RECORDS_DROPPED.labels(reason="shed").inc()
+            return
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            LOG_RECORDS_DROPPED.labels(reason="queue_full").inc()
+        except Exception:
+            self.handleError(record)
+
+
+class _LoggingState:
+    def __init__(self):
+        self.listener: Optional[logging.handlers.QueueListener] = None
+        self.handler: Optional[NonBlockingQueueHandler] = None
+        self.sampler = SamplingFilter({})
+        self.levels: Dict[str, str] = {}
+
+
+_state = _LoggingState()
+
+
+def _claim_loggers():
+    for name in _CLAIMED_LOGGERS:
+        logger = logging.getLogger(name)
+        logger.handlers = []
+        logger.propagate = True
+
+
+def set_levels(root: Optional[str] = None, levels: Optional[Dict[str, str]] = None):
+    """Change the root level and/or per-logger levels (e.g. {"sqlalchemy.engine": "INFO"})"""
+    root_level = _level(root) if root is not None else None
+    parsed = {name: _level(level) for name, level in (levels or {}).items()}
+    if root_level is not None:
+        logging.getLogger().setLevel(root_level)
+    for name, level in parsed.items():
+        logging.getLogger(name).setLevel(level)
+        _state.levels[name] = logging.getLevelName(level)
+
+
+def set_sample_rates(rates: Dict[str, float]):
+    """Replace or add sample rates; a rate of 1 stops sampling that event"""
+    for name, rate in rates.items():
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate for {name} must be between 0 and 1")
+    _state.sampler.rates = {**_state.sampler.rates, **rates}
+
+
+def update_logging(root: Optional[str] = None, levels: Optional[Dict[str, str]] = None,
+                   rates: Optional[Dict[str, float]] = None):
+    """Apply level and sample rate changes together; nothing changes if any value is invalid"""
+    for level in ([root] if root is not None else []) + list((levels or {}).values()):
+        _level(level)
+    for name, rate in (rates or {}).items():
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate for {name} must be between 0 and 1")
+    set_levels(root, levels)
+    set_sample_rates(rates or {})
+
+
+def logging_state() -> Dict:
+    return {
+        "level": logging.getLevelName(logging.getLogger().level),
+        "levels": dict(_state.levels),
+        "sample_rates": dict(_state.sampler.rates),
+        "queue_depth": _state.handler.queue.qsize() if _state.handler else 0,
+        "queue_size": settings.LOG_QUEUE_SIZE,
+    }
+
+
+def configure_logging():
+    """Install the queue handler and start the writer thread; safe to call again.
+
+    Calling it again (e.g. from the app lifespan, after uvicorn has set up
+    its own handlers) only re-routes the uvicorn loggers through the queue.
+    """
+    if _state.listener is not None:
+        _claim_loggers()
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter() if settings.LOG_JSON else TextFormatter())
+
+    handler = NonBlockingQueueHandler(log_queue, shed_at=max(1, int(settings.LOG_QUEUE_SIZE * settings.LOG_SHED_FRACTION)))
+    _state.sampler.rates = parse_mapping(settings.LOG_SAMPLE_RATES, float)
+    handler.addFilter(_state.sampler)
+    handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    set_levels(settings.LOG_LEVEL, parse_mapping(settings.LOG_LEVELS, str))
+    _claim_loggers()
+
+    _state.handler = handler
+    _state.listener = logging.handlers.QueueListener(log_queue, writer)
+    _state.listener.start()
+    LOG_QUEUE_DEPTH.set_function(log_queue.qsize)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out whatever is still queued and stop the writer thread"""
+    if _state.listener is not None:
+        _state.listener.stop()
+        _state.listener = None
+
+
+class RequestIdMiddleware:
+    """Give every request an id for log correlation.
+
+    A well-formed X-Request-ID from the caller (e.g. the WhatsApp bot) is
+    kept, otherwise one is generated; either way it is returned in the
+    X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]
+            await send(message)
+
+        token = _request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(token)
@@ -0,0 +1,308 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+import functools
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from core.config import settings
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Request pipeline
+REQUEST_LATENCY = Histogram(
+    "afiya_request_duration_seconds",
+    "End-to-end handler time",
+    ["endpoint", "language"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "afiya_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ["stage", "endpoint", "language"],
+    buckets=LATENCY_BUCKETS
+)
+
+# Generation
+PROMPT_TOKENS = Histogram(
+    "afiya_generation_prompt_tokens",
+    "Prompt length in tokens",
+    ["language"],
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048)
+)
+GENERATED_TOKENS = Histogram(
+    "afiya_generation_tokens",
+    "New tokens generated per request",
+    ["language"],
+    buckets=(1, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+GENERATION_TOKENS_PER_SECOND = Histogram(
+    "afiya_generation_tokens_per_second",
+    "Decode throughput per request",
+    ["language"],
+    buckets=(0.5, 1, 2, 5, 10, 20, 40, 80, 160)
+)
+
+# Speculative decoding
+SPECULATIVE_DRAFT_TOKENS = Counter(
+    "afiya_speculative_draft_tokens_total",
+    "Draft model tokens proposed to N-ATLaS, by verification result",
+    ["result"]
+)
+SPECULATIVE_ACCEPTANCE_RATE = Histogram(
+    "afiya_speculative_acceptance_rate",
+    "Fraction of draft tokens N-ATLaS accepted per generation",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+)
+SPECULATIVE_TOKENS_PER_STEP = Histogram(
+    "afiya_speculative_tokens_per_step",
+    "Tokens produced per N-ATLaS forward pass; plain decoding is 1, the excess is the speedup",
+    buckets=(1, 1.25, 1.5, 2, 2.5, 3, 4, 5, 6, 8)
+)
+
+# Model cascade
+CASCADE_ROUTES = Counter(
+    "afiya_cascade_routes_total",
+    "Generation tier chosen per request",
+    ["route", "reason"]
+)
+CASCADE_GENERATION_LATENCY = Histogram(
+    "afiya_cascade_generation_seconds",
+    "Generation time by tier (0 for retrieval-only answers)",
+    ["route"],
+    buckets=LATENCY_BUCKETS
+)
+CASCADE_LATENCY_SAVED = Counter(
+    "afiya_cascade_latency_saved_seconds_total",
+    "Estimated generation time saved versus running N-ATLaS, by tier",
+    ["route"]
+)
+
+# Batching, caching and memory
+BATCH_SIZE = Histogram(
+    "afiya_batch_size",
+    "Items per batched call",
+    ["operation"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+CACHE_REQUESTS = Counter(
+    "afiya_cache_requests_total",
+    "Cache lookups; hit ratio is hit / (hit + miss)",
+    ["cache", "result"]
+)
+MODEL_MEMORY_BYTES = Gauge(
+    "afiya_model_memory_bytes",
+    "Memory held by loaded model weights",
+    ["model", "device"]
+)
+DEVICE_MEMORY_BYTES = Gauge(
+    "afiya_device_memory_bytes",
+    "Accelerator memory in use",
+    ["device", "kind"]
+)
+
+# Authentication
+AUTH_LATENCY = Histogram(
+    "afiya_auth_duration_seconds",
+    "Time spent in authentication steps",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+AUTH_HASH_REJECTED = Counter(
+    "afiya_auth_hash_rejected_total",
+    "Password hash/verify calls rejected because the hashing pool was saturated"
+)
+
+# Rate limiting and admission control
+RATE_LIMITED = Counter(
+    "afiya_rate_limited_total",
+    "Requests rejected by the token-bucket rate limiter",
+    ["scope"]
+)
+RATE_LIMITER_BACKEND_ERRORS = Counter(
+    "afiya_rate_limiter_backend_errors_total",
+    "Redis errors that made the rate limiter fall back to in-process buckets"
+)
+ADMISSION_DECISIONS = Counter(
+    "afiya_natlas_admission_total",
+    "Generation admission decisions (model: natlas or small)",
+    ["model", "outcome"]
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "afiya_natlas_queue_depth",
+    "Requests waiting for a generation slot",
+    ["model"]
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "afiya_natlas_in_flight",
+    "Generations currently running",
+    ["model"]
+)
+
+# Offline sync
+OFFLINE_SYNC_QUERIES = Counter(
+    "afiya_offline_sync_queries_total",
+    "Offline sync queries by outcome (stored: answered from the result store, joined: waited on an in-progress upload)",
+    ["outcome"]
+)
+
+# Async diagnosis jobs
+JOB_EVENTS = Counter(
+    "afiya_jobs_total",
+    "Diagnosis job lifecycle events",
+    ["event"]
+)
+JOB_QUEUE_WAIT = Histogram(
+    "afiya_job_queue_wait_seconds",
+    "Time from enqueue until a worker starts a job",
+    buckets=LATENCY_BUCKETS
+)
+
+# Multi-turn conversation sessions
+SESSION_ACTIVE = Gauge(
+    "afiya_sessions_active",
+    "Conversation sessions held in memory",
+    ["state"]
+)
+SESSION_KV_CACHE_BYTES = Gauge(
+    "afiya_session_kv_cache_bytes",
+    "Memory held by cached N-ATLaS KV state across sessions"
+)
+SESSION_EVICTIONS = Counter(
+    "afiya_session_kv_evictions_total",
+    "Session KV caches dropped; the next turn rebuilds them by re-prefilling",
+    ["reason"]
+)
+SESSION_PREFILL_TOKENS = Histogram(
+    "afiya_session_prefill_tokens",
+    "Tokens prefilled per conversation turn",
+    ["cache"],
+    buckets=(8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+)
+
+# Logging (core/log.py)
+LOG_RECORDS_DROPPED = Counter(
+    "afiya_log_records_dropped_total",
+    "Log records not written: sampled out, shed while the queue backs up, or queue full",
+    ["reason"]
+)
+LOG_QUEUE_DEPTH = Gauge(
+    "afiya_log_queue_depth",
+    "Log records waiting for the writer thread"
+)
+
+
+_current_pipeline: ContextVar[Optional["PipelineTimer"]] = ContextVar("afiya_pipeline", default=None)
+_server_timing: ContextVar[Optional[Dict[str, float]]] = ContextVar("afiya_server_timing", default=None)
+
+
+class PipelineTimer:
+    """Collects per-stage timings for one request.
+
+    Stages anywhere below the handler (services, worker threads started
+    with asyncio.to_thread) report through track_stage() via a context
+    variable. Observations are flushed on exit so they carry the language,
+    which is usually only known after detection. Nested timers (e.g.
+    offline sync calling diagnose) report under the outer endpoint.
+    """
+
+    def __init__(self, endpoint: str, language: str = "unknown"):
+        outer = _current_pipeline.get()
+        self.endpoint = outer.endpoint if outer is not None else endpoint
+        self.outermost = outer is None
+        self.language = language
+        self.durations: Dict[str, float] = {}
+        self._token = None
+        self._start = 0.0
+
+    def __enter__(self) -> "PipelineTimer":
+        self._token = _current_pipeline.set(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_pipeline.reset(self._token)
+        language = self.language or "unknown"
+        elapsed = time.perf_counter() - self._start
+        for stage, seconds in self.durations.items():
+            STAGE_LATENCY.labels(stage=stage, endpoint=self.endpoint, language=language).observe(seconds)
+        REQUEST_LATENCY.labels(endpoint=self.endpoint, language=language).observe(elapsed)
+        timing = _server_timing.get()
+        if timing is not None:
+            for stage, seconds in self.durations.items():
+                timing[stage] = timing.get(stage, 0.0) + seconds
+            if self.outermost:
+                timing["total"] = elapsed
+        return False
+
+
+def instrument(endpoint: str):
+    """Decorator running an async handler inside a PipelineTimer"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with PipelineTimer(endpoint):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_LANGUAGE_LABELS = frozenset(code.strip() for code in settings.SUPPORTED_LANGUAGES.split(",") if code.strip())
+
+
+def language_label(language: Optional[str]) -> str:
+    """Bounded `language` label value: a SUPPORTED_LANGUAGES code, or "unknown"/"other" for anything else"""
+    if not language:
+        return "unknown"
+    return language if language in _LANGUAGE_LABELS else "other"
+
+
+def set_pipeline_language(language: Optional[str]):
+    """Label the current request's metrics with its (detected) language"""
+    pipeline = _current_pipeline.get()
+    if pipeline is not None and language:
+        pipeline.language = language_label(language)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a block as `stage` of the current request (or standalone if there is none)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        pipeline = _current_pipeline.get()
+        if pipeline is not None:
+            pipeline.durations[stage] = pipeline.durations.get(stage, 0.0) + elapsed
+        else:
+            STAGE_LATENCY.labels(stage=stage, endpoint="none", language="unknown").observe(elapsed)
+
+
+class ServerTimingMiddleware:
+    """Report the pipeline's stage timings in a Server-Timing response header.
+
+    e.g. `Server-Timing: retrieval;dur=41.2, generation;dur=2310.5, total;dur=2398.0`
+    (milliseconds), so clients such as benchmarks/replay.py can break
+    latency down by stage without scraping Prometheus.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing: Dict[str, float] = {}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and timing:
+                value = ", ".join(f"{stage};dur={seconds * 1e3:.1f}" for stage, seconds in timing.items())
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value.encode())]
+            await send(message)
+
+        token = _server_timing.set(timing)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _server_timing.reset(token)
@@ -0,0 +1,316 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+import asyncio
+import json
+import logging
+import re
+import sys
+import threading
+import time
+import uuid
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+PROFILE_ID_PATTERN = re.compile(r"^(?:[0-9a-f]{12}|continuous-\d{8}T\d{6}Z)$")
+
+# Leaf frames of threads parked on a lock or selector; dropped so idle pools don't swamp the flamegraph
+_IDLE_LEAVES = {("wait", "threading.py"), ("select", "selectors.py"), ("_worker", "thread.py")}
+
+_active_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("active_profile", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+class StackSampler:
+    """Periodically samples every thread's Python stack into folded form.
+
+    Each sample is stored as `thread;outer;...;inner` with a count, the
+    format flamegraph.pl and speedscope read directly. Runs in its own
+    daemon thread; nothing is hooked into the code being sampled.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            self.sample(skip=own)
+
+    def sample(self, skip: Optional[int] = None):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip or (frame.f_code.co_name, Path(frame.f_code.co_filename).name) in _IDLE_LEAVES:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(labels)))
+        with self._lock:
+            self.samples.update(stacks)
+
+    def drain(self) -> Counter:
+        """Return the samples collected so far and start a fresh count"""
+        with self._lock:
+            samples, self.samples = self.samples, Counter()
+        return samples
+
+
+def folded(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+class RequestProfile:
+    """Stack samples and torch op timings collected for one profiled request.
+
+    The sampler sees every thread, so requests running concurrently with
+    the profiled one show up in its flamegraph too; profile on a quiet
+    replica when that matters.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now(timezone.utc)
+        self.duration_seconds: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.ops: List[Dict] = []
+        self.sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+
+    def add_ops(self, stage: str, key_averages):
+        """Record a torch profiler's per-op averages under a pipeline stage"""
+        for event in key_averages:
+            self.ops.append({
+                "stage": stage,
+                "op": event.key,
+                "calls": event.count,
+                "self_cpu_ms": round(event.self_cpu_time_total / 1000, 3),
+                "cpu_ms": round(event.cpu_time_total / 1000, 3),
+                "self_device_ms": round(getattr(event, "self_device_time_total", 0) / 1000, 3),
+            })
+
+    def save(self, samples: Counter) -> Path:
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"{self.id}.folded").write_text(folded(samples), encoding="utf-8")
+        summary = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_seconds * 1000, 3) if self.duration_seconds else None,
+            "status_code": self.status_code,
+            "samples": sum(samples.values()),
+            "sample_interval_ms": settings.PROFILE_SAMPLE_INTERVAL_MS,
+            "top_stacks": [{"stack": s, "samples": c} for s, c in samples.most_common(20)],
+            "ops": sorted(self.ops, key=lambda op: op["self_cpu_ms"], reverse=True),
+        }
+        path = directory / f"{self.id}.json"
+        path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        prune_profiles(directory)
+        return path
+
+
+@contextmanager
+def profile_ops(stage: str):
+    """Record torch op timings for the enclosed model call when the request is being profiled.
+
+    torch.profiler only sees ops on the thread that started it, so this has
+    to wrap the call where it runs (e.g. inside the generation worker
+    thread). Costs one ContextVar lookup when profiling is off.
+    """
+    profile = _active_profile.get()
+    if profile is None or not settings.PROFILE_TORCH_OPS:
+        yield
+        return
+
+    from torch.profiler import profile as torch_profile, ProfilerActivity
+    import torch
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    with torch_profile(activities=activities, record_shapes=True) as prof:
+        yield
+    profile.add_ops(stage, prof.key_averages())
+
+
+def prune_profiles(directory: Path):
+    """Keep at most PROFILE_MAX_FILES files, deleting the oldest"""
+    files = sorted(directory.glob("*.*"), key=lambda p: p.stat().st_mtime)
+    for path in files[:max(len(files) - settings.PROFILE_MAX_FILES, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def list_profiles() -> List[Dict]:
+    directory = Path(settings.PROFILE_DIR)
+    if not directory.exists():
+        return []
+    entries = []
+    for path in sorted(directory.glob("*.folded"), key=lambda p: p.stat().st_mtime, reverse=True):
+        entries.append({
+            "id": path.stem,
+            "kind": "continuous" if path.stem.startswith("continuous-") else "request",
+            "size_bytes": path.stat().st_size,
+            "created_at": datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).isoformat(),
+        })
+    return entries
+
+
+def profile_path(profile_id: str, suffix: str) -> Optional[Path]:
+    """Path of a stored profile file, or None for unknown/malformed ids"""
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = Path(settings.PROFILE_DIR) / f"{profile_id}{suffix}"
+    return path if path.exists() else None
+
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value in (b"1", b"true", b"yes")
+    query = scope.get("query_string", b"")
+    if b"profile=" not in query:
+        return False
+    return parse_qs(query.decode("latin-1")).get("profile", [""])[0] in ("1", "true", "yes")
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" and token else None
+    return None
+
+
+def _is_admin(token: str) -> bool:
+    # Imported here so model services can use profile_ops without pulling in auth
+    from fastapi import HTTPException
+    from core.database import SessionLocal
+    from core.security import get_current_user, verify_token
+
+    db = SessionLocal()
+    try:
+        return get_current_user(verify_token(token), db).is_admin
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+
+
+class ProfilingMiddleware:
+    """Profile requests from admins that send `X-Profile: 1` or `?profile=1`.
+
+    The profile is saved under PROFILE_DIR and its id returned in the
+    X-Profile-Id response header; fetch it from /admin/profiles/{id}.
+    Requests without the flag only pay for a header scan.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            return await self.app(scope, receive, send)
+
+        token = _bearer_token(scope)
+        if token is None or not await asyncio.to_thread(_is_admin, token):
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["method"], scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER, profile.id.encode())
+                ]
+            await send(message)
+
+        reset = _active_profile.set(profile)
+        profile.sampler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.duration_seconds = time.perf_counter() - start
+            profile.sampler.stop()
+            _active_profile.reset(reset)
+            await asyncio.to_thread(profile.save, profile.sampler.drain())
+            logger.info(f"🔬 Saved profile {profile.id} for {profile.method} {profile.path}")
+
+
+class ContinuousProfiler:
+    """Low-rate background stack sampling, written to disk once per window.
+
+    Produces PROFILE_DIR/continuous-<UTC time>.folded files that can be
+    compared across windows or merged; only started when
+    CONTINUOUS_PROFILING is on.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = settings.CONTINUOUS_PROFILING_INTERVAL_MS / 1000,
+        window_seconds: float = settings.CONTINUOUS_PROFILING_WINDOW_SECONDS
+    ):
+        self.sampler = StackSampler(interval_seconds)
+        self.window_seconds = window_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.sampler.start()
+        self._thread = threading.Thread(target=self._run, name="continuous-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"🔬 Continuous profiling every {self.sampler.interval_seconds * 1000:.0f}ms")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sampler.stop()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.window_seconds):
+            self.flush()
+
+    def flush(self):
+        samples = self.sampler.drain()
+        if not samples:
+            return
+        directory = Path(settings.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        (directory / f"continuous-{stamp}.folded").write_text(folded(samples), encoding="utf-8")
+        prune_profiles(directory)
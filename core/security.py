@@ -1,14 +1,36 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from core.config import settings
+from core.cache import TTLCache
+from core.database import get_db
+from core.metrics import AUTH_LATENCY, CACHE_REQUESTS, AUTH_HASH_REJECTED
+from db.models import User
+from db.schemas import UserInfo
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt is deliberately slow CPU work; keep it off the event loop and bound how
+# much of it can be queued so a login storm can't starve diagnosis requests
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.AUTH_HASH_WORKERS,
+    thread_name_prefix="bcrypt"
+)
+_hash_slots = asyncio.Semaphore(settings.AUTH_MAX_CONCURRENT_HASHES)
+
+# Short-lived caches; entries expire quickly so other workers' changes show up soon
+_token_cache = TTLCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+_user_cache = TTLCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -17,6 +39,31 @@ def get_password_hash(password: str) -> str:
     """Generate password hash"""
     return pwd_context.hash(password)
 
+async def _run_hash(operation: str, fn, *args):
+    """Run a bcrypt call on the hashing pool, waiting at most AUTH_HASH_QUEUE_TIMEOUT_SECONDS for a slot"""
+    try:
+        await asyncio.wait_for(_hash_slots.acquire(), settings.AUTH_HASH_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        AUTH_HASH_REJECTED.inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication is busy, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        with AUTH_LATENCY.labels(operation=operation).time():
+            return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _hash_slots.release()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool without blocking the event loop"""
+    return await _run_hash("verify_password", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool without blocking the event loop"""
+    return await _run_hash("hash_password", get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
     to_encode = data.copy()
@@ -42,15 +89,53 @@ def verify_token(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    user_id = _token_cache.get(token)
+    if user_id is not None:
+        CACHE_REQUESTS.labels(cache="auth_token", result="hit").inc()
+        return user_id
+    CACHE_REQUESTS.labels(cache="auth_token", result="miss").inc()
+
     try:
-        payload = jwt.decode(
-            token, 
-            settings.SECRET_KEY, 
-            algorithms=[settings.ALGORITHM]
-        )
+        with AUTH_LATENCY.labels(operation="decode_token").time():
+            payload = jwt.decode(
+                token, 
+                settings.SECRET_KEY, 
+                algorithms=[settings.ALGORITHM]
+            )
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-        return user_id
     except JWTError:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+
+    # Never cache a token past its own expiry
+    expires_in = payload.get("exp", 0) - time.time()
+    _token_cache.set(token, user_id, min(settings.AUTH_CACHE_TTL_SECONDS, expires_in))
+    return user_id
+
+def get_current_user(user_id: str = Depends(verify_token), db: Session = Depends(get_db)) -> UserInfo:
+    """Resolve the token's user, served from a short-TTL cache when possible"""
+    user = _user_cache.get(user_id)
+    if user is None:
+        CACHE_REQUESTS.labels(cache="auth_user", result="miss").inc()
+        with AUTH_LATENCY.labels(operation="load_user").time():
+            row = db.query(User).filter(User.id == int(user_id)).first()
+        if row is None:
+            raise HTTPException(status_code=401, detail="Could not validate credentials")
+        user = UserInfo.model_validate(row)
+        _user_cache.set(user_id, user)
+    else:
+        CACHE_REQUESTS.labels(cache="auth_user", result="hit").inc()
+
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="Inactive user")
+    return user
+
+def invalidate_user(user_id) -> None:
+    """Drop a user's cached record, e.g. after changing is_active/is_admin"""
+    _user_cache.delete(str(user_id))
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target):
+    invalidate_user(target.id)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, JSON, Float
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, JSON, Float, Index, UniqueConstraint
 from datetime import datetime
 from core.database import Base
 
@@ -42,7 +42,28 @@ class DiagnosisLog(Base):
     matched_conditions = Column(JSON)
     red_flags_detected = Column(JSON)
     response_time_ms = Column(Integer)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class DiagnosisRollup(Base):
+    """Diagnosis counts pre-aggregated per hour and day, kept up to date as logs are written.
+
+    dimension is "total" (value ""), "condition" (a matched condition title)
+    or "red_flag" (a red flag category); every row is also split by language.
+    """
+    __tablename__ = "diagnosis_rollups"
+    __table_args__ = (
+        UniqueConstraint("granularity", "bucket_start", "language", "dimension", "value", name="uq_diagnosis_rollups_key"),
+        Index("ix_diagnosis_rollups_lookup", "granularity", "dimension", "bucket_start"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    granularity = Column(String(8), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    language = Column(String(16), nullable=False)
+    dimension = Column(String(16), nullable=False)
+    value = Column(String, nullable=False, default="")
+    count = Column(Integer, nullable=False, default=0)
+    response_time_ms_total = Column(BigInteger, nullable=False, default=0)
 
 class OfflineSync(Base):
     """Offline synchronization tracking"""
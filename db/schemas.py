@@ -1,6 +1,21 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional, Dict
+from pydantic import AfterValidator, BaseModel, ConfigDict, EmailStr, Field
+from typing import Annotated, List, Literal, Optional, Dict
 from datetime import datetime
+from core.config import settings
+
+SUPPORTED_LANGUAGES = frozenset(code.strip() for code in settings.SUPPORTED_LANGUAGES.split(",") if code.strip())
+
+
+def supported_language(value: Optional[str]) -> Optional[str]:
+    """A SUPPORTED_LANGUAGES code, or None (so the language is detected) for anything else"""
+    if value is None:
+        return None
+    value = value.strip().lower()
+    return value if value in SUPPORTED_LANGUAGES else None
+
+
+# Request languages end up in metrics labels and DiagnosisRollup.language, so only known codes are kept
+RequestLanguage = Annotated[Optional[str], AfterValidator(supported_language)]
 
 # Authentication Schemas
 class UserCreate(BaseModel):
@@ -15,16 +30,27 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class UserInfo(BaseModel):
+    """Detached snapshot of a User row, safe to cache between requests"""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    email: str
+    is_active: bool
+    is_admin: bool
+
 # Diagnosis Schemas
 class DiagnosisRequest(BaseModel):
     symptoms: str = Field(..., min_length=10, max_length=1000)
     age: Optional[int] = Field(None, ge=0, le=150)
     gender: Optional[str] = Field(None, pattern="^(male|female|other)$")
     additional_info: Optional[str] = Field(None, max_length=500)
-    language: Optional[str] = Field(
+    language: RequestLanguage = Field(
         None, 
-        description="Language code (en, yo, ha, ig, pcm)"
+        description="Language code (en, yo, ha, ig, pcm); anything else is detected instead"
     )
+    max_new_tokens: Optional[int] = Field(None, ge=1, description="Tighten the channel's generation budget")
+    max_chars: Optional[int] = Field(None, ge=20, description="Tighten the channel's analysis length")
 
 class ConditionMatch(BaseModel):
     title: str
@@ -34,6 +60,16 @@ class ConditionMatch(BaseModel):
     severity: str
     confidence: float
 
+class GenerationReport(BaseModel):
+    channel: str
+    max_new_tokens: int
+    max_chars: int
+    tokens_generated: int
+    chars: int
+    stop_reason: Optional[str] = Field(
+        None, description="eos, sentence, max_chars, max_new_tokens or deadline"
+    )
+
 class DiagnosisResponse(BaseModel):
     conditions: List[ConditionMatch]
     red_flags: List[str]
@@ -43,6 +79,46 @@ class DiagnosisResponse(BaseModel):
     recommendations: List[str]
     detected_language: Optional[str] = None
     natlas_analysis: Optional[str] = None
+    degraded_stages: List[str] = Field(
+        default_factory=list,
+        description="Pipeline stages skipped or cut short, e.g. 'generation' under overload"
+    )
+    generation: Optional[GenerationReport] = None
+    route: Optional[str] = Field(
+        None, description="Tier that wrote the analysis: retrieval (none), small or natlas"
+    )
+
+class DiagnosisJobRequest(DiagnosisRequest):
+    callback_url: Optional[str] = Field(
+        None,
+        max_length=2048,
+        description="Receives a POST of the finished job (same body as GET /diagnose/jobs/{id})"
+    )
+
+class DiagnosisJobResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued, running, succeeded or failed")
+    attempts: int = 0
+    created_at: datetime
+    updated_at: datetime
+    result: Optional[DiagnosisResponse] = None
+    error: Optional[str] = None
+
+class ConversationTurnRequest(BaseModel):
+    message: str = Field(..., min_length=1, max_length=1000)
+    session_id: Optional[str] = Field(
+        None,
+        pattern="^[A-Za-z0-9_-]{8,64}$",
+        description="Omit to start a conversation; unknown or expired ids start a new one"
+    )
+    language: RequestLanguage = Field(None, description="Defaults to the language of the first turn")
+    max_new_tokens: Optional[int] = Field(None, ge=1, description="Tighten the channel's generation budget")
+    max_chars: Optional[int] = Field(None, ge=20, description="Tighten the channel's analysis length")
+
+class ConversationTurnResponse(DiagnosisResponse):
+    session_id: str
+    turn: int
+    context_cached: bool = Field(..., description="Whether this turn reused the conversation's KV cache")
 
 # Embedding Schemas
 class EmbeddingRequest(BaseModel):
@@ -54,20 +130,87 @@ class EmbeddingResponse(BaseModel):
     dimension: int
     model_used: str
 
+class EmbeddingBatchRequest(BaseModel):
+    texts: List[str] = Field(..., min_length=1, description="Up to EMBEDDING_MAX_BATCH texts")
+    language: Optional[str] = None
+    dtype: Literal["float32", "float16", "int8"] = Field(
+        "float32",
+        description="int8 vectors are scaled per vector; cast to float and L2-normalize to use them"
+    )
+    dimensions: Optional[int] = Field(None, ge=1, description="Keep only the leading dimensions (re-normalized)")
+    encoding: Optional[Literal["json", "base64", "binary", "npy"]] = Field(
+        None,
+        description="Overrides the Accept header (application/octet-stream, application/x-npy, application/json)"
+    )
+
+class EmbeddingBatchResponse(BaseModel):
+    """JSON/base64 body; binary and .npy bodies carry the same metadata in X-Embedding-* headers"""
+    dtype: str
+    shape: List[int]
+    model_used: str
+    embeddings: Optional[List[List[float]]] = None
+    data: Optional[str] = Field(None, description="Base64 of the little-endian row-major array")
+
 # Offline Sync Schemas
+class OfflineQuery(DiagnosisRequest):
+    idempotency_key: Optional[str] = Field(
+        None,
+        max_length=128,
+        description="Stable id for this query across retries; defaults to a hash of device and content"
+    )
+
+class OfflineQueryResult(DiagnosisResponse):
+    idempotency_key: Optional[str] = None
+    replayed: bool = Field(False, description="Returned from an earlier upload instead of computed now")
+
 class OfflineSyncRequest(BaseModel):
     device_id: str
-    pending_queries: List[DiagnosisRequest]
+    pending_queries: List[OfflineQuery]
     client_kb_version: str
     last_sync_timestamp: Optional[datetime] = None
 
 class OfflineSyncResponse(BaseModel):
     kb_update_required: bool
     kb_version: str
-    processed_queries: List[DiagnosisResponse]
+    processed_queries: List[OfflineQueryResult]
     sync_timestamp: datetime
 
 # Admin Schemas
+class StatsBucket(BaseModel):
+    bucket_start: datetime
+    count: int
+    avg_response_time_ms: Optional[float] = None
+
+class StatsCount(BaseModel):
+    value: str
+    count: int
+
+class DiagnosisStatsResponse(BaseModel):
+    granularity: str
+    start: datetime
+    end: datetime
+    language: Optional[str] = None
+    total: int
+    avg_response_time_ms: Optional[float] = None
+    series: List[StatsBucket]
+    languages: List[StatsCount]
+    conditions: List[StatsCount] = Field(description="Most frequently matched conditions")
+    red_flags: List[StatsCount] = Field(description="Red flag categories, most frequent first")
+
+class LoggingUpdate(BaseModel):
+    level: Optional[str] = Field(None, description="Root log level, e.g. WARNING")
+    levels: Dict[str, str] = Field(default_factory=dict, description="Per-logger levels, e.g. {\"sqlalchemy.engine\": \"INFO\"}")
+    sample_rates: Dict[str, float] = Field(
+        default_factory=dict, description="Share of INFO/DEBUG records kept, by event or logger name (0-1)"
+    )
+
+class LoggingState(BaseModel):
+    level: str
+    levels: Dict[str, str]
+    sample_rates: Dict[str, float]
+    queue_depth: int
+    queue_size: int
+
 class MedicalConditionCreate(BaseModel):
     title: str
     symptoms: List[str]
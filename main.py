@@ -1,50 +1,105 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import logging
 from prometheus_client import make_asgi_app
 
 from core.config import settings
-from core.database import engine, Base
-from routers import diagnose, embedding, offline, admin, auth
+from core.database import run_migrations
+from core.profiling import ProfilingMiddleware, ContinuousProfiler
+from core.log import RequestIdMiddleware, configure_logging, shutdown_logging
+from core.metrics import ServerTimingMiddleware
+from routers import diagnose, embedding, offline, admin, auth, jobs
 from services.ml_service import MLService
 from services.vector_service import VectorService
+from services.safety_service import SafetyService
+from services.rate_limiter import RateLimiter
+from services.admission_service import AdmissionController
+from services.session_service import SessionStore
+from services.job_queue import JobQueue
+from services.result_store import ResultStore
+from services.analytics_service import install_rollups
+from services.retention_service import ensure_partitions
+
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("=" * 60)
-    print("🚀 Starting Afiya Care Backend with N-ATLaS")
-    print("=" * 60)
+    configure_logging()
+    logger.info("🚀 Starting Afiya Care Backend with N-ATLaS")
     
-    # Initialize database tables
-    print("📊 Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    print("✅ Database tables created")
+    # Migrate the database (partitioned tables on PostgreSQL; see alembic/versions)
+    logger.info("📊 Running database migrations...")
+    run_migrations()
+    install_rollups()
+    logger.info("✅ Database schema up to date")
+    try:
+        for name in ensure_partitions():
+            logger.info(f"🗂️ Created partition {name}")
+    except Exception as e:
+        logger.warning(f"⚠️ Could not create upcoming partitions: {e}")
     
     # Initialize ML service (includes N-ATLaS)
-    print("🤖 Initializing ML Services...")
+    logger.info("🤖 Initializing ML Services...")
     app.state.ml_service = MLService()
     await app.state.ml_service.initialize()
-    print("✅ ML Services initialized")
+    logger.info("✅ ML Services initialized")
     
     # Initialize vector service
-    print("💾 Initializing Vector Database...")
+    logger.info("💾 Initializing Vector Database...")
     app.state.vector_service = VectorService()
     await app.state.vector_service.initialize()
-    print("✅ Vector Database initialized")
+    logger.info("✅ Vector Database initialized")
+    
+    # Compile red flag rules once, up front, rather than on the first request
+    logger.info("🚨 Compiling red flag rules...")
+    app.state.safety_service = SafetyService()
+    app.state.safety_service.detect_red_flags("")
+    logger.info(f"✅ Red flag rules ready: {', '.join(app.state.safety_service.available_languages())}")
+    
+    # Rate limiting and N-ATLaS admission control
+    logger.info("🚦 Initializing rate limiter...")
+    app.state.rate_limiter = RateLimiter()
+    await app.state.rate_limiter.initialize()
+    app.state.admission_controller = AdmissionController()
+    app.state.small_model_admission = AdmissionController.for_small_model()
+    app.state.session_store = SessionStore()
+    app.state.offline_results = ResultStore()
+    await app.state.offline_results.initialize()
+    
+    # Async job API; the work itself runs in separate worker processes (worker.py)
+    logger.info("📬 Connecting to job queue...")
+    app.state.job_queue = JobQueue()
+    try:
+        await app.state.job_queue.initialize()
+        logger.info("✅ Job queue ready")
+    except Exception as e:
+        logger.warning(f"⚠️ Job queue unavailable ({e}), /diagnose/jobs will answer 503")
+        app.state.job_queue = None
     
-    print("=" * 60)
-    print("✅ Afiya Care Backend Ready!")
-    print(f"📚 API Docs: http://localhost:{settings.PORT}/docs")
-    print(f"🌍 N-ATLaS Languages: Yoruba, Hausa, Igbo, Pidgin, English")
-    print("=" * 60)
+    app.state.continuous_profiler = None
+    if settings.CONTINUOUS_PROFILING:
+        app.state.continuous_profiler = ContinuousProfiler()
+        app.state.continuous_profiler.start()
+    
+    logger.info("✅ Afiya Care Backend Ready!")
+    logger.info(f"📚 API Docs: http://localhost:{settings.PORT}/docs")
+    logger.info(f"🌍 N-ATLaS Languages: Yoruba, Hausa, Igbo, Pidgin, English")
     
     yield
     
     # Shutdown
-    print("\n🛑 Shutting down services...")
+    logger.info("🛑 Shutting down services...")
     await app.state.vector_service.close()
-    print("✅ Shutdown complete")
+    await app.state.rate_limiter.close()
+    await app.state.offline_results.close()
+    if app.state.job_queue is not None:
+        await app.state.job_queue.close()
+    if app.state.continuous_profiler is not None:
+        app.state.continuous_profiler.stop()
+    logger.info("✅ Shutdown complete")
+    shutdown_logging()
 
 # Get port from environment (HF Spaces uses 7860)
 PORT = settings.PORT
@@ -65,6 +120,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-triggered request profiling; not installed at all when disabled
+if settings.ENABLE_PROFILING:
+    app.add_middleware(ProfilingMiddleware)
+
+# Stage timings for clients (benchmarks/replay.py)
+if settings.SERVER_TIMING_HEADER:
+    app.add_middleware(ServerTimingMiddleware)
+
+# Request ids for log correlation; added last so it wraps everything above
+app.add_middleware(RequestIdMiddleware)
+
 # Prometheus metrics
 metrics_app = make_asgi_app()
 app.mount("/metrics", metrics_app)
@@ -72,6 +138,7 @@ app.mount("/metrics", metrics_app)
 # Include routers
 app.include_router(auth.router, prefix=f"/api/{settings.API_VERSION}/auth", tags=["Authentication"])
 app.include_router(diagnose.router, prefix=f"/api/{settings.API_VERSION}", tags=["Diagnosis"])
+app.include_router(jobs.router, prefix=f"/api/{settings.API_VERSION}", tags=["Diagnosis Jobs"])
 app.include_router(embedding.router, prefix=f"/api/{settings.API_VERSION}", tags=["Embeddings"])
 app.include_router(offline.router, prefix=f"/api/{settings.API_VERSION}/offline", tags=["Offline Sync"])
 app.include_router(admin.router, prefix=f"/api/{settings.API_VERSION}/admin", tags=["Admin"])
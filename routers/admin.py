@@ -1,22 +1,112 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Literal, Optional
 
+from core.config import settings
 from core.database import get_db
-from core.security import verify_token
-from db.schemas import KnowledgeBaseUpload, KnowledgeBaseResponse
-from db.models import User, MedicalCondition
+from core.security import get_current_user
+from core.log import logging_state, update_logging
+from core.profiling import list_profiles, profile_path
+from db.schemas import (
+    DiagnosisStatsResponse, KnowledgeBaseUpload, KnowledgeBaseResponse, LoggingState, LoggingUpdate, UserInfo
+)
+from db.models import MedicalCondition
+from services import analytics_service, export_service
 
 router = APIRouter()
 
-def verify_admin(user_id: str = Depends(verify_token), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if not user or not user.is_admin:
+def verify_admin(user: UserInfo = Depends(get_current_user)):
+    if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin required")
     return user
 
+@router.get("/profiles")
+async def get_profiles(admin: UserInfo = Depends(verify_admin)):
+    """List stored request and continuous profiles, newest first"""
+    return {"profiles": list_profiles()}
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, admin: UserInfo = Depends(verify_admin)):
+    """Op-level breakdown and top stacks of a request profile"""
+    path = profile_path(profile_id, ".json")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json")
+
+@router.get("/profiles/{profile_id}/flamegraph")
+async def get_flamegraph(profile_id: str, admin: UserInfo = Depends(verify_admin)):
+    """Folded stacks, for flamegraph.pl or speedscope"""
+    path = profile_path(profile_id, ".folded")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+@router.get("/logging", response_model=LoggingState)
+async def get_logging(admin: UserInfo = Depends(verify_admin)):
+    """Current log levels, sample rates and writer queue depth (this process)"""
+    return logging_state()
+
+@router.put("/logging", response_model=LoggingState)
+async def set_logging(update: LoggingUpdate, admin: UserInfo = Depends(verify_admin)):
+    """Turn log volume up or down without a restart; applies to this process only"""
+    try:
+        update_logging(update.level, update.levels, update.sample_rates)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return logging_state()
+
+def _utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    # Logs are stored as naive UTC
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@router.get("/stats", response_model=DiagnosisStatsResponse)
+def get_stats(
+    granularity: Literal["hour", "day"] = "hour",
+    start: Optional[datetime] = Query(None, description="Default: 24 hours (hourly) or 30 days (daily) before end"),
+    end: Optional[datetime] = Query(None, description="Default: now"),
+    language: Optional[str] = None,
+    top: int = Query(10, ge=1, le=100, description="Conditions and red flags to list"),
+    db: Session = Depends(get_db),
+    admin: UserInfo = Depends(verify_admin)
+):
+    """Diagnosis counts by hour/day, language, condition and red flag, from the rollup tables only"""
+    step = analytics_service.GRANULARITIES[granularity]
+    end = _utc_naive(end) or datetime.utcnow()
+    start = _utc_naive(start) or end - step * (24 if granularity == analytics_service.HOUR else 30)
+    if start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    if (end - start) / step > settings.STATS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Range covers more than {settings.STATS_MAX_BUCKETS} {granularity} buckets; use a coarser granularity"
+        )
+    return analytics_service.get_stats(db, granularity, start, end, language, top)
+
+@router.get("/export/diagnosis-logs")
+def export_diagnosis_logs(
+    format: Literal["csv.gz", "parquet"] = "csv.gz",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    language: Optional[str] = None,
+    admin: UserInfo = Depends(verify_admin)
+):
+    """Stream diagnosis logs as gzipped CSV or Parquet, anonymized per LOG_ANONYMIZATION"""
+    start, end = _utc_naive(start), _utc_naive(end)
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=422, detail="start must be before end")
+    filename = f"diagnosis-logs-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{format}"
+    return StreamingResponse(
+        export_service.export_logs(format, start, end, language),
+        media_type=export_service.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @router.post("/upload-kb", response_model=KnowledgeBaseResponse)
-async def upload_kb(kb_data: KnowledgeBaseUpload, req: Request, db: Session = Depends(get_db), admin: User = Depends(verify_admin)):
+async def upload_kb(kb_data: KnowledgeBaseUpload, req: Request, db: Session = Depends(get_db), admin: UserInfo = Depends(verify_admin)):
     """Upload knowledge base"""
     try:
         from app.services.ml_service import MLService
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from core.database import get_db
-from core.security import verify_password, get_password_hash, create_access_token, verify_token
+from core.security import verify_password_async, get_password_hash_async, create_access_token, verify_token
 from core.config import settings
 from db.models import User
 from db.schemas import UserCreate, UserLogin, Token
@@ -18,7 +18,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     
     new_user = User(
         email=user_data.email,
-        hashed_password=get_password_hash(user_data.password)
+        hashed_password=await get_password_hash_async(user_data.password)
     )
     db.add(new_user)
     db.commit()
@@ -34,7 +34,7 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 async def login(user_data: UserLogin, db: Session = Depends(get_db)):
     """Login"""
     user = db.query(User).filter(User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    if not user or not await verify_password_async(user_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect credentials")
     
     token = create_access_token(data={"sub": str(user.id)})
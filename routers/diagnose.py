@@ -1,19 +1,112 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+import logging
 import time
 import uuid
-from typing import List
+from typing import Awaitable, Callable, List
 
+from core.budget import GenerationBudget
+from core.config import settings
 from core.database import get_db
-from db.schemas import DiagnosisRequest, DiagnosisResponse, ConditionMatch
+from core.deadline import Deadline
+from core.metrics import instrument, set_pipeline_language, track_stage
+from db.schemas import (
+    DiagnosisRequest, DiagnosisResponse, ConditionMatch, ConversationTurnRequest, ConversationTurnResponse
+)
+from services.cascade_service import Route, ROUTE_RETRIEVAL, ROUTE_SMALL
 from services.ml_service import MLService
 from services.vector_service import VectorService
 from services.safety_service import SafetyService
+from services.admission_service import AdmissionController, OverloadedError
+from services.rate_limiter import rate_limit
+from services.session_service import SessionStore
 from db.models import DiagnosisLog
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-@router.post("/diagnose", response_model=DiagnosisResponse)
+async def _retrieve(ml_service: MLService, vector_service: VectorService, text: str, deadline: Deadline) -> list:
+    """Embedding + knowledge base search, skipped once the budget is gone; a slow
+    or failed search degrades the answer rather than failing it"""
+    reserve = settings.DIAGNOSE_DEADLINE_RESERVE_SECONDS
+    if deadline.expired(reserve):
+        deadline.mark_degraded("retrieval")
+        return []
+    try:
+        embedding = await ml_service.generate_embedding(text)
+        return await vector_service.search(embedding, top_k=5, timeout=deadline.remaining(reserve))
+    except Exception as e:
+        logger.warning(f"⚠️ Retrieval failed: {e}")
+        deadline.mark_degraded("retrieval")
+        return []
+
+async def _generate(admission: AdmissionController, deadline: Deadline, generate: Callable[[], Awaitable[str]]) -> str:
+    """Model analysis with whatever time is left, admitted through `admission`.
+    Under overload, answer from retrieval alone or shed the request."""
+    reserve = settings.DIAGNOSE_DEADLINE_RESERVE_SECONDS
+    if deadline.remaining(reserve) < settings.NATLAS_MIN_GENERATION_SECONDS:
+        deadline.mark_degraded("generation")
+        return ""
+    try:
+        async with admission.slot(max_wait=deadline.remaining(reserve) - settings.NATLAS_MIN_GENERATION_SECONDS):
+            return await generate()
+    except OverloadedError as e:
+        if settings.OVERLOAD_POLICY == "reject":
+            raise HTTPException(
+                status_code=503,
+                detail=f"Service overloaded ({e.reason}), please retry",
+                headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))}
+            )
+        deadline.mark_degraded("generation")
+        return ""
+
+async def _generate_routed(
+    ml_service: MLService,
+    admission: AdmissionController,
+    small_admission: AdmissionController,
+    deadline: Deadline,
+    route: Route,
+    symptoms: str,
+    language: str,
+    search_results: list,
+    budget: GenerationBudget
+) -> str:
+    """Generation through the tier the cascade picked. The small model has its
+    own admission controller; if it fails, N-ATLaS answers instead."""
+    if route.tier == ROUTE_RETRIEVAL:
+        return ""
+    if route.tier == ROUTE_SMALL:
+        try:
+            return await _generate(
+                small_admission, deadline,
+                lambda: ml_service.analyze_with_small_model(symptoms, language, search_results, deadline, budget)
+            )
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ Small model failed, escalating to N-ATLaS: {e}")
+    return await _generate(
+        admission, deadline,
+        lambda: ml_service.analyze_with_natlas(symptoms, language, deadline, budget)
+    )
+
+def _format_conditions(search_results: list) -> List[ConditionMatch]:
+    conditions: List[ConditionMatch] = []
+    for result in search_results:
+        p = result["payload"]
+        conditions.append(ConditionMatch(
+            title=p.get("title", "Unknown"),
+            description=p.get("description", ""),
+            symptoms=p.get("symptoms", []),
+            treatments=p.get("treatments", []),
+            severity=p.get("severity_level", "moderate"),
+            confidence=round(result["score"], 3)
+        ))
+    return conditions
+
+@router.post("/diagnose", response_model=DiagnosisResponse, dependencies=[Depends(rate_limit)])
+@instrument("diagnose")
 async def diagnose_symptoms(request: DiagnosisRequest, req: Request, db: Session = Depends(get_db)):
     """🇳🇬 N-ATLaS powered diagnosis - Supports EN, YO, HA, IG, PCM"""
     start_time = time.time()
@@ -22,36 +115,28 @@ async def diagnose_symptoms(request: DiagnosisRequest, req: Request, db: Session
     try:
         ml_service: MLService = req.app.state.ml_service
         vector_service: VectorService = req.app.state.vector_service
-        safety_service = SafetyService()
+        safety_service: SafetyService = req.app.state.safety_service
+        admission: AdmissionController = req.app.state.admission_controller
+        small_admission: AdmissionController = req.app.state.small_model_admission
+        deadline = Deadline.from_request(req)
+        budget = GenerationBudget.from_request(req, request.max_new_tokens, request.max_chars)
         
         # Detect language
-        detected_lang = request.language or ml_service.detect_language(request.symptoms)
-        print(f"🌍 Language: {detected_lang}")
-        
-        # N-ATLaS analysis
-        natlas_analysis = await ml_service.analyze_with_natlas(request.symptoms, detected_lang)
+        with track_stage("language_detection"):
+            detected_lang = request.language or ml_service.detect_language(request.symptoms)
+        set_pipeline_language(detected_lang)
+        logger.info("🌍 Language: %s", detected_lang, extra={"event": "diagnose.language", "language": detected_lang})
         
-        # Generate embedding
-        embedding = await ml_service.generate_embedding(request.symptoms)
+        # Check red flags first - cheap, and the one thing we never skip
+        with track_stage("red_flag_scan"):
+            red_flags = safety_service.detect_red_flags(request.symptoms)
         
-        # Search knowledge base
-        search_results = await vector_service.search(embedding, top_k=5)
-        
-        # Check red flags
-        red_flags = safety_service.detect_red_flags(request.symptoms, detected_lang)
-        
-        # Format conditions
-        conditions: List[ConditionMatch] = []
-        for result in search_results:
-            p = result["payload"]
-            conditions.append(ConditionMatch(
-                title=p.get("title", "Unknown"),
-                description=p.get("description", ""),
-                symptoms=p.get("symptoms", []),
-                treatments=p.get("treatments", []),
-                severity=p.get("severity_level", "moderate"),
-                confidence=round(result["score"], 3)
-            ))
+        search_results = await _retrieve(ml_service, vector_service, request.symptoms, deadline)
+        route = ml_service.route_generation(request.symptoms, detected_lang, search_results, red_flags)
+        natlas_analysis = await _generate_routed(
+            ml_service, admission, small_admission, deadline, route, request.symptoms, detected_lang, search_results, budget
+        )
+        conditions = _format_conditions(search_results)
         
         recommendations = safety_service.get_recommendations(red_flags)
         disclaimer = safety_service.get_disclaimer(detected_lang)
@@ -66,8 +151,9 @@ async def diagnose_symptoms(request: DiagnosisRequest, req: Request, db: Session
             red_flags_detected=[f["category"] for f in red_flags],
             response_time_ms=processing_time
         )
-        db.add(log)
-        db.commit()
+        with track_stage("db_write"):
+            db.add(log)
+            db.commit()
         
         return DiagnosisResponse(
             conditions=conditions,
@@ -77,12 +163,103 @@ async def diagnose_symptoms(request: DiagnosisRequest, req: Request, db: Session
             processing_time_ms=processing_time,
             recommendations=recommendations,
             detected_language=detected_lang,
-            natlas_analysis=natlas_analysis[:200]
+            natlas_analysis=natlas_analysis or None,
+            degraded_stages=deadline.degraded_stages,
+            generation=budget.report(natlas_analysis) if budget.stop_reason else None,
+            route=route.tier
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/diagnose/conversation", response_model=ConversationTurnResponse, dependencies=[Depends(rate_limit)])
+@instrument("diagnose_conversation")
+async def diagnose_conversation(request: ConversationTurnRequest, req: Request, db: Session = Depends(get_db)):
+    """Multi-turn diagnosis: each message adds to the conversation's symptoms and context"""
+    start_time = time.time()
+    
+    try:
+        ml_service: MLService = req.app.state.ml_service
+        vector_service: VectorService = req.app.state.vector_service
+        safety_service: SafetyService = req.app.state.safety_service
+        admission: AdmissionController = req.app.state.admission_controller
+        sessions: SessionStore = req.app.state.session_store
+        deadline = Deadline.from_request(req)
+        budget = GenerationBudget.from_request(req, request.max_new_tokens, request.max_chars)
+        
+        session_id = request.session_id or uuid.uuid4().hex
+        state, created = sessions.get_or_create(session_id, request.language or settings.DEFAULT_LANGUAGE)
+        if created and not request.language:
+            with track_stage("language_detection"):
+                state.language = ml_service.detect_language(request.message)
+        
+        async with state.lock:
+            # Short follow-ups ("yes, also vomiting") say little about language; keep the first turn's
+            detected_lang = request.language or state.language
+            set_pipeline_language(detected_lang)
+            state.messages.append(request.message)
+            state.turns += 1
+            context_cached = state.kv_cache is not None
+            
+            # Red flags cover the kept history; retrieval only the latest messages, which the
+            # embedding model (~128 tokens) can still see in full
+            with track_stage("red_flag_scan"):
+                red_flags = safety_service.detect_red_flags(state.symptoms)
+            search_results = await _retrieve(ml_service, vector_service, state.recent_symptoms, deadline)
+            natlas_analysis = await _generate(
+                admission, deadline,
+                lambda: ml_service.analyze_turn_with_natlas(
+                    state, sessions, request.message, detected_lang, deadline, budget
+                )
+            )
+            turn = state.turns
+        
+        conditions = _format_conditions(search_results)
+        recommendations = safety_service.get_recommendations(red_flags)
+        disclaimer = safety_service.get_disclaimer(detected_lang)
+        processing_time = int((time.time() - start_time) * 1000)
+        
+        log = DiagnosisLog(
+            session_id=session_id,
+            symptoms_text=request.message[:100],
+            detected_language=detected_lang,
+            matched_conditions=[c.title for c in conditions],
+            red_flags_detected=[f["category"] for f in red_flags],
+            response_time_ms=processing_time
+        )
+        with track_stage("db_write"):
+            db.add(log)
+            db.commit()
+        
+        return ConversationTurnResponse(
+            conditions=conditions,
+            red_flags=[f["message"] for f in red_flags],
+            disclaimer=disclaimer,
+            response_id=str(uuid.uuid4()),
+            processing_time_ms=processing_time,
+            recommendations=recommendations,
+            detected_language=detected_lang,
+            natlas_analysis=natlas_analysis or None,
+            degraded_stages=deadline.degraded_stages,
+            generation=budget.report(natlas_analysis) if budget.stop_reason else None,
+            session_id=session_id,
+            turn=turn,
+            context_cached=context_cached
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/diagnose/conversation/{session_id}")
+async def end_conversation(session_id: str, req: Request):
+    """Forget a conversation and free its cached state"""
+    sessions: SessionStore = req.app.state.session_store
+    return {"session_id": session_id, "ended": sessions.end(session_id)}
+
 @router.get("/languages")
 async def get_supported_languages(req: Request):
     """Get supported languages"""
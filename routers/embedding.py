@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Request, HTTPException
-from db.schemas import EmbeddingRequest, EmbeddingResponse
+from fastapi import APIRouter, Depends, Request, HTTPException, Response
+import json
+from db.schemas import EmbeddingRequest, EmbeddingResponse, EmbeddingBatchRequest, EmbeddingBatchResponse
+from services import embedding_codec
+from services.rate_limiter import rate_limit, request_identities
+from core.config import settings
+from core.metrics import BATCH_SIZE, instrument, set_pipeline_language, track_stage
 
 router = APIRouter()
 
-@router.post("/embedding", response_model=EmbeddingResponse)
+@router.post("/embedding", response_model=EmbeddingResponse, dependencies=[Depends(rate_limit)])
+@instrument("embedding")
 async def generate_embedding(request: EmbeddingRequest, req: Request):
     """Generate embedding"""
     try:
         from services.ml_service import MLService
         ml_service: MLService = req.app.state.ml_service
+        set_pipeline_language(request.language)
         
         embedding = await ml_service.generate_embedding(request.text, request.language)
         
@@ -18,4 +25,68 @@ async def generate_embedding(request: EmbeddingRequest, req: Request):
             model_used=ml_service.get_model_info()["embedding_model"]
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/embeddings",
+    response_model=EmbeddingBatchResponse,
+    responses={200: {"content": {
+        embedding_codec.MEDIA_TYPES[embedding_codec.BINARY]: {},
+        embedding_codec.MEDIA_TYPES[embedding_codec.NPY]: {},
+    }}}
+)
+@instrument("embeddings_batch")
+async def generate_embeddings(request: EmbeddingBatchRequest, req: Request):
+    """Embed many texts, optionally as raw float32/float16/int8 bytes, base64 or .npy"""
+    if len(request.texts) > settings.EMBEDDING_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {settings.EMBEDDING_MAX_BATCH} texts per request")
+    if any(not t.strip() or len(t) > settings.EMBEDDING_MAX_TEXT_LENGTH for t in request.texts):
+        raise HTTPException(
+            status_code=422,
+            detail=f"Texts must be non-empty and at most {settings.EMBEDDING_MAX_TEXT_LENGTH} characters"
+        )
+    
+    # Metered per text in its own buckets, so one call can't embed a whole batch for a single token
+    limiter = getattr(req.app.state, "rate_limiter", None)
+    if limiter is not None and settings.ENABLE_RATE_LIMITING:
+        await limiter.check(
+            request_identities(req),
+            cost=len(request.texts),
+            limit=(settings.EMBEDDING_RATE_LIMIT_PER_MINUTE, settings.EMBEDDING_MAX_BATCH),
+            namespace="embeddings"
+        )
+    
+    try:
+        from services.ml_service import MLService
+        ml_service: MLService = req.app.state.ml_service
+        set_pipeline_language(request.language)
+        BATCH_SIZE.labels(operation="embeddings_request").observe(len(request.texts))
+        
+        embeddings = await ml_service.generate_embeddings_array(request.texts)
+        encoding = embedding_codec.negotiate(req.headers.get("accept"), request.encoding)
+        
+        with track_stage("serialization"):
+            array = embedding_codec.convert(embeddings, request.dtype, request.dimensions)
+            body, fields = embedding_codec.encode(array, encoding)
+            model_used = ml_service.get_model_info()["embedding_model"]
+            
+            if encoding in (embedding_codec.JSON, embedding_codec.BASE64):
+                # Built directly: validating a list of thousands of floats through pydantic costs more than the encoding
+                body = json.dumps({
+                    "dtype": request.dtype,
+                    "shape": list(array.shape),
+                    "model_used": model_used,
+                    **fields
+                }).encode()
+        
+        return Response(
+            content=body,
+            media_type=embedding_codec.MEDIA_TYPES[encoding],
+            headers={
+                "X-Embedding-Dtype": request.dtype,
+                "X-Embedding-Shape": ",".join(str(n) for n in array.shape),
+                "X-Embedding-Model": model_used,
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
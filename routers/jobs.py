@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from datetime import datetime, timezone
+import logging
+
+from core.budget import CHANNEL_HEADER
+from core.metrics import instrument
+from db.schemas import DiagnosisJobRequest, DiagnosisJobResponse
+from services.job_queue import JobQueue, callback_allowed
+from services.rate_limiter import rate_limit
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _job_queue(req: Request) -> JobQueue:
+    queue = getattr(req.app.state, "job_queue", None)
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Job queue unavailable", headers={"Retry-After": "30"})
+    return queue
+
+def _to_response(job: dict) -> DiagnosisJobResponse:
+    return DiagnosisJobResponse(
+        **{**job,
+           "created_at": datetime.fromtimestamp(job["created_at"], timezone.utc),
+           "updated_at": datetime.fromtimestamp(job["updated_at"], timezone.utc)}
+    )
+
+@router.post("/diagnose/jobs", response_model=DiagnosisJobResponse, status_code=202, dependencies=[Depends(rate_limit)])
+@instrument("diagnose_job_enqueue")
+async def create_diagnosis_job(request: DiagnosisJobRequest, req: Request, response: Response):
+    """Queue a diagnosis for the workers and return its job id immediately"""
+    queue = _job_queue(req)
+    if request.callback_url and not await callback_allowed(request.callback_url):
+        raise HTTPException(status_code=422, detail="callback_url must be an allowed http(s) URL")
+    
+    payload = request.model_dump(exclude={"callback_url"})
+    payload["channel"] = req.headers.get(CHANNEL_HEADER)
+    try:
+        job_id = await queue.enqueue(payload, request.callback_url)
+        job = await queue.get(job_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not enqueue job: {e}")
+        raise HTTPException(status_code=503, detail="Job queue unavailable", headers={"Retry-After": "30"})
+    
+    response.headers["Location"] = str(req.url_for("get_diagnosis_job", job_id=job_id))
+    return _to_response(job)
+
+@router.get("/diagnose/jobs/{job_id}", response_model=DiagnosisJobResponse)
+async def get_diagnosis_job(job_id: str, req: Request):
+    """Poll a job; `result` is set once it has succeeded"""
+    queue = _job_queue(req)
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _to_response(job)
@@ -2,38 +2,103 @@ from fastapi import APIRouter, Depends, Request
 from sqlalchemy.orm import Session
 from datetime import datetime
 
+from core.config import settings
 from core.database import get_db
-from db.schemas import OfflineSyncRequest, OfflineSyncResponse
+from db.schemas import OfflineSyncRequest, OfflineSyncResponse, OfflineQueryResult
 from db.models import OfflineSync
+from services.rate_limiter import request_identities
+from services.result_store import ResultStore, idempotency_key
+from core.metrics import instrument, BATCH_SIZE, OFFLINE_SYNC_QUERIES
 
 router = APIRouter()
 KB_VERSION = "1.0.0"
 
 @router.post("/sync", response_model=OfflineSyncResponse)
+@instrument("offline_sync")
 async def sync_offline_data(request: OfflineSyncRequest, req: Request, db: Session = Depends(get_db)):
-    """Sync offline data"""
+    """Sync offline data.
+
+    Each pending query has an idempotency key, so a retried or partly
+    re-uploaded sync gets earlier results back from the result store and
+    only queries not seen before are diagnosed and recorded.
+    """
     from routers.diagnose import diagnose_symptoms
     
-    processed = []
+    store: ResultStore = req.app.state.offline_results
+    queries = {}
     for query in request.pending_queries:
+        key = idempotency_key(
+            request.device_id, query.model_dump(exclude={"idempotency_key"}), query.idempotency_key
+        )
+        queries.setdefault(key, query)      # a query repeated within one upload runs once
+    stored = await store.get_many(queries)
+    missing = [key for key in queries if key not in stored]
+    
+    # Each query still to be diagnosed is a full diagnosis, so it costs one token
+    limiter = getattr(req.app.state, "rate_limiter", None)
+    if limiter is not None and settings.ENABLE_RATE_LIMITING:
+        await limiter.check(
+            request_identities(req, device_id=request.device_id),
+            cost=max(1, len(missing))
+        )
+    
+    BATCH_SIZE.labels(operation="offline_sync").observe(len(request.pending_queries))
+    OFFLINE_SYNC_QUERIES.labels(outcome="stored").inc(len(stored))
+    
+    async def diagnose(query):
         try:
-            result = await diagnose_symptoms(query, req, db)
-            processed.append(result)
-        except:
+            return (await diagnose_symptoms(query, req, db)).model_dump(mode="json")
+        except Exception:
+            return None
+    
+    def result_ttl(result) -> int:
+        # A degraded answer (overload, deadline) is kept only long enough to absorb a quick
+        # retry, so a later retry gets the full analysis
+        if result.get("degraded_stages"):
+            return settings.OFFLINE_SYNC_DEGRADED_TTL_SECONDS
+        return settings.OFFLINE_SYNC_RESULT_TTL_SECONDS
+    
+    results = dict(stored)
+    computed_keys = []
+    failed = 0
+    for key in missing:
+        result, computed = await store.run_once(key, lambda query=queries[key]: diagnose(query), result_ttl)
+        if computed:
+            computed_keys.append(key)
+        if result is None:
+            failed += computed
+            OFFLINE_SYNC_QUERIES.labels(outcome="failed").inc()
             continue
+        OFFLINE_SYNC_QUERIES.labels(outcome="computed" if computed else "joined").inc()
+        results[key] = result
     
-    sync_log = OfflineSync(
-        device_id=request.device_id,
-        pending_queries=[q.dict() for q in request.pending_queries],
-        client_kb_version=request.client_kb_version,
-        sync_status="completed"
-    )
-    db.add(sync_log)
-    db.commit()
+    processed = [
+        OfflineQueryResult(
+            **results[key],
+            idempotency_key=query.idempotency_key or key,
+            replayed=key not in computed_keys
+        )
+        for key, query in queries.items()
+        if key in results
+    ]
+    
+    # Only new work is recorded; a plain retry leaves no trace in offline_sync
+    if computed_keys:
+        sync_log = OfflineSync(
+            device_id=request.device_id,
+            pending_queries=[
+                {**queries[key].model_dump(), "idempotency_key": queries[key].idempotency_key or key}
+                for key in computed_keys
+            ],
+            client_kb_version=request.client_kb_version,
+            sync_status="partial" if failed else "completed"
+        )
+        db.add(sync_log)
+        db.commit()
     
     return OfflineSyncResponse(
         kb_update_required=request.client_kb_version != KB_VERSION,
         kb_version=KB_VERSION,
         processed_queries=processed,
         sync_timestamp=datetime.utcnow()
-    )
\ No newline at end of file
+    )
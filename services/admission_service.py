@@ -0,0 +1,114 @@
+from contextlib import asynccontextmanager
+from typing import Optional
+import asyncio
+import time
+from core.config import settings
+from core.metrics import ADMISSION_DECISIONS, ADMISSION_QUEUE_DEPTH, ADMISSION_IN_FLIGHT, track_stage
+
+
+class OverloadedError(Exception):
+    """Raised when a request would wait too long for a generation slot"""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Bounded-queue admission control in front of a generation model.
+
+    One controller guards N-ATLaS and another the cascade's small model
+    (`for_small_model`), so neither can run unbounded. At most
+    `max_concurrency` generations run at once and at most
+    `max_queue_depth` wait behind them. A request is turned away up front
+    when the queue is full or its estimated wait (queue position x EWMA of
+    recent generation times) exceeds `max_wait_seconds`, so the work we do
+    accept still finishes inside the caller's timeout.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = settings.NATLAS_MAX_CONCURRENCY,
+        max_queue_depth: int = settings.NATLAS_MAX_QUEUE_DEPTH,
+        max_wait_seconds: float = settings.NATLAS_MAX_QUEUE_WAIT_SECONDS,
+        initial_service_seconds: float = 5.0,
+        smoothing: float = 0.2,
+        model: str = "natlas"
+    ):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.max_wait_seconds = max_wait_seconds
+        self.smoothing = smoothing
+        self.avg_service_seconds = initial_service_seconds
+        self.in_flight = 0
+        self.queued = 0
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    @classmethod
+    def for_small_model(
+        cls,
+        max_queue_depth: int = settings.SMALL_MODEL_MAX_QUEUE_DEPTH,
+        max_wait_seconds: float = settings.SMALL_MODEL_MAX_QUEUE_WAIT_SECONDS
+    ) -> "AdmissionController":
+        return cls(
+            max_concurrency=settings.SMALL_MODEL_MAX_CONCURRENCY,
+            max_queue_depth=max_queue_depth,
+            max_wait_seconds=max_wait_seconds,
+            initial_service_seconds=1.0,
+            model="small"
+        )
+
+    def estimate_wait(self) -> float:
+        """Expected seconds before a newly arriving request would start"""
+        ahead = self.queued + self.in_flight - self.max_concurrency + 1
+        if ahead <= 0:
+            return 0.0
+        return ahead / self.max_concurrency * self.avg_service_seconds
+
+    def _record(self, seconds: float):
+        self.avg_service_seconds += self.smoothing * (seconds - self.avg_service_seconds)
+
+    def _update_gauges(self):
+        ADMISSION_QUEUE_DEPTH.labels(model=self.model).set(self.queued)
+        ADMISSION_IN_FLIGHT.labels(model=self.model).set(self.in_flight)
+
+    @asynccontextmanager
+    async def slot(self, max_wait: Optional[float] = None):
+        """Hold a generation slot, or raise OverloadedError.
+
+        `max_wait` tightens max_wait_seconds for this caller, e.g. to what is
+        left of its deadline; the caller also stops waiting once it passes.
+        """
+        limit = self.max_wait_seconds if max_wait is None else min(max_wait, self.max_wait_seconds)
+        wait = self.estimate_wait()
+        if self.queued >= self.max_queue_depth:
+            ADMISSION_DECISIONS.labels(model=self.model, outcome="rejected").inc()
+            raise OverloadedError(max(wait, self.avg_service_seconds), "queue full")
+        if wait > limit:
+            ADMISSION_DECISIONS.labels(model=self.model, outcome="rejected").inc()
+            raise OverloadedError(wait, "estimated wait too long")
+
+        self.queued += 1
+        self._update_gauges()
+        try:
+            with track_stage("admission_wait"):
+                await asyncio.wait_for(self._slots.acquire(), timeout=max(limit, 0))
+        except asyncio.TimeoutError:
+            ADMISSION_DECISIONS.labels(model=self.model, outcome="timed_out").inc()
+            raise OverloadedError(self.estimate_wait(), "timed out waiting for a slot")
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        self._update_gauges()
+        ADMISSION_DECISIONS.labels(model=self.model, outcome="admitted").inc()
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._record(time.monotonic() - start)
+            self.in_flight -= 1
+            self._slots.release()
+            self._update_gauges()
@@ -0,0 +1,199 @@
+"""Hourly and daily diagnosis rollups, maintained incrementally.
+
+Every flush that inserts DiagnosisLog rows also upserts the matching
+DiagnosisRollup counters in the same transaction, so the rollups never
+drift from the logs and dashboards never have to scan diagnosis_logs.
+Existing logs (e.g. from before rollups were installed) are folded in with:
+
+    python -m services.analytics_service rebuild [--since 2026-01-01]
+"""
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from core.database import SessionLocal
+from db.models import DiagnosisLog, DiagnosisRollup
+from db.schemas import SUPPORTED_LANGUAGES
+
+HOUR = "hour"
+DAY = "day"
+GRANULARITIES = {HOUR: timedelta(hours=1), DAY: timedelta(days=1)}
+
+RollupKey = Tuple[str, datetime, str, str, str]    # granularity, bucket_start, language, dimension, value
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if granularity == DAY:
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_deltas(logs: Iterable[DiagnosisLog]) -> Dict[RollupKey, list]:
+    """Count and response-time increments per rollup row for a set of new logs"""
+    deltas: Dict[RollupKey, list] = defaultdict(lambda: [0, 0])
+    for log in logs:
+        created_at = log.created_at or datetime.utcnow()
+        language = log.detected_language or "unknown"
+        if language != "unknown" and language not in SUPPORTED_LANGUAGES:
+            # DiagnosisRollup.language is short; rows from before request languages were validated
+            language = "other"
+        response_time = log.response_time_ms or 0
+        values = [("total", "")]
+        values += [("condition", title) for title in set(log.matched_conditions or [])]
+        values += [("red_flag", category) for category in set(log.red_flags_detected or [])]
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(created_at, granularity)
+            for dimension, value in values:
+                delta = deltas[(granularity, bucket, language, dimension, value)]
+                delta[0] += 1
+                delta[1] += response_time
+    return deltas
+
+
+def apply_deltas(connection, deltas: Dict[RollupKey, list]):
+    """Add the deltas to their rollup rows, creating rows as needed.
+
+    Keys are applied in sorted order so concurrent writers lock rows in the
+    same order and can't deadlock.
+    """
+    if not deltas:
+        return
+    table = DiagnosisRollup.__table__
+    key_columns = ["granularity", "bucket_start", "language", "dimension", "value"]
+    rows = [
+        dict(zip(key_columns, key), count=count, response_time_ms_total=response_time)
+        for key, (count, response_time) in sorted(deltas.items())
+    ]
+
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table).values(rows)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={
+                "count": table.c.count + stmt.excluded.count,
+                "response_time_ms_total": table.c.response_time_ms_total + stmt.excluded.response_time_ms_total,
+            }
+        ))
+        return
+
+    # Other databases: update, then insert whatever didn't exist yet
+    for row in rows:
+        match = and_(*(table.c[column] == row[column] for column in key_columns))
+        result = connection.execute(update(table).where(match).values(
+            count=table.c.count + row["count"],
+            response_time_ms_total=table.c.response_time_ms_total + row["response_time_ms_total"]
+        ))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(row))
+
+
+def _after_flush(session: Session, flush_context):
+    logs = [obj for obj in session.new if isinstance(obj, DiagnosisLog)]
+    if logs:
+        apply_deltas(session.connection(), rollup_deltas(logs))
+
+
+def install_rollups():
+    """Maintain rollups for every DiagnosisLog written through SessionLocal"""
+    if not event.contains(SessionLocal, "after_flush", _after_flush):
+        event.listen(SessionLocal, "after_flush", _after_flush)
+
+
+def rebuild_rollups(db: Session, since: Optional[datetime] = None, chunk_size: int = 5000) -> int:
+    """Recompute rollups from the logs from `since` (a day boundary) onwards; returns logs read.
+
+    Streams the logs in chunks. Run it for past days, or with writes
+    paused, since logs written during the rebuild may be counted twice.
+    """
+    since = bucket_start(since, DAY) if since else None
+    clear = delete(DiagnosisRollup)
+    query = select(DiagnosisLog).execution_options(yield_per=chunk_size)
+    if since is not None:
+        clear = clear.where(DiagnosisRollup.bucket_start >= since)
+        query = query.where(DiagnosisLog.created_at >= since)
+    db.execute(clear)
+
+    total = 0
+    for chunk in db.scalars(query).partitions():
+        apply_deltas(db.connection(), rollup_deltas(chunk))
+        total += len(chunk)
+        db.expunge_all()
+    db.commit()
+    return total
+
+
+def get_stats(
+    db: Session,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    language: Optional[str] = None,
+    top: int = 10
+) -> Dict:
+    """Dashboard summary for [start, end), read from the rollups alone"""
+    start = bucket_start(start, granularity)
+    R = DiagnosisRollup
+    conditions = [R.granularity == granularity, R.bucket_start >= start, R.bucket_start < end]
+    if language:
+        conditions.append(R.language == language)
+    count = func.sum(R.count)
+    response_time = func.sum(R.response_time_ms_total)
+
+    def grouped(dimension: str, column, order_by=None, limit=None):
+        query = (
+            select(column, count, response_time)
+            .where(*conditions, R.dimension == dimension)
+            .group_by(column)
+            .order_by(order_by if order_by is not None else count.desc())
+        )
+        if limit:
+            query = query.limit(limit)
+        return db.execute(query).all()
+
+    def average(total_ms, n):
+        return round(total_ms / n, 1) if n else None
+
+    series = grouped("total", R.bucket_start, order_by=R.bucket_start)
+    total = sum(n for _, n, _ in series)
+    return {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "language": language,
+        "total": total,
+        "avg_response_time_ms": average(sum(ms for _, _, ms in series), total),
+        "series": [
+            {"bucket_start": bucket, "count": n, "avg_response_time_ms": average(ms, n)}
+            for bucket, n, ms in series
+        ],
+        "languages": [{"value": v, "count": n} for v, n, _ in grouped("total", R.language)],
+        "conditions": [{"value": v, "count": n} for v, n, _ in grouped("condition", R.value, limit=top)],
+        "red_flags": [{"value": v, "count": n} for v, n, _ in grouped("red_flag", R.value, limit=top)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagnosis rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only rebuild from this day onwards")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = rebuild_rollups(db, args.since)
+    finally:
+        db.close()
+    print(f"✅ Rebuilt rollups from {total} diagnosis logs")
+
+
+if __name__ == "__main__":
+    main()
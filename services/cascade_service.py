@@ -0,0 +1,93 @@
+from typing import Dict, List, Optional
+import threading
+from core.config import settings
+from core.metrics import CASCADE_GENERATION_LATENCY, CASCADE_LATENCY_SAVED, CASCADE_ROUTES
+
+# Generation tiers, cheapest first
+ROUTE_RETRIEVAL = "retrieval"   # Knowledge base matches only, no generation
+ROUTE_SMALL = "small"           # Small local model, prompted with the top matches
+ROUTE_NATLAS = "natlas"         # Full N-ATLaS
+
+
+class Route:
+    """Which tier answers a request, and why"""
+
+    def __init__(self, tier: str, reason: str, top_score: float = 0.0):
+        self.tier = tier
+        self.reason = reason
+        self.top_score = top_score
+
+    def __repr__(self) -> str:
+        return f"Route({self.tier}, {self.reason}, top_score={self.top_score:.3f})"
+
+
+class ModelCascade:
+    """Picks the cheapest generation tier that is good enough for a request.
+
+    Decisions use features we already have by the time generation starts:
+    red flags, retrieval scores, input length and language. Anything with a
+    red flag, a weak or missing retrieval match, a long description or a
+    language the small model doesn't cover goes to N-ATLaS. Latency saved
+    is estimated against a running average of N-ATLaS generation time.
+    """
+
+    def __init__(self, small_model: Optional[str] = None):
+        self.enabled = settings.ENABLE_MODEL_CASCADE
+        self.small_model = small_model
+        self.small_languages = {
+            lang.strip() for lang in settings.CASCADE_SMALL_MODEL_LANGUAGES.split(",") if lang.strip()
+        }
+        self._natlas_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def route(self, symptoms: str, language: str, search_results: List[Dict], red_flags: List[Dict]) -> Route:
+        scores = sorted((r["score"] for r in search_results), reverse=True)
+        top = scores[0] if scores else 0.0
+        margin = top - scores[1] if len(scores) > 1 else top
+        length = len(symptoms.strip())
+
+        if not self.enabled:
+            route = Route(ROUTE_NATLAS, "disabled", top)
+        elif red_flags:
+            route = Route(ROUTE_NATLAS, "red_flags", top)
+        elif not scores:
+            route = Route(ROUTE_NATLAS, "no_matches", top)
+        elif (top >= settings.CASCADE_SKIP_GENERATION_SCORE
+              and margin >= settings.CASCADE_SKIP_GENERATION_MARGIN
+              and length <= settings.CASCADE_SKIP_GENERATION_MAX_CHARS):
+            route = Route(ROUTE_RETRIEVAL, "confident_match", top)
+        elif top < settings.CASCADE_SMALL_MODEL_SCORE:
+            route = Route(ROUTE_NATLAS, "low_confidence", top)
+        elif length > settings.CASCADE_SMALL_MODEL_MAX_CHARS:
+            route = Route(ROUTE_NATLAS, "long_input", top)
+        elif language not in self.small_languages:
+            route = Route(ROUTE_NATLAS, "language", top)
+        elif self.small_model is None:
+            route = Route(ROUTE_NATLAS, "no_small_model", top)
+        else:
+            route = Route(ROUTE_SMALL, "moderate_match", top)
+
+        CASCADE_ROUTES.labels(route=route.tier, reason=route.reason).inc()
+        return route
+
+    def record(self, tier: str, seconds: float):
+        """Feed back how long a tier's generation took"""
+        CASCADE_GENERATION_LATENCY.labels(route=tier).observe(seconds)
+        if tier == ROUTE_NATLAS:
+            with self._lock:
+                if self._natlas_seconds is None:
+                    self._natlas_seconds = seconds
+                else:
+                    self._natlas_seconds += 0.1 * (seconds - self._natlas_seconds)
+            return
+        baseline = self._natlas_seconds
+        if baseline is not None:
+            CASCADE_LATENCY_SAVED.labels(route=tier).inc(max(baseline - seconds, 0.0))
+
+    def get_info(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "small_model": self.small_model,
+            "small_model_languages": sorted(self.small_languages),
+            "natlas_generation_seconds_avg": self._natlas_seconds,
+        }
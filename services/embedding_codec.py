@@ -0,0 +1,77 @@
+import base64
+import io
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+# Wire formats, selected by the request's `encoding` or else the Accept header
+JSON, BASE64, BINARY, NPY = "json", "base64", "binary", "npy"
+MEDIA_TYPES = {
+    JSON: "application/json",
+    BASE64: "application/json",
+    BINARY: "application/octet-stream",
+    NPY: "application/x-npy",
+}
+DTYPES = {
+    "float32": np.dtype("<f4"),
+    "float16": np.dtype("<f2"),
+    "int8": np.dtype("i1"),
+}
+
+
+def negotiate(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """Pick a wire format: explicit request field first, then the Accept header, else JSON"""
+    if requested:
+        return requested
+    for media_range in (accept or "").split(","):
+        media_type = media_range.split(";")[0].strip().lower()
+        if media_type == MEDIA_TYPES[BINARY]:
+            return BINARY
+        if media_type == MEDIA_TYPES[NPY]:
+            return NPY
+    return JSON
+
+
+def truncate(embeddings: np.ndarray, dimensions: Optional[int]) -> np.ndarray:
+    """Keep the leading `dimensions` components and re-normalize to unit length"""
+    if not dimensions or dimensions >= embeddings.shape[1]:
+        return embeddings
+    head = embeddings[:, :dimensions]
+    norms = np.linalg.norm(head, axis=1, keepdims=True)
+    return head / np.maximum(norms, 1e-12)
+
+
+def quantize_int8(embeddings: np.ndarray) -> np.ndarray:
+    """Scale each vector so its largest component maps to +/-127.
+
+    Cosine similarity is unchanged by per-vector scaling, so clients only
+    need to cast to float and L2-normalize to recover the unit vector.
+    """
+    peak = np.abs(embeddings).max(axis=1, keepdims=True)
+    scaled = embeddings * (127.0 / np.maximum(peak, 1e-12))
+    return np.rint(scaled).astype(DTYPES["int8"])
+
+
+def convert(embeddings: np.ndarray, dtype: str, dimensions: Optional[int] = None) -> np.ndarray:
+    """Truncate and cast float32 embeddings to the requested little-endian dtype"""
+    embeddings = truncate(embeddings, dimensions)
+    if dtype == "int8":
+        return quantize_int8(embeddings)
+    return np.ascontiguousarray(embeddings, dtype=DTYPES[dtype])
+
+
+def encode(embeddings: np.ndarray, encoding: str) -> Tuple[bytes, Dict]:
+    """Serialize a converted (n, d) array; returns the body and any JSON fields it belongs in"""
+    if encoding == BINARY:
+        return embeddings.tobytes(), {}
+    if encoding == NPY:
+        buffer = io.BytesIO()
+        np.save(buffer, embeddings, allow_pickle=False)
+        return buffer.getvalue(), {}
+    if encoding == BASE64:
+        return b"", {"data": base64.b64encode(embeddings.tobytes()).decode("ascii")}
+    return b"", {"embeddings": embeddings.tolist()}
+
+
+def decode(body: bytes, dtype: str, shape: Tuple[int, int]) -> np.ndarray:
+    """Inverse of the binary encoding, for clients written in Python"""
+    return np.frombuffer(body, dtype=DTYPES[dtype]).reshape(shape)
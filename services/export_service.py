@@ -0,0 +1,163 @@
+"""Streaming export of diagnosis logs for research dumps.
+
+Rows are read through a server-side cursor EXPORT_CHUNK_ROWS at a time,
+anonymized (core/anonymize.py) and encoded chunk by chunk, so memory use
+doesn't depend on the size of the export. Used by
+GET /admin/export/diagnosis-logs and from the command line:
+
+    python -m services.export_service --format parquet --start 2026-01-01 \\
+        [--end 2026-02-01] [--language ha] --output logs.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import sqlalchemy as sa
+
+from core.anonymize import anonymize_log
+from core.config import settings
+from core.database import engine
+from db.models import DiagnosisLog
+
+CSV_GZIP = "csv.gz"
+PARQUET = "parquet"
+MEDIA_TYPES = {CSV_GZIP: "application/gzip", PARQUET: "application/vnd.apache.parquet"}
+
+_JSON_COLUMNS = ("matched_conditions", "red_flags_detected")
+
+
+def export_columns() -> List[str]:
+    columns = [c.name for c in DiagnosisLog.__table__.columns]
+    if settings.LOG_ANONYMIZATION:
+        columns.remove("user_id")
+    return columns
+
+
+def iter_log_chunks(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    language: Optional[str] = None,
+    chunk_size: int = settings.EXPORT_CHUNK_ROWS
+) -> Iterator[List[Dict]]:
+    """Anonymized log rows in created_at order, chunk_size rows at a time"""
+    table = DiagnosisLog.__table__
+    query = sa.select(table).order_by(table.c.created_at, table.c.id)
+    if start is not None:
+        query = query.where(table.c.created_at >= start)
+    if end is not None:
+        query = query.where(table.c.created_at < end)
+    if language:
+        query = query.where(table.c.detected_language == language)
+
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for chunk in result.mappings().partitions():
+            yield [anonymize_log(row) for row in chunk]
+
+
+def _flatten(row: Dict) -> Dict:
+    for name in _JSON_COLUMNS:
+        if row.get(name) is not None:
+            row[name] = json.dumps(row[name], ensure_ascii=False)
+    return row
+
+
+def csv_gzip_stream(chunks: Iterator[List[Dict]]) -> Iterator[bytes]:
+    columns = export_columns()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)    # wbits 31: gzip container
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in chunks:
+        for row in chunk:
+            writer.writerow(_flatten(row))
+        data = compressor.compress(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+        if data:
+            yield data
+    yield compressor.compress(buffer.getvalue().encode("utf-8")) + compressor.flush()
+
+
+class _ChunkSink:
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def parquet_stream(chunks: Iterator[List[Dict]]) -> Iterator[bytes]:
+    """One zstd-compressed row group per chunk, sent as soon as it is encoded"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"id": pa.int64(), "user_id": pa.int64(), "response_time_ms": pa.int64(), "created_at": pa.timestamp("us")}
+    columns = export_columns()
+    schema = pa.schema([pa.field(name, types.get(name, pa.string())) for name in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for chunk in chunks:
+            rows = [_flatten(row) for row in chunk]
+            writer.write_batch(pa.RecordBatch.from_pydict(
+                {name: [row.get(name) for row in rows] for name in columns}, schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_logs(
+    fmt: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    language: Optional[str] = None
+) -> Iterator[bytes]:
+    chunks = iter_log_chunks(start, end, language)
+    return parquet_stream(chunks) if fmt == PARQUET else csv_gzip_stream(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export anonymized diagnosis logs")
+    parser.add_argument("--format", choices=[CSV_GZIP, PARQUET], default=CSV_GZIP)
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--language")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    written = 0
+    with open(args.output, "wb") as f:
+        for data in export_logs(args.format, args.start, args.end, args.language):
+            f.write(data)
+            written += len(data)
+    print(f"✅ Exported diagnosis logs to {args.output} ({written} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import asyncio
+import ipaddress
+import json
+import logging
+import socket
+import time
+import uuid
+import httpx
+import redis.asyncio as redis
+from core.config import settings
+from core.metrics import JOB_EVENTS, JOB_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class Job:
+    """One delivery of a job to a worker"""
+
+    def __init__(self, entry_id: str, job_id: str, request: Dict, attempts: int, callback_url: Optional[str]):
+        self.entry_id = entry_id
+        self.job_id = job_id
+        self.request = request
+        self.attempts = attempts
+        self.callback_url = callback_url
+
+
+async def callback_allowed(url: str) -> bool:
+    """http(s) URLs on a JOB_CALLBACK_ALLOWED_HOSTS host that resolves only to public addresses.
+
+    Nothing is allowed while the allowlist is empty. The host is resolved
+    and rejected if any address is private, loopback, link-local or
+    otherwise not globally routable, so a callback can't be pointed at
+    internal services.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    allowed = [h.strip().lower() for h in settings.JOB_CALLBACK_ALLOWED_HOSTS.split(",") if h.strip()]
+    if parsed.hostname.lower() not in allowed:
+        return False
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError):
+        return False
+    addresses = {ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos}
+    return bool(addresses) and all(address.is_global for address in addresses)
+
+
+class JobQueue:
+    """Diagnosis jobs on a Redis stream, consumed by worker processes in a consumer group.
+
+    Each job is a small stream entry pointing at a hash (afiya:job:<id>)
+    holding its request, status, attempts and result, so API pods can
+    answer polls without touching the stream. Workers read batches with
+    XREADGROUP and ack when done. A failed job is re-queued until
+    JOB_MAX_ATTEMPTS, and entries left unacked by a crashed worker are
+    reclaimed with XAUTOCLAIM after JOB_VISIBILITY_TIMEOUT_SECONDS; a live
+    worker keeps its claim fresh with `hold` while a batch runs.
+    """
+
+    JOB_KEY_PREFIX = "afiya:job"
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        stream: str = settings.JOB_STREAM,
+        group: str = settings.JOB_CONSUMER_GROUP
+    ):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.dead_letter_stream = f"{stream}:dead"
+
+    async def initialize(self):
+        """Connect and create the stream and consumer group if needed"""
+        if self.client is None:
+            self.client = redis.from_url(settings.REDIS_URL, decode_responses=True, socket_timeout=5)
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.JOB_KEY_PREFIX}:{job_id}"
+
+    async def enqueue(self, request: Dict, callback_url: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping={
+                "status": QUEUED,
+                "request": json.dumps(request),
+                "callback_url": callback_url or "",
+                "attempts": 0,
+                "created_at": now,
+                "updated_at": now,
+            })
+            pipe.expire(self._key(job_id), settings.JOB_RESULT_TTL_SECONDS)
+            pipe.xadd(self.stream, {"job_id": job_id}, maxlen=settings.JOB_STREAM_MAXLEN, approximate=True)
+            await pipe.execute()
+        JOB_EVENTS.labels(event="enqueued").inc()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Status, attempts and (when finished) result or error of a job"""
+        data = await self.client.hgetall(self._key(job_id))
+        if not data or "status" not in data:
+            return None
+        return {
+            "job_id": job_id,
+            "status": data["status"],
+            "attempts": int(data.get("attempts", 0)),
+            "created_at": float(data["created_at"]),
+            "updated_at": float(data["updated_at"]),
+            "result": json.loads(data["result"]) if data.get("result") else None,
+            "error": data.get("error") or None,
+        }
+
+    async def claim(self, consumer: str, count: int = settings.JOB_BATCH_SIZE,
+                    block_ms: int = settings.JOB_BATCH_WAIT_MS) -> List[Job]:
+        """Take up to `count` jobs: ones abandoned by dead workers first, then new ones"""
+        _, entries, _ = await self.client.xautoclaim(
+            self.stream, self.group, consumer,
+            min_idle_time=settings.JOB_VISIBILITY_TIMEOUT_SECONDS * 1000,
+            start_id="0-0",
+            count=count
+        )
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if len(entries) < count:
+            response = await self.client.xreadgroup(
+                self.group, consumer, {self.stream: ">"},
+                count=count - len(entries),
+                block=None if entries else block_ms
+            )
+            for _, messages in response or []:
+                entries.extend(messages)
+
+        jobs = []
+        for entry_id, fields in entries:
+            job = await self._start(entry_id, fields.get("job_id", ""))
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    async def _start(self, entry_id: str, job_id: str) -> Optional[Job]:
+        key = self._key(job_id)
+        data = await self.client.hgetall(key)
+        if not data or data.get("status") in (SUCCEEDED, FAILED):
+            # Expired, or a duplicate delivery of a job that already finished
+            await self._ack(entry_id)
+            return None
+
+        attempts = int(data.get("attempts", 0)) + 1
+        if attempts > settings.JOB_MAX_ATTEMPTS:
+            await self._finish_failed(entry_id, job_id, data.get("error") or "Too many attempts")
+            return None
+
+        now = time.time()
+        await self.client.hset(key, mapping={"status": RUNNING, "attempts": attempts, "updated_at": now})
+        if attempts == 1:
+            JOB_QUEUE_WAIT.observe(max(0.0, now - float(data["created_at"])))
+        return Job(entry_id, job_id, json.loads(data["request"]), attempts, data.get("callback_url") or None)
+
+    async def extend(self, consumer: str, jobs: List[Job]):
+        """Reset the idle time of jobs still pending for `consumer` so they aren't reclaimed"""
+        await self.client.xclaim(
+            self.stream, self.group, consumer,
+            min_idle_time=0,
+            message_ids=[job.entry_id for job in jobs],
+            justid=True
+        )
+
+    @asynccontextmanager
+    async def hold(self, consumer: str, jobs: List[Job]):
+        """Extend the claim on `jobs` every third of JOB_VISIBILITY_TIMEOUT_SECONDS until the block exits"""
+        async def keep_claimed():
+            while True:
+                await asyncio.sleep(settings.JOB_VISIBILITY_TIMEOUT_SECONDS / 3)
+                try:
+                    await self.extend(consumer, jobs)
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not extend claim on {len(jobs)} jobs: {e}")
+
+        task = asyncio.create_task(keep_claimed())
+        try:
+            yield
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def complete(self, job: Job, result: Dict):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job.job_id), mapping={
+                "status": SUCCEEDED,
+                "result": json.dumps(result, default=str),
+                "error": "",
+                "updated_at": time.time(),
+            })
+            pipe.expire(self._key(job.job_id), settings.JOB_RESULT_TTL_SECONDS)
+            pipe.xack(self.stream, self.group, job.entry_id)
+            pipe.xdel(self.stream, job.entry_id)
+            await pipe.execute()
+        JOB_EVENTS.labels(event="succeeded").inc()
+
+    async def fail(self, job: Job, error: str):
+        """Re-queue the job at the back of the stream, or fail it for good after JOB_MAX_ATTEMPTS"""
+        if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+            await self._finish_failed(job.entry_id, job.job_id, error)
+            return
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job.job_id), mapping={"status": QUEUED, "error": error, "updated_at": time.time()})
+            pipe.xadd(self.stream, {"job_id": job.job_id}, maxlen=settings.JOB_STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, job.entry_id)
+            pipe.xdel(self.stream, job.entry_id)
+            await pipe.execute()
+        JOB_EVENTS.labels(event="retried").inc()
+
+    async def _finish_failed(self, entry_id: str, job_id: str, error: str):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping={"status": FAILED, "error": error, "updated_at": time.time()})
+            pipe.xadd(self.dead_letter_stream, {"job_id": job_id, "error": error[:500]},
+                      maxlen=settings.JOB_STREAM_MAXLEN, approximate=True)
+            pipe.xack(self.stream, self.group, entry_id)
+            pipe.xdel(self.stream, entry_id)
+            await pipe.execute()
+        JOB_EVENTS.labels(event="failed").inc()
+
+    async def _ack(self, entry_id: str):
+        await self.client.xack(self.stream, self.group, entry_id)
+        await self.client.xdel(self.stream, entry_id)
+
+    async def depth(self) -> int:
+        """Jobs waiting or in progress"""
+        return await self.client.xlen(self.stream)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+
+async def send_callback(url: str, payload: Dict, attempts: int = 3):
+    """POST a finished job to its callback URL, retrying with backoff; failures are only logged"""
+    # Checked again at send time: the allowlist or the host's DNS may have changed since enqueue
+    if not await callback_allowed(url):
+        logger.warning(f"⚠️ Callback to {urlparse(url).hostname} is no longer allowed, not sent")
+        JOB_EVENTS.labels(event="callback_failed").inc()
+        return
+    async with httpx.AsyncClient(timeout=settings.JOB_CALLBACK_TIMEOUT_SECONDS) as client:
+        for attempt in range(attempts):
+            try:
+                response = await client.post(url, content=json.dumps(payload, default=str),
+                                             headers={"Content-Type": "application/json"})
+                if response.status_code < 500:
+                    JOB_EVENTS.labels(event="callback_sent").inc()
+                    return
+            except httpx.HTTPError as e:
+                logger.warning(f"⚠️ Callback to {urlparse(url).hostname} failed: {e}")
+            await asyncio.sleep(2 ** attempt)
+    JOB_EVENTS.labels(event="callback_failed").inc()
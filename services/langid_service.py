@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple
+from pathlib import Path
+import json
+import unicodedata
+import numpy as np
+
+# Seed sentences per language used to build the n-gram profiles at startup
+DEFAULT_CORPUS_PATH = Path(__file__).resolve().parent.parent / "data" / "langid" / "train.json"
+
+NGRAM_ORDERS = (1, 2, 3, 4)
+NUM_BUCKETS = 1 << 15
+_HASH_PRIME = np.uint64(0x100000001B3)
+# Per-order salts keep e.g. the unigram "a" and the bigram " a" from sharing a bucket
+_ORDER_SALTS = [np.uint64((0x9E3779B97F4A7C15 * n) % (1 << 64)) for n in NGRAM_ORDERS]
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, NFC-normalize and pad with spaces so word edges become n-grams"""
+    text = unicodedata.normalize("NFC", text.lower())
+    return " " + " ".join(text.split()) + " "
+
+
+def _ngram_ids(text: str) -> np.ndarray:
+    """Hash every character n-gram of `text` into a bucket id, fully vectorized"""
+    codepoints = np.frombuffer(_normalize(text).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    # Each order's rolling hash extends the previous order's by one character
+    h = codepoints
+    hashes = [h ^ _ORDER_SALTS[0]]
+    for n, salt in zip(NGRAM_ORDERS[1:], _ORDER_SALTS[1:]):
+        if len(h) < 2:
+            break
+        h = h[:-1] * _HASH_PRIME + codepoints[n - 1:]
+        hashes.append(h ^ salt)
+    h = np.concatenate(hashes)
+    h ^= h >> np.uint64(29)
+    return (h & np.uint64(NUM_BUCKETS - 1)).astype(np.intp)
+
+
+class LangIDService:
+    """Character n-gram naive Bayes language identifier for en, yo, ha, ig, pcm"""
+
+    def __init__(
+        self,
+        corpus_path: Optional[Path] = None,
+        smoothing: float = 0.1,
+        temperature: float = 4.0
+    ):
+        self.corpus_path = corpus_path or DEFAULT_CORPUS_PATH
+        self.smoothing = smoothing
+        self.temperature = temperature
+        self.languages: List[str] = []
+        # (NUM_BUCKETS, n_languages) log-probabilities; row lookups give a score per language
+        self.log_probs: Optional[np.ndarray] = None
+        self._build_profiles()
+
+    def _build_profiles(self):
+        """Precompute smoothed per-language n-gram log-probability arrays"""
+        with open(self.corpus_path, encoding="utf-8") as f:
+            corpus: Dict[str, List[str]] = json.load(f)
+
+        self.languages = list(corpus)
+        counts = np.zeros((len(self.languages), NUM_BUCKETS), dtype=np.float64)
+        for i, lang in enumerate(self.languages):
+            for sentence in corpus[lang]:
+                counts[i] += np.bincount(_ngram_ids(sentence), minlength=NUM_BUCKETS)
+
+        counts += self.smoothing
+        log_probs = np.log(counts) - np.log(counts.sum(axis=1, keepdims=True))
+        self.log_probs = np.ascontiguousarray(log_probs.T, dtype=np.float32)
+
+    def _confidences(self, scores: np.ndarray, num_ngrams: np.ndarray) -> np.ndarray:
+        """Softmax over per-n-gram average log-likelihood, so length doesn't inflate confidence"""
+        scaled = scores / num_ngrams[:, None] * self.temperature
+        scaled -= scaled.max(axis=1, keepdims=True)
+        probs = np.exp(scaled)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def identify(self, text: str) -> Tuple[str, float]:
+        """Return (language code, confidence in [0, 1]) for one text"""
+        ids = _ngram_ids(text)
+        scores = self.log_probs.take(ids, axis=0).sum(axis=0)
+        probs = self._confidences(scores[None, :], np.array([len(ids)], dtype=np.float64))[0]
+        best = int(probs.argmax())
+        return self.languages[best], float(probs[best])
+
+    def identify_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Score many texts with a single gather and segmented sum"""
+        if not texts:
+            return []
+        per_text = [_ngram_ids(t) for t in texts]
+        lengths = np.array([len(ids) for ids in per_text], dtype=np.intp)
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        scores = np.add.reduceat(self.log_probs.take(np.concatenate(per_text), axis=0), offsets, axis=0)
+        probs = self._confidences(scores, lengths.astype(np.float64))
+        best = probs.argmax(axis=1)
+        return [
+            (self.languages[b], float(probs[i, b]))
+            for i, b in enumerate(best)
+        ]
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """Confidence for every supported language"""
+        ids = _ngram_ids(text)
+        probs = self._confidences(
+            self.log_probs.take(ids, axis=0).sum(axis=0)[None, :],
+            np.array([len(ids)], dtype=np.float64)
+        )[0]
+        return {lang: float(p) for lang, p in zip(self.languages, probs)}
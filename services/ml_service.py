@@ -1,71 +1,202 @@
 from sentence_transformers import SentenceTransformer
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+import numpy as np
 import torch
+from core.budget import GenerationBudget
 from core.config import settings
+from core.deadline import Deadline
+from core.metrics import BATCH_SIZE, MODEL_MEMORY_BYTES, DEVICE_MEMORY_BYTES, track_stage
+from core.profiling import profile_ops
+from services.cascade_service import ModelCascade, Route, ROUTE_NATLAS, ROUTE_RETRIEVAL, ROUTE_SMALL
 from services.natlas_service import NATLaSService
+from services.session_service import ConversationState, SessionStore
+
+logger = logging.getLogger(__name__)
 
 class MLService:
     """ML Service with N-ATLaS and embeddings"""
     
-    def __init__(self):
-        self.embedding_model = None
-        self.natlas_service = None
+    def __init__(
+        self,
+        embedding_model=None,
+        natlas_service: Optional[NATLaSService] = None,
+        small_model_service: Optional[NATLaSService] = None
+    ):
+        # Pre-built components (e.g. tiny stand-ins in benchmarks) skip loading
+        self.embedding_model = embedding_model
+        self.natlas_service = natlas_service
+        self.small_model_service = small_model_service
+        self.cascade: Optional[ModelCascade] = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         
     async def initialize(self):
         """Initialize all ML services"""
-        print(f"🤖 Initializing ML Services on {self.device}")
+        logger.info(f"🤖 Initializing ML Services on {self.device}")
         
         # Load embedding model
-        print(f"📊 Loading: {settings.EMBEDDING_MODEL}")
-        self.embedding_model = SentenceTransformer(
-            settings.EMBEDDING_MODEL,
-            device=self.device
-        )
-        print("✅ Embedding model loaded")
+        if self.embedding_model is None:
+            logger.info(f"📊 Loading: {settings.EMBEDDING_MODEL}")
+            self.embedding_model = SentenceTransformer(
+                settings.EMBEDDING_MODEL,
+                device=self.device
+            )
+            logger.info("✅ Embedding model loaded")
         
         # Initialize N-ATLaS
-        self.natlas_service = NATLaSService()
+        if self.natlas_service is None:
+            self.natlas_service = NATLaSService()
         await self.natlas_service.initialize()
+        
+        # Small model for the cascade's middle tier; N-ATLaS covers everything without it
+        if self.small_model_service is None and settings.ENABLE_MODEL_CASCADE and settings.CASCADE_SMALL_MODEL:
+            try:
+                small = NATLaSService(model_name=settings.CASCADE_SMALL_MODEL, draft_model_name=None)
+                await small.initialize()
+                self.small_model_service = small
+            except Exception as e:
+                logger.warning(f"⚠️ Cascade small model unavailable, routing to N-ATLaS: {e}")
+        self.cascade = ModelCascade(
+            small_model=self.small_model_service.model_name if self.small_model_service is not None else None
+        )
+        
+        self._register_memory_gauges()
+    
+    def _register_memory_gauges(self):
+        """Export model weight sizes and live accelerator memory on /metrics"""
+        embedding_bytes = sum(p.numel() * p.element_size() for p in self.embedding_model.parameters())
+        MODEL_MEMORY_BYTES.labels(model="embedding", device=self.device).set(embedding_bytes)
+        
+        natlas_model = self.natlas_service.model
+        if natlas_model is not None and hasattr(natlas_model, "get_memory_footprint"):
+            MODEL_MEMORY_BYTES.labels(model="natlas", device=self.device).set(natlas_model.get_memory_footprint())
+        
+        small_model = self.small_model_service.model if self.small_model_service is not None else None
+        if small_model is not None and hasattr(small_model, "get_memory_footprint"):
+            MODEL_MEMORY_BYTES.labels(model="cascade_small", device=self.device).set(small_model.get_memory_footprint())
+        
+        if torch.cuda.is_available():
+            DEVICE_MEMORY_BYTES.labels(device="cuda", kind="allocated").set_function(torch.cuda.memory_allocated)
+            DEVICE_MEMORY_BYTES.labels(device="cuda", kind="reserved").set_function(torch.cuda.memory_reserved)
     
     async def generate_embedding(self, text: str, language: Optional[str] = None) -> List[float]:
         """Generate embedding"""
         if self.embedding_model is None:
             raise RuntimeError("Embedding model not initialized")
         
-        embedding = self.embedding_model.encode(
-            text.strip(),
-            convert_to_numpy=True,
-            normalize_embeddings=True
-        )
+        with track_stage("embedding"), profile_ops("embedding"):
+            embedding = self.embedding_model.encode(
+                text.strip(),
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
         return embedding.tolist()
     
     async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings in batch"""
+        return (await self.generate_embeddings_array(texts)).tolist()
+    
+    async def generate_embeddings_array(self, texts: List[str]) -> np.ndarray:
+        """Generate unit-length float32 embeddings as an (n, dim) array, encoding off the event loop"""
         if self.embedding_model is None:
             raise RuntimeError("Embedding model not initialized")
         
-        embeddings = self.embedding_model.encode(
-            [t.strip() for t in texts],
-            convert_to_numpy=True,
-            batch_size=32,
-            normalize_embeddings=True
-        )
-        return embeddings.tolist()
+        BATCH_SIZE.labels(operation="embedding").observe(len(texts))
+        with track_stage("embedding"):
+            return await asyncio.to_thread(self._encode_batch, [t.strip() for t in texts])
     
-    async def analyze_with_natlas(self, symptoms: str, language: str = "en") -> str:
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        with profile_ops("embedding"):
+            embeddings = self.embedding_model.encode(
+                texts,
+                convert_to_numpy=True,
+                batch_size=32,
+                normalize_embeddings=True
+            )
+        return np.asarray(embeddings, dtype=np.float32)
+    
+    async def analyze_with_natlas(
+        self,
+        symptoms: str,
+        language: str = "en",
+        deadline: Optional[Deadline] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
         """Use N-ATLaS for analysis"""
-        return await self.natlas_service.analyze_symptoms(symptoms, language)
+        start = time.perf_counter()
+        analysis = await self.natlas_service.analyze_symptoms(symptoms, language, deadline, budget)
+        self.cascade.record(ROUTE_NATLAS, time.perf_counter() - start)
+        return analysis
+    
+    def route_generation(self, symptoms: str, language: str, search_results: List[Dict], red_flags: List[Dict]) -> Route:
+        """Choose the generation tier for a request (see ModelCascade)"""
+        with track_stage("routing"):
+            route = self.cascade.route(symptoms, language, search_results, red_flags)
+        if route.tier == ROUTE_RETRIEVAL:
+            self.cascade.record(ROUTE_RETRIEVAL, 0.0)
+        return route
+    
+    async def analyze_with_small_model(
+        self,
+        symptoms: str,
+        language: str,
+        search_results: List[Dict],
+        deadline: Optional[Deadline] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
+        """Use the cascade's small model, grounded on the top knowledge base matches"""
+        conditions = [r["payload"].get("title", "Unknown") for r in search_results[:3]]
+        start = time.perf_counter()
+        analysis = await self.small_model_service.analyze_symptoms(symptoms, language, deadline, budget, conditions)
+        self.cascade.record(ROUTE_SMALL, time.perf_counter() - start)
+        return analysis
+    
+    async def analyze_batch_with_natlas(
+        self,
+        symptoms: List[str],
+        languages: List[str],
+        budgets: List[GenerationBudget]
+    ) -> List[str]:
+        """Use N-ATLaS for several analyses in one batched generation"""
+        BATCH_SIZE.labels(operation="generation").observe(len(symptoms))
+        start = time.perf_counter()
+        analyses = await self.natlas_service.analyze_symptoms_batch(symptoms, languages, budgets)
+        self.cascade.record(ROUTE_NATLAS, time.perf_counter() - start)
+        return analyses
+    
+    async def analyze_turn_with_natlas(
+        self,
+        state: ConversationState,
+        sessions: SessionStore,
+        message: str,
+        language: str = "en",
+        deadline: Optional[Deadline] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
+        """Use N-ATLaS for the next turn of a conversation, reusing its cached context"""
+        return await self.natlas_service.analyze_turn(state, sessions, message, language, deadline, budget)
     
     def detect_language(self, text: str) -> str:
         """Detect language"""
         return self.natlas_service.detect_language(text)
     
+    def detect_language_with_confidence(self, text: str) -> Tuple[str, float]:
+        """Detect language with a confidence score"""
+        return self.natlas_service.detect_language_with_confidence(text)
+    
+    def detect_language_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Detect languages with confidence for many texts"""
+        BATCH_SIZE.labels(operation="language_detection").observe(len(texts))
+        return self.natlas_service.detect_language_batch(texts)
+    
     def get_model_info(self) -> dict:
         """Get model information"""
         return {
             "embedding_model": settings.EMBEDDING_MODEL,
             "device": self.device,
             "dimension": self.embedding_model.get_sentence_embedding_dimension(),
-            "natlas": self.natlas_service.get_model_info()
+            "natlas": self.natlas_service.get_model_info(),
+            "cascade": self.cascade.get_info()
         }
\ No newline at end of file
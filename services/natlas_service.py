@@ -2,18 +2,119 @@ from transformers import (
     AutoTokenizer,
     AutoModelForCausalLM,
     AutoConfig,
-    BitsAndBytesConfig
+    BitsAndBytesConfig,
+    StoppingCriteria,
+    StoppingCriteriaList
 )
+import asyncio
+import logging
+import threading
+import time
 import torch
-from typing import Dict
+from typing import Dict, List, Optional, Tuple, Union
+from core.budget import GenerationBudget, last_sentence_end, trim_to_budget
 from core.config import settings
+from core.deadline import Deadline
+from core.metrics import (
+    PROMPT_TOKENS, GENERATED_TOKENS, GENERATION_TOKENS_PER_SECOND, SESSION_PREFILL_TOKENS,
+    SPECULATIVE_ACCEPTANCE_RATE, SPECULATIVE_DRAFT_TOKENS, SPECULATIVE_TOKENS_PER_STEP, language_label, track_stage
+)
+from core.profiling import profile_ops
+from services.langid_service import LangIDService
+from services.session_service import ConversationState, SessionStore, kv_cache_nbytes
+
+logger = logging.getLogger(__name__)
+
+class DeadlineStoppingCriteria(StoppingCriteria):
+    """Stop decoding once the request's time budget is spent"""
+
+    def __init__(self, stop_at: float):
+        self.stop_at = stop_at
+        self.triggered = False
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if time.monotonic() >= self.stop_at:
+            self.triggered = True
+        return torch.full((input_ids.shape[0],), self.triggered, dtype=torch.bool, device=input_ids.device)
+
+class SentenceBudgetStoppingCriteria(StoppingCriteria):
+    """Stop at a sentence end once enough of the character budget is used, or when it is used up.
+
+    A sentence only counts as finished once whitespace follows its
+    punctuation, so "3.5" can't stop decoding halfway; the token after the
+    boundary is trimmed off afterwards.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, max_chars: Union[int, List[int]],
+                 min_fraction: float = settings.NATLAS_SENTENCE_STOP_MIN_FRACTION):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.max_chars = max_chars
+        self.min_fraction = min_fraction
+        self.reasons: Dict[int, str] = {}   # Batch row -> why it stopped
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self.reasons.get(0)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        done = []
+        for i, row in enumerate(input_ids):
+            if i in self.reasons:
+                done.append(True)
+                continue
+            max_chars = self.max_chars[i] if isinstance(self.max_chars, list) else self.max_chars
+            text = self.tokenizer.decode(row[self.prompt_length:], skip_special_tokens=True).lstrip()
+            if len(text) >= max_chars:
+                self.reasons[i] = "max_chars"
+            elif int(max_chars * self.min_fraction) <= last_sentence_end(text) < len(text):
+                self.reasons[i] = "sentence"
+            done.append(i in self.reasons)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+class ForwardCounter:
+    """Counts forward passes of the target and draft models, per generating thread.
+
+    Assisted generation doesn't report how many draft tokens were accepted,
+    but each N-ATLaS pass yields the accepted tokens plus one of its own,
+    and each draft pass proposes one token; counting passes recovers both.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def hook(self, name: str):
+        def count(module, args, output):
+            setattr(self._local, name, getattr(self._local, name, 0) + 1)
+        return count
+
+    def reset(self):
+        self._local.target = 0
+        self._local.draft = 0
+
+    def read(self) -> Tuple[int, int]:
+        return getattr(self._local, "target", 0), getattr(self._local, "draft", 0)
 
 class NATLaSService:
     """N-ATLaS Language Model Service with compatibility fixes"""
 
-    def __init__(self):
-        self.model = None
-        self.tokenizer = None
+    def __init__(
+        self,
+        model=None,
+        tokenizer=None,
+        model_name: str = settings.NATLAS_MODEL,
+        draft_model=None,
+        draft_model_name: Optional[str] = settings.NATLAS_DRAFT_MODEL or None
+    ):
+        # Pre-built model/tokenizer (e.g. tiny stand-ins in benchmarks) skip loading
+        self.model_name = model_name
+        self.model = model
+        self.tokenizer = tokenizer
+        self.draft_model = draft_model
+        self.draft_model_name = draft_model_name
+        self._forwards = ForwardCounter()
+        self._speculative_lock = threading.Lock()
+        self.speculative_totals = {"generations": 0, "drafted": 0, "accepted": 0, "target_passes": 0, "tokens": 0}
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.supported_languages = {
             'en': 'English',
@@ -22,19 +123,25 @@ class NATLaSService:
             'ig': 'Igbo',
             'pcm': 'Nigerian Pidgin'
         }
+        self.langid = LangIDService()
 
     async def initialize(self):
         """Load N-ATLaS model safely with rope_scaling patch"""
-        print(f"🇳🇬 Loading N-ATLaS: {settings.NATLAS_MODEL}")
-        print(f"🔧 Device: {self.device}")
+        if self.model is not None and self.tokenizer is not None:
+            logger.info("✅ N-ATLaS components provided, skipping load")
+            await self._load_draft()
+            return
+
+        logger.info(f"🇳🇬 Loading N-ATLaS: {self.model_name}")
+        logger.info(f"🔧 Device: {self.device}")
 
         token = settings.HUGGINGFACE_HUB_TOKEN
 
         try:
             # Load tokenizer
-            print("📝 Loading tokenizer...")
+            logger.info("📝 Loading tokenizer...")
             self.tokenizer = AutoTokenizer.from_pretrained(
-                settings.NATLAS_MODEL,
+                self.model_name,
                 trust_remote_code=True,
                 token=token,
                 use_fast=False
@@ -42,20 +149,20 @@ class NATLaSService:
 
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
-            print("✅ Tokenizer loaded")
+            logger.info("✅ Tokenizer loaded")
 
             # Load config and patch rope_scaling
-            print("⚙️ Loading model config...")
+            logger.info("⚙️ Loading model config...")
             config = AutoConfig.from_pretrained(
-                settings.NATLAS_MODEL,
+                self.model_name,
                 trust_remote_code=True,
                 token=token
             )
 
-            print(f"✅ Config loaded: {config.model_type}")
+            logger.info(f"✅ Config loaded: {config.model_type}")
 
             # 4-bit quantization config
-            print("💾 Configuring 4-bit quantization...")
+            logger.info("💾 Configuring 4-bit quantization...")
             quantization_config = BitsAndBytesConfig(
                 load_in_4bit=True,
                 bnb_4bit_compute_dtype=torch.float16,
@@ -64,9 +171,9 @@ class NATLaSService:
             )
 
             # Load model
-            print("🤖 Loading N-ATLaS model...")
+            logger.info("🤖 Loading N-ATLaS model...")
             self.model = AutoModelForCausalLM.from_pretrained(
-                settings.NATLAS_MODEL,
+                self.model_name,
                 config=config,
                 quantization_config=quantization_config,
                 device_map="auto",
@@ -76,21 +183,22 @@ class NATLaSService:
                 torch_dtype=torch.float16
             )
 
-            print("✅ N-ATLaS loaded successfully!")
-            print(f"💾 Approx. memory usage: 4-5GB")
+            logger.info("✅ N-ATLaS loaded successfully!")
+            logger.info(f"💾 Approx. memory usage: 4-5GB")
 
         except Exception as e:
-            print(f"❌ Error: {e}")
-            print(f"🔍 Error type: {type(e).__name__}")
-            print("🔄 Attempting fallback load without quantization...")
+            logger.error(f"❌ Error ({type(e).__name__}): {e}")
+            logger.info("🔄 Attempting fallback load without quantization...")
             await self._load_fallback(token)
 
+        await self._load_draft()
+
     async def _load_fallback(self, token: str):
         """Fallback loading without quantization"""
         try:
-            print("⚠️ Loading without quantization (more memory)...")
+            logger.warning("⚠️ Loading without quantization (more memory)...")
             self.model = AutoModelForCausalLM.from_pretrained(
-                settings.NATLAS_MODEL,
+                self.model_name,
                 device_map="auto",
                 trust_remote_code=True,
                 token=token,
@@ -98,63 +206,403 @@ class NATLaSService:
                 torch_dtype=torch.float16,
                 offload_folder="offload"
             )
-            print("✅ Fallback loading successful")
+            logger.info("✅ Fallback loading successful")
         except Exception as e:
-            print(f"❌ Fallback failed: {e}")
+            logger.error(f"❌ Fallback failed: {e}")
             raise RuntimeError(f"Cannot load N-ATLaS: {e}")
 
-    async def analyze_symptoms(self, symptoms: str, language: str = "en") -> str:
-        """Analyze symptoms"""
+    async def _load_draft(self):
+        """Load the speculative decoding draft model, if one is configured.
+
+        Decoding works without it, so any problem just leaves it disabled.
+        """
+        if self.draft_model is None and self.draft_model_name:
+            try:
+                logger.info(f"📝 Loading draft model: {self.draft_model_name}")
+                self.draft_model = AutoModelForCausalLM.from_pretrained(
+                    self.draft_model_name,
+                    device_map="auto",
+                    token=settings.HUGGINGFACE_HUB_TOKEN,
+                    low_cpu_mem_usage=True,
+                    torch_dtype=torch.float16
+                ).eval()
+            except Exception as e:
+                logger.warning(f"⚠️ Draft model unavailable, speculative decoding disabled: {e}")
+                return
+        if self.draft_model is None:
+            return
+
+        if self.draft_model.config.vocab_size != self.model.config.vocab_size:
+            logger.warning(
+                f"⚠️ Draft vocabulary ({self.draft_model.config.vocab_size}) doesn't match N-ATLaS "
+                f"({self.model.config.vocab_size}), speculative decoding disabled"
+            )
+            self.draft_model = None
+            return
+
+        self.draft_model.generation_config.num_assistant_tokens = settings.NATLAS_DRAFT_NUM_TOKENS
+        self.draft_model.generation_config.num_assistant_tokens_schedule = settings.NATLAS_DRAFT_SCHEDULE
+        self.model.register_forward_hook(self._forwards.hook("target"))
+        self.draft_model.register_forward_hook(self._forwards.hook("draft"))
+        logger.info(f"✅ Speculative decoding on, drafting {settings.NATLAS_DRAFT_NUM_TOKENS} tokens per pass")
+
+    async def analyze_symptoms(
+        self,
+        symptoms: str,
+        language: str = "en",
+        deadline: Optional[Deadline] = None,
+        budget: Optional[GenerationBudget] = None,
+        conditions: Optional[List[str]] = None
+    ) -> str:
+        """Analyze symptoms.
+
+        With a deadline, decoding stops when the budget (less
+        DIAGNOSE_DEADLINE_RESERVE_SECONDS) runs out and the partial text is
+        returned, with 'generation' marked degraded on the deadline.
+        Output is kept within the generation budget's tokens and characters,
+        ending at a sentence boundary where possible. `conditions` (likely
+        matches from the knowledge base) are added to the prompt when given.
+        """
+        if self.model is None or self.tokenizer is None:
+            raise RuntimeError("N-ATLaS not initialized")
+
+        with track_stage("prompt_tokenization"):
+            inputs = self.tokenizer(
+                self._prompt(symptoms, conditions),
+                return_tensors="pt",
+                truncation=True,
+                max_length=settings.NATLAS_MAX_LENGTH,
+                padding=True
+            ).to(self.device)
+        prompt_tokens = inputs["input_ids"].shape[1]
+
+        budget = budget or GenerationBudget.from_request(None)
+        stopping_criteria, deadline_stop, budget_stop = self._stopping_criteria(deadline, budget, prompt_tokens)
+
+        # generate() is long-running CPU/GPU work; run it off the event loop
+        start = time.perf_counter()
+        with track_stage("generation"):
+            outputs = await asyncio.to_thread(
+                self._generate, inputs, stopping_criteria, max_new_tokens=budget.max_new_tokens
+            )
+        elapsed = time.perf_counter() - start
+
+        PROMPT_TOKENS.labels(language=language_label(language)).observe(prompt_tokens)
+        return self._finish(outputs, prompt_tokens, language, elapsed, deadline, deadline_stop, budget, budget_stop)
+
+    async def analyze_symptoms_batch(
+        self,
+        symptoms: List[str],
+        languages: List[str],
+        budgets: List[GenerationBudget]
+    ) -> List[str]:
+        """Analyze several symptom descriptions in one left-padded generate() call.
+
+        Used by the job workers, which have no per-request deadline; each
+        row still stops at its own budget and sentence boundary.
+        """
+        if self.model is None or self.tokenizer is None:
+            raise RuntimeError("N-ATLaS not initialized")
+
+        prompts = [self._prompt(text) for text in symptoms]
+        with track_stage("prompt_tokenization"):
+            padding_side = self.tokenizer.padding_side
+            self.tokenizer.padding_side = "left"
+            try:
+                inputs = self.tokenizer(
+                    prompts,
+                    return_tensors="pt",
+                    truncation=True,
+                    max_length=settings.NATLAS_MAX_LENGTH,
+                    padding=True
+                ).to(self.device)
+            finally:
+                self.tokenizer.padding_side = padding_side
+        prompt_length = inputs["input_ids"].shape[1]
+
+        budget_stop = SentenceBudgetStoppingCriteria(self.tokenizer, prompt_length, [b.max_chars for b in budgets])
+        start = time.perf_counter()
+        with track_stage("generation"):
+            outputs = await asyncio.to_thread(
+                self._generate,
+                inputs,
+                StoppingCriteriaList([budget_stop]),
+                max_new_tokens=max(b.max_new_tokens for b in budgets)
+            )
+        elapsed = time.perf_counter() - start
+
+        analyses = []
+        for i, (language, budget) in enumerate(zip(languages, budgets)):
+            PROMPT_TOKENS.labels(language=language_label(language)).observe(int(inputs["attention_mask"][i].sum()))
+            new_ids = outputs[i, prompt_length:]
+            # Rows that finished early are padded out to the longest one; cut at the first eos/pad
+            ends = ((new_ids == self.tokenizer.eos_token_id) | (new_ids == self.tokenizer.pad_token_id)).nonzero()
+            if len(ends):
+                end = int(ends[0])
+                new_ids = new_ids[:end + int(new_ids[end].item() == self.tokenizer.eos_token_id)]
+            new_ids = new_ids[:budget.max_new_tokens]
+            analyses.append(self._finish_row(
+                new_ids, language, elapsed, None, None, budget, budget_stop.reasons.get(i)
+            ))
+        return analyses
+
+    async def analyze_turn(
+        self,
+        state: ConversationState,
+        sessions: SessionStore,
+        message: str,
+        language: str = "en",
+        deadline: Optional[Deadline] = None,
+        budget: Optional[GenerationBudget] = None
+    ) -> str:
+        """Answer one conversation turn, prefilling only the new message.
+
+        The session's KV cache covers everything said and generated so far,
+        so generate() only has to run the new turn's tokens through the
+        model. A session whose cache was evicted is rebuilt from its saved
+        token ids; one that outgrows SESSION_MAX_CONTEXT_TOKENS restarts
+        from a single prompt holding its latest messages (see _turn_prompt_ids).
+        """
         if self.model is None or self.tokenizer is None:
             raise RuntimeError("N-ATLaS not initialized")
 
-        prompt = f"""As a medical assistant, analyze these symptoms:
+        budget = budget or GenerationBudget.from_request(None)
+        cache = sessions.take_cache(state)
+        with track_stage("prompt_tokenization"):
+            history = state.token_ids
+            if history is not None:
+                segment = self.tokenizer(
+                    f"\n\nPatient adds: {message}\n\nUpdated analysis:",
+                    return_tensors="pt",
+                    add_special_tokens=False
+                )["input_ids"].to(self.device)
+                if history.shape[1] + segment.shape[1] + budget.max_new_tokens > settings.SESSION_MAX_CONTEXT_TOKENS:
+                    state.reset()
+                    history, cache = None, None
+            if history is None:
+                input_ids = self._turn_prompt_ids(list(state.messages)).to(self.device)
+            else:
+                input_ids = torch.cat([history, segment], dim=1)
+
+        cached_tokens = cache.get_seq_length() if cache is not None else 0
+        prefill_tokens = input_ids.shape[1] - cached_tokens
+        SESSION_PREFILL_TOKENS.labels(cache="hit" if cache is not None else "miss").observe(prefill_tokens)
+
+        prompt_length = input_ids.shape[1]
+        stopping_criteria, deadline_stop, budget_stop = self._stopping_criteria(deadline, budget, prompt_length)
+
+        start = time.perf_counter()
+        with track_stage("generation"):
+            outputs = await asyncio.to_thread(
+                self._generate,
+                {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)},
+                stopping_criteria,
+                max_new_tokens=budget.max_new_tokens,
+                past_key_values=cache,
+                return_dict_in_generate=True
+            )
+        elapsed = time.perf_counter() - start
+
+        PROMPT_TOKENS.labels(language=language_label(language)).observe(prefill_tokens)
+        state.token_ids = outputs.sequences
+        sessions.store_cache(state, outputs.past_key_values, kv_cache_nbytes(outputs.past_key_values))
+
+        return self._finish(
+            outputs.sequences, prompt_length, language, elapsed, deadline, deadline_stop, budget, budget_stop
+        )
+
+    def _turn_prompt_ids(self, messages: List[str]) -> torch.Tensor:
+        """Prompt ids for a conversation, dropping its oldest messages until it fits NATLAS_MAX_LENGTH.
+
+        Plain truncation would cut from the right, losing the newest message
+        and the closing instruction the model is answering.
+        """
+        lengths = [len(self.tokenizer(m, add_special_tokens=False)["input_ids"]) for m in messages]
+        head, tail = self._prompt("\0").split("\0")
+        head_ids = self.tokenizer(head)["input_ids"]
+        tail_ids = self.tokenizer(tail, add_special_tokens=False)["input_ids"]
+        room = settings.NATLAS_MAX_LENGTH - len(head_ids) - len(tail_ids)
+        kept = len(messages)
+        while kept > 1 and sum(lengths[-kept:]) + kept > room:
+            kept -= 1
+        if lengths[-1] <= room:
+            return self.tokenizer(self._prompt(" ".join(messages[-kept:])), return_tensors="pt")["input_ids"]
+        # One message longer than the window: keep its start, but never the instruction around it
+        message_ids = self.tokenizer(messages[-1], add_special_tokens=False)["input_ids"][:max(room, 0)]
+        return torch.tensor([head_ids + message_ids + tail_ids])
+
+    @staticmethod
+    def _prompt(symptoms: str, conditions: Optional[List[str]] = None) -> str:
+        if conditions:
+            return f"""As a medical assistant, analyze these symptoms:
 
 Symptoms: {symptoms}
 
+Likely conditions: {', '.join(conditions)}
+
 Provide a brief analysis."""
+        return f"""As a medical assistant, analyze these symptoms:
+
+Symptoms: {symptoms}
+
+Provide a brief analysis."""
+
+    def _stopping_criteria(
+        self,
+        deadline: Optional[Deadline],
+        budget: GenerationBudget,
+        prompt_length: int
+    ) -> Tuple[StoppingCriteriaList, Optional[DeadlineStoppingCriteria], SentenceBudgetStoppingCriteria]:
+        """Criteria for generate(), plus the deadline (if any) and budget stops to check afterwards"""
+        budget_stop = SentenceBudgetStoppingCriteria(self.tokenizer, prompt_length, budget.max_chars)
+        stopping_criteria = StoppingCriteriaList([budget_stop])
+        deadline_stop = None
+        if deadline is not None:
+            deadline_stop = DeadlineStoppingCriteria(
+                time.monotonic() + deadline.remaining(settings.DIAGNOSE_DEADLINE_RESERVE_SECONDS)
+            )
+            stopping_criteria.append(deadline_stop)
+        return stopping_criteria, deadline_stop, budget_stop
+
+    def _finish(
+        self,
+        sequences: torch.Tensor,
+        prompt_length: int,
+        language: str,
+        elapsed: float,
+        deadline: Optional[Deadline],
+        deadline_stop: Optional[DeadlineStoppingCriteria],
+        budget: GenerationBudget,
+        budget_stop: SentenceBudgetStoppingCriteria
+    ) -> str:
+        """Record metrics and why decoding stopped, and return the new text trimmed to the budget"""
+        return self._finish_row(
+            sequences[0, prompt_length:], language, elapsed, deadline, deadline_stop, budget, budget_stop.reason
+        )
 
-        inputs = self.tokenizer(
-            prompt,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512,
-            padding=True
-        ).to(self.device)
+    def _finish_row(
+        self,
+        new_ids: torch.Tensor,
+        language: str,
+        elapsed: float,
+        deadline: Optional[Deadline],
+        deadline_stop: Optional[DeadlineStoppingCriteria],
+        budget: GenerationBudget,
+        budget_reason: Optional[str]
+    ) -> str:
+        new_tokens = new_ids.shape[0]
+        GENERATED_TOKENS.labels(language=language_label(language)).observe(new_tokens)
+        if elapsed > 0:
+            GENERATION_TOKENS_PER_SECOND.labels(language=language_label(language)).observe(new_tokens / elapsed)
 
-        with torch.no_grad():
+        if deadline_stop is not None and deadline_stop.triggered:
+            deadline.mark_degraded("generation")
+            stop_reason = "deadline"
+        elif budget_reason is not None:
+            stop_reason = budget_reason
+        elif new_tokens and new_ids[-1].item() == self.tokenizer.eos_token_id:
+            stop_reason = "eos"
+        else:
+            stop_reason = "max_new_tokens"
+        budget.record(new_tokens, stop_reason)
+
+        text = self.tokenizer.decode(new_ids, skip_special_tokens=True).strip()
+        if stop_reason != "eos":
+            # Drop the unfinished tail after the last complete sentence
+            end = last_sentence_end(text)
+            if end:
+                text = text[:end]
+        return trim_to_budget(text, budget.max_chars)
+
+    def _generate(self, inputs, stopping_criteria: Optional[StoppingCriteriaList] = None, **generate_kwargs):
+        """Blocking model.generate call, speculative when a draft model is loaded.
+
+        Assisted generation only handles one sequence at a time, so batched
+        calls decode normally.
+        """
+        generate_kwargs.setdefault("max_new_tokens", settings.NATLAS_MAX_NEW_TOKENS)
+        speculative = self.draft_model is not None and inputs["input_ids"].shape[0] == 1
+        if speculative:
+            generate_kwargs["assistant_model"] = self.draft_model
+            self._forwards.reset()
+        with torch.no_grad(), profile_ops("generation"):
             outputs = self.model.generate(
                 **inputs,
-                max_new_tokens=256,
-                temperature=0.7,
-                top_p=0.9,
+                **generate_kwargs,
+                stopping_criteria=stopping_criteria,
+                temperature=settings.NATLAS_TEMPERATURE,
+                top_p=settings.NATLAS_TOP_P,
                 do_sample=True,
                 pad_token_id=self.tokenizer.pad_token_id,
                 eos_token_id=self.tokenizer.eos_token_id
             )
+        if speculative:
+            sequences = outputs.sequences if generate_kwargs.get("return_dict_in_generate") else outputs
+            self._record_speculation(sequences.shape[1] - inputs["input_ids"].shape[1])
+        return outputs
+
+    def _record_speculation(self, new_tokens: int):
+        """Acceptance and tokens-per-pass for the generation that just ran on this thread"""
+        target_passes, drafted = self._forwards.read()
+        if not target_passes:
+            return
+        accepted = min(max(new_tokens - target_passes, 0), drafted)
+        SPECULATIVE_DRAFT_TOKENS.labels(result="accepted").inc(accepted)
+        SPECULATIVE_DRAFT_TOKENS.labels(result="rejected").inc(drafted - accepted)
+        if drafted:
+            SPECULATIVE_ACCEPTANCE_RATE.observe(accepted / drafted)
+        SPECULATIVE_TOKENS_PER_STEP.observe(new_tokens / target_passes)
+        with self._speculative_lock:
+            totals = self.speculative_totals
+            totals["generations"] += 1
+            totals["drafted"] += drafted
+            totals["accepted"] += accepted
+            totals["target_passes"] += target_passes
+            totals["tokens"] += new_tokens
 
-        response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        return response.replace(prompt, "").strip()
+    def speculative_info(self) -> Optional[Dict]:
+        if self.draft_model is None:
+            return None
+        with self._speculative_lock:
+            totals = dict(self.speculative_totals)
+        return {
+            "draft_model": self.draft_model_name or type(self.draft_model).__name__,
+            "num_assistant_tokens": settings.NATLAS_DRAFT_NUM_TOKENS,
+            "schedule": settings.NATLAS_DRAFT_SCHEDULE,
+            "generations": totals["generations"],
+            "acceptance_rate": totals["accepted"] / totals["drafted"] if totals["drafted"] else None,
+            "tokens_per_pass": totals["tokens"] / totals["target_passes"] if totals["target_passes"] else None,
+        }
+
+    def detect_language_with_confidence(self, text: str) -> Tuple[str, float]:
+        """Detect language, returning (code, confidence)"""
+        if not settings.ENABLE_AUTO_LANGUAGE_DETECTION:
+            return settings.DEFAULT_LANGUAGE, 1.0
+        lang, confidence = self.langid.identify(text)
+        if confidence < settings.LANGID_MIN_CONFIDENCE:
+            return settings.DEFAULT_LANGUAGE, confidence
+        return lang, confidence
 
     def detect_language(self, text: str) -> str:
         """Detect language"""
-        text_lower = text.lower()
-
-        if any(m in text_lower for m in ['ẹ', 'ọ', 'ṣ', 'bawo']):
-            return 'yo'
-        if any(m in text_lower for m in ['sannu', 'yaya', 'ina']):
-            return 'ha'
-        if any(m in text_lower for m in ['kedu', 'ndewo']):
-            return 'ig'
-        if sum(1 for m in ['wetin', 'dey', 'fit'] if m in text_lower.split()) >= 2:
-            return 'pcm'
-        return 'en'
+        return self.detect_language_with_confidence(text)[0]
+
+    def detect_language_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Detect languages for many texts in one vectorized pass"""
+        if not settings.ENABLE_AUTO_LANGUAGE_DETECTION:
+            return [(settings.DEFAULT_LANGUAGE, 1.0) for _ in texts]
+        return [
+            (lang, confidence) if confidence >= settings.LANGID_MIN_CONFIDENCE
+            else (settings.DEFAULT_LANGUAGE, confidence)
+            for lang, confidence in self.langid.identify_batch(texts)
+        ]
 
     def get_model_info(self) -> Dict:
         """Return model info"""
         return {
-            "model_name": settings.NATLAS_MODEL,
+            "model_name": self.model_name,
             "device": self.device,
             "quantization": "4-bit NF4" if hasattr(self.model, 'quantization_config') else "None",
-            "supported_languages": self.supported_languages
+            "supported_languages": self.supported_languages,
+            "speculative_decoding": self.speculative_info()
         }
@@ -0,0 +1,204 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import ipaddress
+import logging
+import time
+import redis.asyncio as redis
+from fastapi import HTTPException, Request
+from core.config import settings
+from core.metrics import RATE_LIMITED, RATE_LIMITER_BACKEND_ERRORS
+
+logger = logging.getLogger(__name__)
+
+# Atomic token bucket: refill by elapsed time, then try to take `cost` tokens.
+# Uses the Redis server clock so every API pod agrees on "now".
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RateLimiter:
+    """Per-client/device/phone token-bucket rate limiter.
+
+    Buckets live in Redis so limits hold across API pods; if Redis is
+    unreachable the limiter falls back to in-process buckets. A trusted
+    relay's own address ("relay" scope) gets RATE_LIMIT_RELAY_MULTIPLIER
+    times the limit, since it carries many users.
+    """
+
+    KEY_PREFIX = "afiya:ratelimit"
+
+    def __init__(
+        self,
+        rate_per_minute: int = settings.RATE_LIMIT_PER_MINUTE,
+        burst: int = settings.RATE_LIMIT_BURST,
+        relay_multiplier: int = settings.RATE_LIMIT_RELAY_MULTIPLIER,
+        max_local_buckets: int = 100000
+    ):
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.relay_multiplier = relay_multiplier
+        self.max_local_buckets = max_local_buckets
+        self.client: Optional[redis.Redis] = None
+        self._script = None
+        self._local: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def initialize(self):
+        """Connect to Redis; keep going with local buckets if it's unavailable"""
+        try:
+            self.client = redis.from_url(settings.REDIS_URL, socket_timeout=0.2)
+            await self.client.ping()
+            self._script = self.client.register_script(TOKEN_BUCKET_LUA)
+            logger.info("✅ Rate limiter using Redis")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis unavailable for rate limiting ({e}), using in-process buckets")
+            self.client = None
+            self._script = None
+
+    def _acquire_local(self, key: str, cost: float, rate: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, ts = self._local.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        allowed = tokens >= cost
+        retry_after = 0.0 if allowed else (cost - tokens) / rate
+        if allowed:
+            tokens -= cost
+        self._local[key] = (tokens, now)
+        while len(self._local) > self.max_local_buckets:
+            self._local.popitem(last=False)
+        return allowed, retry_after
+
+    async def acquire(
+        self,
+        key: str,
+        cost: float = 1.0,
+        rate_per_minute: Optional[float] = None,
+        burst: Optional[float] = None
+    ) -> Tuple[bool, float]:
+        """Try to take `cost` tokens from `key`'s bucket; returns (allowed, retry_after_seconds)"""
+        rate = (rate_per_minute or self.rate_per_minute) / 60.0
+        burst = float(burst or self.burst)
+        # A request costing more than the bucket holds could never succeed
+        cost = min(cost, burst)
+        if self._script is not None:
+            try:
+                allowed, retry_after = await self._script(
+                    keys=[f"{self.KEY_PREFIX}:{key}"],
+                    args=[rate, burst, cost]
+                )
+                return bool(int(allowed)), float(retry_after)
+            except Exception:
+                RATE_LIMITER_BACKEND_ERRORS.inc()
+        return self._acquire_local(key, cost, rate, burst)
+
+    async def check(
+        self,
+        identities: Dict[str, Optional[str]],
+        cost: float = 1.0,
+        limit: Optional[Tuple[float, float]] = None,
+        namespace: Optional[str] = None
+    ):
+        """Raise 429 if any of the given identities (scope -> id) is over its limit.
+
+        `limit` is (per minute, burst) for a separately metered resource,
+        kept in its own buckets under `namespace`.
+        """
+        rate_per_minute, burst = limit or (self.rate_per_minute, self.burst)
+        for scope, identity in identities.items():
+            if not identity:
+                continue
+            multiplier = self.relay_multiplier if scope == "relay" else 1
+            key = f"{namespace}:{scope}:{identity}" if namespace else f"{scope}:{identity}"
+            allowed, retry_after = await self.acquire(key, cost, rate_per_minute * multiplier, burst * multiplier)
+            if not allowed:
+                RATE_LIMITED.labels(scope=scope).inc()
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"Rate limit exceeded for {scope}",
+                    headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+                )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+
+def _hash_identity(value: str) -> str:
+    """Phone numbers are PII; only a digest is used as a bucket key"""
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+@lru_cache(maxsize=4)
+def _trusted_networks(value: str) -> List:
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(",") if item.strip()]
+
+
+def _is_trusted(address: Optional[str]) -> bool:
+    if not address:
+        return False
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks(settings.RATE_LIMIT_TRUSTED_PROXIES))
+
+
+def _forwarded_client(forwarded: str) -> Optional[str]:
+    """The nearest X-Forwarded-For hop that isn't one of our proxies"""
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        if not _is_trusted(hop):
+            return hop
+    return None
+
+
+def request_identities(req: Request, device_id: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """Rate limit identities for a request; every one of them must be under its limit.
+
+    The client address is always limited. X-Forwarded-For, X-Device-ID and
+    X-Phone-Number are only believed from RATE_LIMIT_TRUSTED_PROXIES, so
+    rotating made-up headers can't escape the address limit. The WhatsApp
+    bot relays every user from one address: its own address is limited as
+    a "relay" (RATE_LIMIT_RELAY_MULTIPLIER times the limit) and each user
+    by the device/phone the bot names. A `device_id` from the request body
+    only ever adds a bucket.
+    """
+    peer = req.client.host if req.client else None
+    if not _is_trusted(peer):
+        return {"client": peer, "device": device_id}
+
+    forwarded = req.headers.get("x-forwarded-for")
+    client = _forwarded_client(forwarded) if forwarded else None
+    phone = req.headers.get("x-phone-number")
+    identities = {"client": client} if client else {"relay": peer}
+    identities["device"] = device_id or req.headers.get("x-device-id")
+    identities["phone"] = _hash_identity(phone) if phone else None
+    return identities
+
+
+async def rate_limit(req: Request):
+    """FastAPI dependency enforcing RATE_LIMIT_PER_MINUTE per client, device and phone"""
+    limiter: Optional[RateLimiter] = getattr(req.app.state, "rate_limiter", None)
+    if limiter is None or not settings.ENABLE_RATE_LIMITING:
+        return
+    await limiter.check(request_identities(req))
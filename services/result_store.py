@@ -0,0 +1,182 @@
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import zlib
+import redis.asyncio as redis
+from core.cache import TTLCache
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def idempotency_key(device_id: str, query: Dict, client_key: Optional[str] = None) -> str:
+    """Store key for one offline query.
+
+    A client-supplied key is scoped to its device, so one device can't
+    read another's results by guessing keys; without one, the device and
+    the query's content are hashed, so an identical re-upload maps to the
+    same key.
+    """
+    if client_key:
+        material = f"key\0{device_id}\0{client_key}"
+    else:
+        content = json.dumps(query, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        material = f"content\0{device_id}\0{content}"
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def _pack(value: Dict) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode(), 6)
+
+
+def _unpack(data: bytes) -> Dict:
+    return json.loads(zlib.decompress(data))
+
+
+class ResultStore:
+    """Computed offline-sync results by idempotency key, kept OFFLINE_SYNC_RESULT_TTL_SECONDS.
+
+    Results are stored as zlib-compressed JSON in Redis so every API pod
+    sees them; if Redis is unreachable they live in an in-process cache.
+    `run_once` makes sure a key is computed by one caller at a time: a
+    retry arriving while the first upload is still running waits for its
+    result instead of diagnosing the same query again.
+    """
+
+    KEY_PREFIX = "afiya:offline:result"
+    CLAIM_PREFIX = "afiya:offline:claim"
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        ttl_seconds: int = settings.OFFLINE_SYNC_RESULT_TTL_SECONDS,
+        claim_seconds: float = settings.OFFLINE_SYNC_CLAIM_SECONDS,
+        max_local_entries: int = 100000
+    ):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.claim_seconds = claim_seconds
+        self._local = TTLCache(ttl_seconds, max_entries=max_local_entries)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def initialize(self):
+        """Connect to Redis; keep going with the in-process cache if it's unavailable"""
+        try:
+            if self.client is None:
+                self.client = redis.from_url(settings.REDIS_URL, socket_timeout=0.5)
+            await self.client.ping()
+            logger.info("✅ Offline sync results stored in Redis")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis unavailable for offline sync results ({e}), using in-process cache")
+            self.client = None
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """Stored results for whichever of `keys` have one"""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        if self.client is not None:
+            try:
+                values = await self.client.mget([f"{self.KEY_PREFIX}:{key}" for key in keys])
+                return {key: _unpack(value) for key, value in zip(keys, values) if value is not None}
+            except Exception:
+                pass
+        found = {}
+        for key in keys:
+            value = self._local.get(key)
+            if value is not None:
+                found[key] = _unpack(value)
+        return found
+
+    async def put(self, key: str, value: Dict, ttl_seconds: Optional[int] = None):
+        """Store `value`; `ttl_seconds` overrides the default expiry, and 0 stores nothing"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+        data = _pack(value)
+        if self.client is not None:
+            try:
+                await self.client.set(f"{self.KEY_PREFIX}:{key}", data, ex=ttl)
+                return
+            except Exception:
+                pass
+        self._local.set(key, data, ttl_seconds=ttl)
+
+    async def _claim(self, key: str) -> bool:
+        """Take the cross-pod claim on `key`; True without Redis (in-flight tracking covers one process)"""
+        if self.client is None:
+            return True
+        try:
+            return bool(await self.client.set(
+                f"{self.CLAIM_PREFIX}:{key}", 1, nx=True, px=int(self.claim_seconds * 1000)
+            ))
+        except Exception:
+            return True
+
+    async def _release(self, key: str):
+        if self.client is not None:
+            try:
+                await self.client.delete(f"{self.CLAIM_PREFIX}:{key}")
+            except Exception:
+                pass
+
+    async def _wait_for_other_pod(self, key: str) -> Optional[Dict]:
+        """Poll for the result of a key claimed elsewhere, until it lands or the claim lapses"""
+        loop = asyncio.get_running_loop()
+        give_up = loop.time() + self.claim_seconds
+        while loop.time() < give_up:
+            await asyncio.sleep(0.25)
+            stored = await self.get_many([key])
+            if key in stored:
+                return stored[key]
+            try:
+                if not await self.client.exists(f"{self.CLAIM_PREFIX}:{key}"):
+                    return None
+            except Exception:
+                return None
+        return None
+
+    async def run_once(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Optional[Dict]]],
+        ttl: Optional[Callable[[Dict], int]] = None
+    ) -> Tuple[Optional[Dict], bool]:
+        """Result for `key`, computing it only if no one else is.
+
+        Returns (result, computed_here). `compute` returns the value to
+        store, or None if the query failed (nothing is stored, so a later
+        retry tries again). `ttl` picks how long a given result is kept,
+        e.g. only briefly for a degraded one; callers already waiting on
+        this computation get the result either way.
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        result, computed = None, False
+        try:
+            claimed = await self._claim(key)
+            if not claimed:
+                result = await self._wait_for_other_pod(key)
+            if result is None:
+                computed = True
+                try:
+                    result = await compute()
+                    if result is not None:
+                        await self.put(key, result, ttl(result) if ttl is not None else None)
+                finally:
+                    if claimed:
+                        await self._release(key)
+            return result, computed
+        finally:
+            future.set_result(result)
+            self._inflight.pop(key, None)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
@@ -0,0 +1,326 @@
+"""Partition upkeep and archival for diagnosis_logs and offline_sync.
+
+On PostgreSQL (after `alembic upgrade head`) both tables are partitioned
+by month. Once a month falls outside the retention window, its partition
+is detached from the parent, written to a zstd-compressed Parquet file
+under ARCHIVE_DIR/<table>/ and dropped. Rows that landed in the DEFAULT
+partition (months with no partition of their own) are moved into their
+month's partition when it is created, or archived and deleted once they
+are past retention. The live tables therefore only ever hold the
+retention window. Elsewhere (SQLite in development and benchmarks) the
+same months are archived row by row and then deleted.
+
+Run daily, e.g. from cron:
+
+    python -m services.retention_service [--dry-run]
+"""
+import argparse
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+from core.config import settings
+from core.database import engine
+from db.models import DiagnosisLog, OfflineSync
+
+# table -> (model, partition column)
+PARTITIONED_TABLES = {
+    "diagnosis_logs": (DiagnosisLog, "created_at"),
+    "offline_sync": (OfflineSync, "synced_at"),
+}
+
+_PARTITION_NAME = re.compile(r"^(?P<table>[a-z_]+)_p(?P<year>\d{4})_(?P<month>\d{2})$")
+
+
+def _retention_months(table: str) -> int:
+    if table == "offline_sync":
+        return settings.OFFLINE_SYNC_RETENTION_MONTHS
+    return settings.DIAGNOSIS_LOG_RETENTION_MONTHS
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(table: str, month: datetime) -> str:
+    return f"{table}_p{month:%Y_%m}"
+
+
+def is_partitioned(connection: Connection, table: str) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    return connection.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'p')"),
+        {"name": table}
+    ).scalar() == "p"
+
+
+def default_partition(table: str) -> str:
+    return f"{table}_default"
+
+
+def _create_partition(connection: Connection, table: str, month: datetime):
+    """Create `month`'s partition, first moving any of its rows out of the DEFAULT partition.
+
+    PostgreSQL refuses a new partition while DEFAULT holds rows in its
+    range, so DEFAULT is detached, the partition created, the rows moved
+    across and DEFAULT re-attached, all in the caller's transaction. The
+    detach locks the parent, so writes wait rather than fail meanwhile.
+    """
+    model, column_name = PARTITIONED_TABLES[table]
+    name = partition_name(table, month)
+    following = add_months(month, 1)
+    bounds = f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{following:%Y-%m-%d}')"
+    default = default_partition(table)
+    in_month = f"{column_name} >= :start AND {column_name} < :end"
+    window = {"start": month, "end": following}
+
+    has_default = connection.execute(sa.text("SELECT to_regclass(:name)"), {"name": default}).scalar()
+    if not has_default or not connection.execute(
+        sa.text(f"SELECT 1 FROM {default} WHERE {in_month} LIMIT 1"), window
+    ).scalar():
+        connection.execute(sa.text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+        return
+
+    columns = ", ".join(c.name for c in model.__table__.columns)
+    connection.execute(sa.text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    connection.execute(sa.text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+    connection.execute(sa.text(
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default} WHERE {in_month}"
+    ), window)
+    connection.execute(sa.text(f"DELETE FROM {default} WHERE {in_month}"), window)
+    connection.execute(sa.text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+
+def ensure_partitions(months_ahead: int = settings.PARTITION_PREMAKE_MONTHS) -> List[str]:
+    """Create this month's partition and the next `months_ahead`, where missing.
+
+    Each partition is created in its own transaction, so one failure
+    doesn't hold back the others; failures are raised together at the end.
+    """
+    created, failed = [], []
+    current = month_start(datetime.utcnow())
+    for table in PARTITIONED_TABLES:
+        with engine.connect() as connection:
+            if not is_partitioned(connection, table):
+                continue
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            name = partition_name(table, month)
+            try:
+                with engine.begin() as connection:
+                    if connection.execute(sa.text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+                        continue
+                    _create_partition(connection, table, month)
+                created.append(name)
+            except Exception as e:
+                failed.append(f"{name} ({e})")
+    if failed:
+        raise RuntimeError(f"Could not create partitions {', '.join(failed)}; created {created or 'none'}")
+    return created
+
+
+def _arrow_schema(model):
+    import pyarrow as pa
+
+    fields = []
+    for column in model.__table__.columns:
+        if isinstance(column.type, sa.DateTime):
+            arrow_type = pa.timestamp("us")
+        elif isinstance(column.type, sa.Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, sa.Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, sa.Float):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()     # Text, String and JSON (serialized)
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def export_parquet(connection: Connection, model, query, path: Path) -> int:
+    """Stream the rows of `query` into a zstd-compressed Parquet file, one chunk at a time"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(model)
+    json_columns = {c.name for c in model.__table__.columns if isinstance(c.type, sa.JSON)}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".parquet.partial")
+    rows = 0
+    result = connection.execution_options(stream_results=True, yield_per=settings.ARCHIVE_CHUNK_ROWS).execute(query)
+    with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+        for chunk in result.mappings().partitions():
+            columns = {
+                name: [
+                    json.dumps(row[name], ensure_ascii=False) if name in json_columns and row[name] is not None
+                    else row[name]
+                    for row in chunk
+                ]
+                for name in schema.names
+            }
+            writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+            rows += len(chunk)
+    partial.replace(path)
+    return rows
+
+
+def _archive_path(table: str, name: str) -> Path:
+    path = Path(settings.ARCHIVE_DIR) / table / f"{name}.parquet"
+    if path.exists():
+        # Late rows for an already archived month get their own file
+        path = path.with_name(f"{name}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.parquet")
+    return path
+
+
+def _old_partitions(connection: Connection, table: str, cutoff: datetime) -> List[str]:
+    """Monthly partitions of `table` (attached, or detached by an interrupted run) that end by `cutoff`"""
+    names = connection.execute(
+        sa.text("SELECT table_name FROM information_schema.tables WHERE table_name LIKE :pattern"),
+        {"pattern": f"{table}\\_p%"}
+    ).scalars()
+    old = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match and match["table"] == table:
+            month = datetime(int(match["year"]), int(match["month"]), 1)
+            if add_months(month, 1) <= cutoff:
+                old.append(name)
+    return sorted(old)
+
+
+def _archive_partitions(table: str, model, cutoff: datetime, dry_run: bool) -> List[Dict]:
+    archived = []
+    with engine.connect() as connection:
+        names = _old_partitions(connection, table, cutoff)
+    for name in names:
+        if dry_run:
+            archived.append({"table": table, "partition": name, "rows": None, "path": None})
+            continue
+        with engine.begin() as connection:
+            attached = connection.execute(
+                sa.text("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name)"), {"name": name}
+            ).scalar()
+            if attached:
+                connection.execute(sa.text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        path = _archive_path(table, name)
+        with engine.connect() as connection:
+            rows = export_parquet(connection, model, sa.select(sa.table(name, *[
+                sa.column(c.name) for c in model.__table__.columns
+            ])), path)
+        with engine.begin() as connection:
+            connection.execute(sa.text(f"DROP TABLE {name}"))
+        archived.append({"table": table, "partition": name, "rows": rows, "path": str(path)})
+        print(f"📦 Archived {name}: {rows} rows -> {path}")
+    return archived
+
+
+def _archive_default(table: str, model, column_name: str, cutoff: datetime, dry_run: bool) -> List[Dict]:
+    """Archive and delete DEFAULT partition rows from before `cutoff` (months that never had a partition)"""
+    default = default_partition(table)
+    rows_table = sa.table(default, *[sa.column(c.name) for c in model.__table__.columns])
+    expired = rows_table.c[column_name] < cutoff
+    with engine.connect() as connection:
+        if not connection.execute(sa.text("SELECT to_regclass(:name)"), {"name": default}).scalar():
+            return []
+        if connection.execute(sa.select(sa.literal(1)).select_from(rows_table).where(expired).limit(1)).scalar() is None:
+            return []
+    if dry_run:
+        return [{"table": table, "partition": default, "rows": None, "path": None}]
+
+    path = _archive_path(table, default)
+    with engine.begin() as connection:
+        # Hold off inserts into DEFAULT so nothing lands between the export and the delete
+        connection.execute(sa.text(f"LOCK TABLE {default} IN SHARE MODE"))
+        rows = export_parquet(connection, model, sa.select(rows_table).where(expired), path)
+        connection.execute(sa.delete(rows_table).where(expired))
+    print(f"📦 Archived {default} before {cutoff:%Y-%m}: {rows} rows -> {path}")
+    return [{"table": table, "partition": default, "rows": rows, "path": str(path)}]
+
+
+def _archive_rows(table: str, model, column_name: str, cutoff: datetime, dry_run: bool) -> List[Dict]:
+    column = model.__table__.c[column_name]
+    with engine.connect() as connection:
+        oldest = connection.execute(sa.select(sa.func.min(column))).scalar()
+    if oldest is None:
+        return []
+
+    archived = []
+    month = month_start(oldest)
+    while month < cutoff:
+        following = add_months(month, 1)
+        in_month = sa.and_(column >= month, column < following)
+        name = partition_name(table, month)
+        if dry_run:
+            archived.append({"table": table, "partition": name, "rows": None, "path": None})
+        else:
+            path = _archive_path(table, name)
+            with engine.begin() as connection:
+                rows = export_parquet(connection, model, sa.select(model.__table__).where(in_month), path)
+                if rows:
+                    connection.execute(sa.delete(model.__table__).where(in_month))
+            if rows:
+                archived.append({"table": table, "partition": name, "rows": rows, "path": str(path)})
+                print(f"📦 Archived {table} {month:%Y-%m}: {rows} rows -> {path}")
+            else:
+                path.unlink(missing_ok=True)
+        month = following
+    return archived
+
+
+def run_retention(dry_run: bool = False, now: Optional[datetime] = None) -> List[Dict]:
+    """Create upcoming partitions, then archive every month older than the retention window.
+
+    A partition that can't be created doesn't stop archiving; the error is
+    raised once archiving is done.
+    """
+    partition_error = None
+    if not dry_run:
+        try:
+            for name in ensure_partitions():
+                print(f"🗂️ Created partition {name}")
+        except Exception as e:
+            print(f"⚠️ {e}")
+            partition_error = e
+
+    archived = []
+    current = month_start(now or datetime.utcnow())
+    for table, (model, column_name) in PARTITIONED_TABLES.items():
+        cutoff = add_months(current, -_retention_months(table))
+        with engine.connect() as connection:
+            partitioned = is_partitioned(connection, table)
+        if partitioned:
+            archived += _archive_partitions(table, model, cutoff, dry_run)
+            archived += _archive_default(table, model, column_name, cutoff, dry_run)
+        else:
+            archived += _archive_rows(table, model, column_name, cutoff, dry_run)
+    if partition_error is not None:
+        raise partition_error
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive diagnosis_logs/offline_sync months past retention")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be archived and change nothing")
+    args = parser.parse_args()
+
+    archived = run_retention(dry_run=args.dry_run)
+    if args.dry_run:
+        for entry in archived:
+            print(f"Would archive {entry['partition']}")
+    print(f"✅ Retention done: {len(archived)} partition(s) {'eligible' if args.dry_run else 'archived'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,250 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Iterable
+from pathlib import Path
+import json
 import re
+import threading
+import unicodedata
+
+# Per-language red flag phrases (yo, ha, ig, pcm), merged on top of RED_FLAGS
+DEFAULT_PATTERNS_PATH = Path(__file__).resolve().parent.parent / "data" / "red_flags.json"
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip diacritics so 'Ẹ̀jẹ̀' and 'eje' match the same phrase"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    text = text.replace("\u2019", "'")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _trie_regex(phrases: Iterable[str]) -> str:
+    """Build a prefix-trie regex so matching cost grows with phrase length, not phrase count"""
+    trie: Dict = {}
+    for phrase in phrases:
+        if not phrase:
+            continue
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict) -> str:
+        terminal = "" in node
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+
+    return emit(trie)
+
+
+# Endings a phrase may take and still match; the phrase must then end the word
+_INFLECTION = r"(?:s|es|ness|ed)?\b"
+
+
+class _CompiledRules:
+    """Red flag rules for one language set, compiled into two combined regexes"""
+
+    def __init__(self, phrases_by_category: Dict[str, List[str]]):
+        self.categories = [c for c, phrases in phrases_by_category.items() if phrases]
+        self.group_names = {f"c{i}": c for i, c in enumerate(self.categories)}
+        tries = [_trie_regex(phrases_by_category[c]) for c in self.categories]
+
+        # Single pass "is anything here at all?" check over one trie of every phrase -
+        # the common case is no red flags, and this is all such messages pay for.
+        # Phrases match whole words, plus a closed set of inflections
+        # ("unconsciousness", "concussions"); anything longer is another word.
+        all_phrases = {p for c in self.categories for p in phrases_by_category[c]}
+        self.prefilter = re.compile(
+            r"\b(?:" + _trie_regex(all_phrases) + r")" + _INFLECTION
+        ) if tries else None
+
+        # One anchored match; each optional lookahead scans for its own category
+        # independently, so overlapping phrases from different categories are all reported
+        self.classifier = re.compile(
+            "".join(
+                rf"(?=.*?\b(?P<c{i}>{trie}){_INFLECTION})?" for i, trie in enumerate(tries)
+            ),
+            re.DOTALL,
+        ) if tries else None
+
+    def match(self, folded_text: str) -> List[str]:
+        if self.prefilter is None or self.prefilter.search(folded_text) is None:
+            return []
+        groups = self.classifier.match(folded_text).groupdict()
+        return [self.group_names[g] for g, value in groups.items() if value is not None]
+
 
 class SafetyService:
     """Medical safety and red flag detection service"""
     
-    # Critical red flags that require immediate medical attention
+    # Critical red flags that require immediate medical attention.
+    # Patterns are literal phrases; they are matched case- and diacritic-insensitively
+    # as whole words, optionally ending in -s, -es, -ness or -ed.
     RED_FLAGS = {
         "chest_pain": {
             "patterns": [
-                r"chest pain",
-                r"heart pain",
-                r"tightness in chest",
-                r"crushing sensation",
-                r"pressure in chest"
+                "chest pain",
+                "heart pain",
+                "tightness in chest",
+                "crushing sensation",
+                "pressure in chest"
             ],
             "severity": "EMERGENCY",
             "message": "Chest pain may indicate a heart attack. Call emergency services immediately."
         },
         "breathing": {
             "patterns": [
-                r"can't breathe",
-                r"difficulty breathing",
-                r"shortness of breath",
-                r"gasping for air",
-                r"unable to breathe"
+                "can't breathe",
+                "difficulty breathing",
+                "shortness of breath",
+                "gasping for air",
+                "unable to breathe"
             ],
             "severity": "EMERGENCY",
             "message": "Severe breathing difficulty requires immediate medical attention."
         },
         "consciousness": {
             "patterns": [
-                r"unconscious",
-                r"passed out",
-                r"losing consciousness",
-                r"fainting repeatedly",
-                r"blacking out"
+                "unconscious",
+                "passed out",
+                "losing consciousness",
+                "fainting repeatedly",
+                "blacking out"
             ],
             "severity": "EMERGENCY",
             "message": "Loss of consciousness is a medical emergency. Call 911/emergency services."
         },
         "severe_bleeding": {
             "patterns": [
-                r"heavy bleeding",
-                r"won't stop bleeding",
-                r"bleeding profusely",
-                r"blood won't clot"
+                "heavy bleeding",
+                "won't stop bleeding",
+                "bleeding profusely",
+                "blood won't clot"
             ],
             "severity": "EMERGENCY",
             "message": "Uncontrolled bleeding requires immediate medical attention."
         },
         "stroke": {
             "patterns": [
-                r"face drooping",
-                r"arm weakness",
-                r"speech difficulty",
-                r"sudden confusion",
-                r"vision loss sudden"
+                "face drooping",
+                "arm weakness",
+                "speech difficulty",
+                "sudden confusion",
+                "vision loss sudden"
             ],
             "severity": "EMERGENCY",
             "message": "These symptoms may indicate a stroke. Call emergency services immediately. Remember FAST: Face drooping, Arm weakness, Speech difficulty, Time to call 911."
         },
         "mental_health_crisis": {
             "patterns": [
-                r"want to die",
-                r"kill myself",
-                r"end my life",
-                r"suicide",
-                r"not worth living"
+                "want to die",
+                "kill myself",
+                "end my life",
+                "suicide",
+                "not worth living"
             ],
             "severity": "CRISIS",
             "message": "Please contact a crisis helpline immediately. National Suicide Prevention Lifeline: 988. You're not alone, and help is available."
         },
         "severe_abdominal_pain": {
             "patterns": [
-                r"severe abdominal pain",
-                r"intense stomach pain",
-                r"sharp belly pain",
-                r"vomiting blood"
+                "severe abdominal pain",
+                "intense stomach pain",
+                "sharp belly pain",
+                "vomiting blood"
             ],
             "severity": "URGENT",
             "message": "Severe abdominal pain may indicate a serious condition. Seek medical attention promptly."
         },
         "head_injury": {
             "patterns": [
-                r"head injury",
-                r"hit my head hard",
-                r"concussion",
-                r"severe headache after trauma"
+                "head injury",
+                "hit my head hard",
+                "concussion",
+                "severe headache after trauma"
             ],
             "severity": "URGENT",
             "message": "Head injuries should be evaluated by a medical professional."
         }
     }
     
+    _compiled: Dict[str, _CompiledRules] = {}
+    _language_patterns: Dict[str, Dict[str, Dict[str, List[str]]]] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, patterns_path: Optional[Path] = None):
+        self.patterns_path = str(patterns_path or DEFAULT_PATTERNS_PATH)
+
+    @classmethod
+    def _load_language_patterns(cls, path: str) -> Dict[str, Dict[str, List[str]]]:
+        """Load per-language phrases from a JSON file: {lang: {category: [phrases]}}"""
+        if path not in cls._language_patterns:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = {}
+            for lang, categories in data.items():
+                unknown = set(categories) - set(cls.RED_FLAGS)
+                if unknown:
+                    raise ValueError(f"Unknown red flag categories for '{lang}': {sorted(unknown)}")
+            cls._language_patterns[path] = data
+        return cls._language_patterns[path]
+
+    def _rules(self) -> _CompiledRules:
+        """Compiled rules for English plus every loaded language"""
+        key = self.patterns_path
+        rules = self._compiled.get(key)
+        if rules is not None:
+            return rules
+
+        with self._lock:
+            if key not in self._compiled:
+                extra = self._load_language_patterns(self.patterns_path)
+                phrases = {}
+                for category, flag_data in self.RED_FLAGS.items():
+                    merged = list(flag_data["patterns"])
+                    for lang_patterns in extra.values():
+                        merged.extend(lang_patterns.get(category, []))
+                    phrases[category] = sorted({_fold(p) for p in merged})
+                self._compiled[key] = _CompiledRules(phrases)
+        return self._compiled[key]
+
+    def available_languages(self) -> List[str]:
+        """Languages with dedicated red flag phrases (English is always included)"""
+        return ["en"] + sorted(self._load_language_patterns(self.patterns_path))
+
+    def _flag(self, category: str) -> Dict:
+        flag_data = self.RED_FLAGS[category]
+        return {
+            "category": category,
+            "severity": flag_data["severity"],
+            "message": f"⚠️ {flag_data['severity']}: {flag_data['message']}"
+        }
+
     def detect_red_flags(self, symptoms_text: str) -> List[Dict]:
-        """Detect emergency red flags in symptom text"""
-        detected_flags = []
-        symptoms_lower = symptoms_text.lower()
-        
-        for flag_category, flag_data in self.RED_FLAGS.items():
-            for pattern in flag_data["patterns"]:
-                if re.search(pattern, symptoms_lower):
-                    detected_flags.append({
-                        "category": flag_category,
-                        "severity": flag_data["severity"],
-                        "message": f"⚠️ {flag_data['severity']}: {flag_data['message']}"
-                    })
-                    break  # Only add once per category
-        
-        return detected_flags
+        """Detect emergency red flags in symptom text.
+
+        Phrases for every loaded language are always checked, whatever
+        language the text was detected or claimed to be in: a wrong guess
+        must never hide an emergency.
+        """
+        categories = self._rules().match(_fold(symptoms_text))
+        return [self._flag(c) for c in categories]
+
+    def detect_red_flags_batch(self, texts: List[str]) -> List[List[Dict]]:
+        """Detect red flags for many texts against the all-languages rule set"""
+        rules = self._rules()
+        return [[self._flag(c) for c in rules.match(_fold(text))] for text in texts]
     
-    def get_disclaimer(self) -> str:
-        """Get medical disclaimer"""
+    def get_disclaimer(self, language: str = "en") -> str:
+        """Get medical disclaimer (English only for now)"""
         return (
             "⚕️ IMPORTANT MEDICAL DISCLAIMER: This AI-powered tool is for "
             "informational and educational purposes only. It does NOT provide "
@@ -0,0 +1,151 @@
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Tuple
+import asyncio
+import time
+from core.cache import TTLCache
+from core.config import settings
+from core.metrics import SESSION_ACTIVE, SESSION_KV_CACHE_BYTES, SESSION_EVICTIONS
+
+
+def kv_cache_nbytes(cache) -> int:
+    """Bytes held by a transformers KV cache (DynamicCache or legacy tuples)"""
+    if cache is None:
+        return 0
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        return sum(
+            t.numel() * t.element_size()
+            for layer in layers
+            for t in (getattr(layer, "keys", None), getattr(layer, "values", None))
+            if t is not None
+        )
+    return sum(t.numel() * t.element_size() for layer in cache for t in layer)
+
+
+class ConversationState:
+    """One conversation: its messages, the token history and, while hot, the KV cache for it"""
+
+    def __init__(self, session_id: str, language: str):
+        self.session_id = session_id
+        self.language = language
+        self.messages: Deque[str] = deque(maxlen=settings.SESSION_MAX_MESSAGES)
+        self.token_ids = None       # Prompt + generated tokens so far, shape (1, n)
+        self.kv_cache = None        # KV state for token_ids[:, :-1]; dropped on eviction
+        self.kv_bytes = 0
+        self.turns = 0
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()  # One turn at a time per conversation
+
+    @property
+    def symptoms(self) -> str:
+        """What the user has described in the last SESSION_MAX_MESSAGES messages"""
+        return " ".join(self.messages)
+
+    @property
+    def recent_symptoms(self) -> str:
+        """The latest SESSION_RETRIEVAL_MESSAGES messages, so new symptoms stay within the embedder's window"""
+        return " ".join(list(self.messages)[-settings.SESSION_RETRIEVAL_MESSAGES:])
+
+    def drop_cache(self):
+        self.kv_cache = None
+        self.kv_bytes = 0
+
+    def reset(self):
+        """Forget the token history, e.g. when it outgrows the context window"""
+        self.drop_cache()
+        self.token_ids = None
+
+
+class SessionStore:
+    """Conversation state for /diagnose/conversation.
+
+    Two tiers: every live conversation keeps its messages and token ids
+    (small) for SESSION_TTL_SECONDS since its last turn, while KV caches
+    (large) are kept only for recently active sessions. KV caches are held
+    in LRU order under a byte budget and dropped after
+    SESSION_KV_IDLE_SECONDS idle; an evicted session is rebuilt on its next
+    turn by prefilling its saved token ids once.
+
+    State is per process; run conversations against a single worker or
+    route by session id.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.SESSION_TTL_SECONDS,
+        idle_seconds: float = settings.SESSION_KV_IDLE_SECONDS,
+        max_sessions: int = settings.SESSION_MAX_ACTIVE,
+        max_cache_bytes: int = settings.SESSION_KV_CACHE_MAX_BYTES
+    ):
+        self.idle_seconds = idle_seconds
+        self.max_cache_bytes = max_cache_bytes
+        self._sessions = TTLCache(ttl_seconds, max_sessions)
+        self._hot: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self.cache_bytes = 0
+
+    def get_or_create(self, session_id: str, language: str) -> Tuple[ConversationState, bool]:
+        """Return (state, created); unknown or expired ids start a new conversation"""
+        self.evict_idle()
+        state = self._sessions.get(session_id)
+        created = state is None
+        if created:
+            state = ConversationState(session_id, language)
+        self._sessions.set(session_id, state)
+        state.last_used = time.monotonic()
+        self._update_gauges()
+        return state, created
+
+    def store_cache(self, state: ConversationState, cache, nbytes: int):
+        """Keep a session's new KV cache, evicting least recently used ones over budget"""
+        self._release(state)
+        state.kv_cache = cache
+        state.kv_bytes = nbytes
+        state.last_used = time.monotonic()
+        if nbytes > self.max_cache_bytes:
+            SESSION_EVICTIONS.labels(reason="too_large").inc()
+            state.drop_cache()
+        else:
+            self._hot[state.session_id] = state
+            self.cache_bytes += nbytes
+            while self.cache_bytes > self.max_cache_bytes:
+                _, oldest = self._hot.popitem(last=False)
+                self.cache_bytes -= oldest.kv_bytes
+                oldest.drop_cache()
+                SESSION_EVICTIONS.labels(reason="memory").inc()
+        self._update_gauges()
+
+    def take_cache(self, state: ConversationState):
+        """Detach a session's KV cache for a turn; generation extends it in place"""
+        cache = state.kv_cache
+        self._release(state)
+        return cache
+
+    def evict_idle(self):
+        """Drop KV caches of sessions idle past idle_seconds (oldest first, so this stops early)"""
+        cutoff = time.monotonic() - self.idle_seconds
+        while self._hot:
+            session_id, state = next(iter(self._hot.items()))
+            if state.last_used > cutoff:
+                break
+            self._release(state)
+            SESSION_EVICTIONS.labels(reason="idle").inc()
+
+    def end(self, session_id: str) -> bool:
+        """Forget a conversation; returns whether it existed"""
+        state = self._sessions.get(session_id)
+        if state is None:
+            return False
+        self._release(state)
+        self._sessions.delete(session_id)
+        self._update_gauges()
+        return True
+
+    def _release(self, state: ConversationState):
+        if self._hot.pop(state.session_id, None) is not None:
+            self.cache_bytes -= state.kv_bytes
+        state.drop_cache()
+
+    def _update_gauges(self):
+        SESSION_ACTIVE.labels(state="all").set(len(self._sessions))
+        SESSION_ACTIVE.labels(state="kv_cached").set(len(self._hot))
+        SESSION_KV_CACHE_BYTES.set(self.cache_bytes)
@@ -1,24 +1,32 @@
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue, QueryRequest
+)
 from typing import List, Dict, Optional
 from core.config import settings
+from core.metrics import BATCH_SIZE, track_stage
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 class VectorService:
     """Vector database service using Qdrant"""
     
-    def __init__(self):
-        self.client = None
+    def __init__(self, client: Optional[QdrantClient] = None):
+        # Pass e.g. QdrantClient(location=":memory:") to run without a server
+        self.client = client
         
     async def initialize(self):
         """Initialize Qdrant client and create collection"""
-        print(f"🔗 Connecting to Qdrant at {settings.QDRANT_URL}:{settings.QDRANT_PORT}")
-        
-        self.client = QdrantClient(
-            url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY,
-            timeout=30
-        )
+        if self.client is None:
+            logger.info(f"🔗 Connecting to Qdrant at {settings.QDRANT_URL}:{settings.QDRANT_PORT}")
+            
+            self.client = QdrantClient(
+                url=settings.QDRANT_URL,
+                api_key=settings.QDRANT_API_KEY,
+                timeout=30
+            )
         
         # Create collection if it doesn't exist
         try:
@@ -33,12 +41,12 @@ class VectorService:
                         distance=Distance.COSINE
                     )
                 )
-                print(f"✅ Created Qdrant collection: {settings.QDRANT_COLLECTION}")
+                logger.info(f"✅ Created Qdrant collection: {settings.QDRANT_COLLECTION}")
             else:
-                print(f"✅ Qdrant collection exists: {settings.QDRANT_COLLECTION}")
+                logger.info(f"✅ Qdrant collection exists: {settings.QDRANT_COLLECTION}")
                 
         except Exception as e:
-            print(f"❌ Error initializing Qdrant: {e}")
+            logger.error(f"❌ Error initializing Qdrant: {e}")
             raise
     
     async def insert(
@@ -67,9 +75,10 @@ class VectorService:
         self, 
         query_embedding: List[float], 
         top_k: int = 5,
-        filters: Optional[Dict] = None
+        filters: Optional[Dict] = None,
+        timeout: Optional[float] = None
     ) -> List[Dict]:
-        """Search for similar vectors"""
+        """Search for similar vectors; `timeout` (seconds) caps the Qdrant call"""
         
         # Build filter if provided
         search_filter = None
@@ -84,12 +93,14 @@ class VectorService:
                 )
             search_filter = Filter(must=conditions)
         
-        results = self.client.search(
-            collection_name=settings.QDRANT_COLLECTION,
-            query_vector=query_embedding,
-            limit=top_k,
-            query_filter=search_filter
-        )
+        with track_stage("vector_search"):
+            results = self.client.query_points(
+                collection_name=settings.QDRANT_COLLECTION,
+                query=query_embedding,
+                limit=top_k,
+                query_filter=search_filter,
+                timeout=max(1, int(timeout)) if timeout is not None else None
+            ).points
         
         return [
             {
@@ -100,6 +111,36 @@ class VectorService:
             for result in results
         ]
     
+    async def search_batch(
+        self,
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        timeout: Optional[float] = None
+    ) -> List[List[Dict]]:
+        """Search for several query vectors in one Qdrant round trip"""
+        BATCH_SIZE.labels(operation="vector_search").observe(len(query_embeddings))
+        with track_stage("vector_search"):
+            responses = self.client.query_batch_points(
+                collection_name=settings.QDRANT_COLLECTION,
+                requests=[
+                    QueryRequest(query=list(map(float, embedding)), limit=top_k, with_payload=True)
+                    for embedding in query_embeddings
+                ],
+                timeout=max(1, int(timeout)) if timeout is not None else None
+            )
+        
+        return [
+            [
+                {
+                    "id": result.id,
+                    "score": result.score,
+                    "payload": result.payload
+                }
+                for result in response.points
+            ]
+            for response in responses
+        ]
+    
     async def delete_by_id(self, point_id: str):
         """Delete a point by ID"""
         self.client.delete(
@@ -120,4 +161,4 @@ class VectorService:
         """Close the client connection"""
         if self.client:
             self.client.close()
-            print("✅ Qdrant connection closed")
\ No newline at end of file
+            logger.info("✅ Qdrant connection closed")
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""Diagnosis job worker.
+
+Consumes /diagnose/jobs from the Redis stream in batches and runs them
+through the same pipeline as /diagnose, with one batched N-ATLaS
+generation per batch. Workers scale independently of the API; start as
+many as the hardware allows:
+
+    python worker.py [--consumer NAME]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core.budget import GenerationBudget
+from core.config import settings
+from core.database import SessionLocal, run_migrations
+from core.log import configure_logging, shutdown_logging
+from core.metrics import BATCH_SIZE, PipelineTimer, track_stage
+from db.models import DiagnosisLog
+from db.schemas import DiagnosisRequest, DiagnosisResponse
+from routers.diagnose import _format_conditions
+from routers.jobs import _to_response
+from services.admission_service import AdmissionController
+from services.analytics_service import install_rollups
+from services.cascade_service import Route, ROUTE_NATLAS, ROUTE_SMALL
+from services.job_queue import Job, JobQueue, send_callback
+from services.ml_service import MLService
+from services.vector_service import VectorService
+from services.safety_service import SafetyService
+
+logger = logging.getLogger(__name__)
+
+
+class DiagnosisWorker:
+    """Pulls job batches off the queue and writes results back"""
+
+    def __init__(
+        self,
+        ml_service: MLService,
+        vector_service: VectorService,
+        safety_service: SafetyService,
+        queue: JobQueue,
+        consumer: str,
+        small_admission: Optional[AdmissionController] = None
+    ):
+        self.ml_service = ml_service
+        self.vector_service = vector_service
+        self.safety_service = safety_service
+        self.queue = queue
+        self.consumer = consumer
+        # Jobs have no latency target, so only the small model's concurrency limit applies
+        self.small_admission = small_admission or AdmissionController.for_small_model(
+            max_queue_depth=settings.JOB_BATCH_SIZE,
+            max_wait_seconds=settings.JOB_VISIBILITY_TIMEOUT_SECONDS
+        )
+        self._callbacks = set()
+
+    async def run(self, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                jobs = await self.queue.claim(self.consumer)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read jobs: {e}")
+                await asyncio.sleep(1)
+                continue
+            if jobs:
+                async with self.queue.hold(self.consumer, jobs):
+                    await self.process(jobs)
+        if self._callbacks:
+            await asyncio.gather(*self._callbacks, return_exceptions=True)
+
+    async def process(self, jobs: List[Job]):
+        """Run a batch; if it fails, retry its jobs one by one so one bad job can't sink the rest"""
+        try:
+            with PipelineTimer("diagnose_job"):
+                results = await self._diagnose(jobs)
+        except Exception as e:
+            if len(jobs) > 1:
+                logger.warning(f"⚠️ Batch of {len(jobs)} failed ({e}), retrying jobs individually")
+                for job in jobs:
+                    await self.process([job])
+                return
+            logger.error(
+                f"❌ Job {jobs[0].job_id} failed (attempt {jobs[0].attempts}): {e}",
+                extra={"job_id": jobs[0].job_id}, exc_info=True
+            )
+            await self.queue.fail(jobs[0], str(e))
+            return
+
+        for job, result in zip(jobs, results):
+            await self.queue.complete(job, result)
+            if job.callback_url:
+                payload = _to_response(await self.queue.get(job.job_id)).model_dump(mode="json")
+                task = asyncio.create_task(send_callback(job.callback_url, payload))
+                self._callbacks.add(task)
+                task.add_done_callback(self._callbacks.discard)
+
+    async def _diagnose(self, jobs: List[Job]) -> List[Dict]:
+        start_time = time.time()
+        BATCH_SIZE.labels(operation="diagnose_job").observe(len(jobs))
+        requests = [DiagnosisRequest(**{k: v for k, v in job.request.items() if k != "channel"}) for job in jobs]
+        texts = [r.symptoms for r in requests]
+
+        with track_stage("language_detection"):
+            detected = self.ml_service.detect_language_batch(texts)
+        languages = [r.language or lang for r, (lang, _) in zip(requests, detected)]
+
+        with track_stage("red_flag_scan"):
+            red_flags = self.safety_service.detect_red_flags_batch(texts)
+
+        degraded = []
+        try:
+            embeddings = await self.ml_service.generate_embeddings_array(texts)
+            search_results = await self.vector_service.search_batch(embeddings.tolist(), top_k=5)
+        except Exception as e:
+            logger.warning(f"⚠️ Retrieval failed: {e}")
+            degraded.append("retrieval")
+            search_results = [[] for _ in jobs]
+
+        budgets = [
+            GenerationBudget.for_channel(job.request.get("channel"), r.max_new_tokens, r.max_chars)
+            for job, r in zip(jobs, requests)
+        ]
+        analyses = await self._generate(texts, languages, search_results, red_flags, budgets)
+
+        processing_time = int((time.time() - start_time) * 1000)
+        results, logs = [], []
+        for job, text, lang, flags, hits, (analysis, route), budget in zip(
+            jobs, texts, languages, red_flags, search_results, analyses, budgets
+        ):
+            conditions = _format_conditions(hits)
+            results.append(DiagnosisResponse(
+                conditions=conditions,
+                red_flags=[f["message"] for f in flags],
+                disclaimer=self.safety_service.get_disclaimer(lang),
+                response_id=job.job_id,
+                processing_time_ms=processing_time,
+                recommendations=self.safety_service.get_recommendations(flags),
+                detected_language=lang,
+                natlas_analysis=analysis or None,
+                degraded_stages=degraded,
+                generation=budget.report(analysis) if budget.stop_reason else None,
+                route=route.tier
+            ).model_dump(mode="json"))
+            logs.append(DiagnosisLog(
+                session_id=job.job_id,
+                symptoms_text=text[:100],
+                detected_language=lang,
+                matched_conditions=[c.title for c in conditions],
+                red_flags_detected=[f["category"] for f in flags],
+                response_time_ms=processing_time
+            ))
+
+        with track_stage("db_write"):
+            db = SessionLocal()
+            try:
+                db.add_all(logs)
+                db.commit()
+            finally:
+                db.close()
+        return results
+
+    async def _generate(self, texts, languages, search_results, red_flags, budgets) -> List[Tuple[str, Route]]:
+        """Route each job through the model cascade; the N-ATLaS ones share one batched generation.
+
+        Small-model jobs run concurrently, as many at once as the small
+        model's admission controller allows; one it turns away or that
+        fails goes to N-ATLaS with the rest.
+        """
+        routes = [
+            self.ml_service.route_generation(text, lang, hits, flags)
+            for text, lang, hits, flags in zip(texts, languages, search_results, red_flags)
+        ]
+        analyses = [""] * len(texts)
+
+        async def small(i: int):
+            try:
+                async with self.small_admission.slot():
+                    analyses[i] = await self.ml_service.analyze_with_small_model(
+                        texts[i], languages[i], search_results[i], budget=budgets[i]
+                    )
+            except Exception as e:
+                logger.warning(f"⚠️ Small model failed, escalating to N-ATLaS: {e}")
+                routes[i] = Route(ROUTE_NATLAS, "small_failed", routes[i].top_score)
+
+        await asyncio.gather(*[small(i) for i, route in enumerate(routes) if route.tier == ROUTE_SMALL])
+
+        rows = [i for i, route in enumerate(routes) if route.tier == ROUTE_NATLAS]
+        if rows:
+            generated = await self.ml_service.analyze_batch_with_natlas(
+                [texts[i] for i in rows], [languages[i] for i in rows], [budgets[i] for i in rows]
+            )
+            for i, analysis in zip(rows, generated):
+                analyses[i] = analysis
+        return list(zip(analyses, routes))
+
+
+async def main(consumer: str):
+    logger.info(f"🛠️ Starting diagnosis worker {consumer}")
+    run_migrations()
+    install_rollups()
+
+    ml_service = MLService()
+    await ml_service.initialize()
+    vector_service = VectorService()
+    await vector_service.initialize()
+    safety_service = SafetyService()
+    safety_service.detect_red_flags("")
+    queue = JobQueue()
+    await queue.initialize()
+    logger.info(f"✅ Consuming {settings.JOB_STREAM} as {settings.JOB_CONSUMER_GROUP}/{consumer}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await DiagnosisWorker(ml_service, vector_service, safety_service, queue, consumer).run(stop)
+    finally:
+        logger.info("🛑 Worker stopping...")
+        await queue.close()
+        await vector_service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Afiya Care diagnosis job worker")
+    parser.add_argument("--consumer", default=f"{socket.gethostname()}-{os.getpid()}",
+                        help="Consumer name within the group; must be unique per worker")
+    configure_logging()
+    try:
+        asyncio.run(main(parser.parse_args().consumer))
+    finally:
+        shutdown_logging()